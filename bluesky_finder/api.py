@@ -0,0 +1,258 @@
+"""Read-only JSON API over the results (`serve`), for dashboards and scripts
+that would otherwise re-run `export` to see the latest scores.
+
+  GET /candidates         evaluated candidates by score; ?sort=overall|tech|
+                          location, ?order=desc|asc, ?label=, ?min_score=,
+                          ?max_score= (bounds on the sort column), ?limit=
+  GET /candidates/<did>   one candidate: evaluation, sources, recent posts
+  GET /evals              evaluations oldest first; ?label=, ?since=<ISO
+                          time>, ?limit=
+  GET /stats              the maintained counters (database.read_stats)
+
+Lists are keyset-paginated (see queries.py): pass a response's `next` (or
+`prev`) back as ?cursor= with the same filters. Cursors are opaque.
+
+Every response carries an ETag built from the database change counter
+(database._CHANGE_TRIGGERS). A poll sending it back in If-None-Match costs
+one single-row lookup and gets an empty 304 until something is written, so
+dashboards can poll often without ever touching the big tables.
+"""
+
+import base64
+import json
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from .config import settings
+from .database import change_counter, get_db, read_stats
+from .metrics import metrics
+from .queries import SORT_COLUMNS, candidate_detail, page_candidates, page_evals
+
+
+class NotFound(LookupError):
+    pass
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps(values, default=_json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError("Bad cursor") from None
+    if not isinstance(values, list) or not values:
+        raise ValueError("Bad cursor")
+    return values
+
+
+def _float(query: Dict[str, str], name: str) -> Optional[float]:
+    if name not in query:
+        return None
+    try:
+        return float(query[name])
+    except ValueError:
+        raise ValueError(f"{name} must be a number") from None
+
+
+def _limit(query: Dict[str, str]) -> int:
+    cfg = settings.api
+    try:
+        limit = int(query.get("limit", cfg.page_size))
+    except ValueError:
+        raise ValueError("limit must be an integer") from None
+    return max(1, min(limit, cfg.max_page_size))
+
+
+def list_candidates(db: Session, query: Dict[str, str]) -> dict:
+    sort = query.get("sort", "overall")
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"sort must be one of {', '.join(SORT_COLUMNS)}")
+    order = query.get("order", "desc")
+    if order not in ("desc", "asc"):
+        raise ValueError("order must be desc or asc")
+    limit = _limit(query)
+
+    after = before = None
+    if "cursor" in query:
+        values = decode_cursor(query["cursor"])
+        if len(values) != 3 or values[0] not in ("after", "before"):
+            raise ValueError("Bad cursor")
+        if values[0] == "after":
+            after = (values[1], values[2])
+        else:
+            before = (values[1], values[2])
+
+    rows = page_candidates(
+        db,
+        sort=sort,
+        descending=order == "desc",
+        label=query.get("label"),
+        after=after,
+        before=before,
+        limit=limit,
+        min_score=_float(query, "min_score"),
+        max_score=_float(query, "max_score"),
+    )
+    # A full page may have more behind it; a page reached by paging has
+    # something on the side it came from
+    more_after = len(rows) == limit if before is None else bool(rows)
+    more_before = len(rows) == limit if before is not None else after is not None
+    return {
+        "items": [row.__dict__ for row in rows],
+        "next": encode_cursor("after", *rows[-1].cursor(sort)) if more_after else None,
+        "prev": (
+            encode_cursor("before", *rows[0].cursor(sort))
+            if more_before and rows
+            else None
+        ),
+    }
+
+
+def show_candidate(db: Session, did: str) -> dict:
+    detail = candidate_detail(db, did)
+    if detail is None:
+        raise NotFound(f"No candidate {did}")
+    return detail
+
+
+def list_evals(db: Session, query: Dict[str, str]) -> dict:
+    limit = _limit(query)
+    since = after = None
+    if "since" in query:
+        try:
+            since = datetime.fromisoformat(query["since"])
+        except ValueError:
+            raise ValueError("since must be an ISO 8601 time") from None
+    if "cursor" in query:
+        values = decode_cursor(query["cursor"])
+        try:
+            after = (datetime.fromisoformat(values[0]), str(values[1]))
+        except (IndexError, TypeError, ValueError):
+            raise ValueError("Bad cursor") from None
+
+    rows = page_evals(
+        db, label=query.get("label"), since=since, after=after, limit=limit
+    )
+    # The feed only grows at the end, so the last cursor is worth keeping even
+    # when the page is short: polling with it returns just the new evaluations
+    if rows:
+        next_cursor = encode_cursor(rows[-1]["run_at"], rows[-1]["did"])
+    else:
+        next_cursor = query.get("cursor")
+    return {"items": rows, "next": next_cursor}
+
+
+def show_stats(db: Session, query: Dict[str, str]) -> dict:
+    return read_stats(db)
+
+
+Route = Callable[[Session, Dict[str, str]], dict]
+ROUTES: Dict[str, Route] = {
+    "/candidates": list_candidates,
+    "/evals": list_evals,
+    "/stats": show_stats,
+}
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names `etag` (weak tags compare equal)."""
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag in tags
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "BlueskyFinderAPI/1.0"
+    sessions: sessionmaker  # injected by make_server()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Optional[dict], etag: Optional[str] = None):
+        raw = b"" if body is None else json.dumps(body, default=_json_default).encode()
+        self.send_response(status)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        if etag:
+            self.send_header("ETag", etag)
+            # Cacheable, but always revalidated against the ETag
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _route(self, path: str) -> Tuple[str, Route]:
+        path = path.rstrip("/") or "/"
+        if path in ROUTES:
+            return path, ROUTES[path]
+        if path.startswith("/candidates/"):
+            did = unquote(path[len("/candidates/"):])
+            return "/candidates/{did}", lambda db, _query: show_candidate(db, did)
+        raise NotFound(f"No such endpoint: {path}")
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        endpoint = "unknown"
+        status = 200
+        db = self.sessions()
+        try:
+            endpoint, handler = self._route(parsed.path)
+            # The counter is read before the data: a write landing in between
+            # makes the tag older than the body, which costs the client one
+            # extra fetch, never a missed change
+            etag = f'"{change_counter(db)}"'
+            if etag_matches(self.headers.get("If-None-Match"), etag):
+                status = 304
+                return self._send(304, None, etag)
+            self._send(200, handler(db, query), etag)
+        except NotFound as e:
+            status = 404
+            self._send(404, {"error": "NotFound", "message": str(e)})
+        except ValueError as e:
+            status = 400
+            self._send(400, {"error": "BadRequest", "message": str(e)})
+        finally:
+            db.close()
+            metrics.inc("api_requests_total", endpoint=endpoint, status=str(status))
+
+
+def make_server(host: str, port: int) -> ThreadingHTTPServer:
+    # get_db() once for the schema; each request then gets its own session
+    db = get_db()
+    engine = db.get_bind()
+    db.close()
+    handler = type(
+        "BoundApiHandler", (ApiHandler,), {"sessions": sessionmaker(bind=engine)}
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(host: Optional[str] = None, port: Optional[int] = None) -> None:
+    """Serve the API until interrupted."""
+    host = host or settings.api.host
+    port = port if port is not None else settings.api.port
+    server = make_server(host, port)
+    print(f"[*] Serving results on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -1,53 +1,244 @@
+import json
 import os
+import threading
+import time
 from datetime import datetime
 from typing import List, Optional, Dict
 from atproto import Client
+from atproto_client import models
+from atproto_client.request import Request
+from atproto_client.client.session import Session, SessionEvent
+from atproto_client.exceptions import BadRequestError, UnauthorizedError
 from atproto_client.models.app.bsky.feed.defs import PostView, FeedViewPost
+from .cassette import get_cassette, transport
 from .config import settings
+from .failures import FetchFailed
+from .metrics import metrics
+from .sources import LIST_COLLECTION
+
+# Refresh a resumed session up front when its access token expires within
+# this many seconds (the SDK's own check kicks in 15 minutes before expiry)
+REFRESH_MARGIN_SECONDS = 15 * 60
+
+# Most actors app.bsky.actor.getProfiles accepts per request
+PROFILES_BATCH = 25
+
+# Most writes com.atproto.repo.applyWrites accepts per commit
+APPLY_WRITES_BATCH = 200
+
+LISTITEM_COLLECTION = "app.bsky.graph.listitem"
+
+# XRPC errors meaning the account is gone for us: deleted, taken down, or
+# blocking/blocked. AccountDeactivated is not among them; owners come back
+_GONE_ERRORS = {
+    "AccountTakedown",
+    "ActorNotFound",
+    "BlockedActor",
+    "BlockedByActor",
+    "RepoNotFound",
+    "RepoTakendown",
+}
+# The AppView answers plain InvalidRequest for deleted accounts
+_GONE_MESSAGES = {"Profile not found", "Actor not found"}
+
+
+def _is_auth_error(exc: Exception) -> bool:
+    """True if the server rejected our tokens (expired/revoked session)."""
+    if isinstance(exc, UnauthorizedError):
+        return True
+    if isinstance(exc, BadRequestError):
+        content = getattr(exc.response, "content", None)
+        return getattr(content, "error", None) in ("ExpiredToken", "InvalidToken")
+    return False
+
+
+def _fetch_failed(did: str, exc: Exception) -> FetchFailed:
+    """Classify a failed profile/feed fetch (see failures.py)."""
+    content = getattr(getattr(exc, "response", None), "content", None)
+    permanent = isinstance(exc, BadRequestError) and (
+        getattr(content, "error", None) in _GONE_ERRORS
+        or getattr(content, "message", None) in _GONE_MESSAGES
+    )
+    return FetchFailed(did, str(exc) or type(exc).__name__, permanent)
+
+
+class Accounts(list):
+    """
+    [{did, handle}] from a paged endpoint. `cursor` is where the next call
+    should continue (None once the end was reached), so discovery can pick
+    up next run where this one stopped.
+    """
+
+    def __init__(self, cursor: Optional[str] = None):
+        super().__init__()
+        self.cursor = cursor
 
 
 class BskyClient:
     def __init__(self):
-        self.client = Client()
+        cassette = transport()
+        request = Request(transport=cassette) if cassette is not None else None
+        self.client = Client(base_url=settings.bsky_base_url, request=request)
+        # A recorded run logs in itself, so its replay neither needs nor
+        # overwrites the saved session
+        self._session_path = settings.session_path if cassette is None else None
+        self.client.on_session_change(self._save_session)
+        self._resumed = False
+        # XRPC requests made by this client, for per-source yield accounting
+        # (interaction discovery calls from several threads)
+        self.request_count = 0
+        self._count_lock = threading.Lock()
         self._login()
 
     def _login(self):
         # Requires env vars: BSKY_USERNAME, BSKY_PASSWORD
-        user = os.getenv("BSKY_USERNAME")
-        pw = os.getenv("BSKY_PASSWORD")
-        if not user or not pw:
+        self._user = os.getenv("BSKY_USERNAME")
+        self._password = os.getenv("BSKY_PASSWORD")
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            # Login bodies aren't part of the cassette; any account will do
+            self._user = self._user or "replay"
+            self._password = self._password or "replay"
+        if not self._user or not self._password:
             raise ValueError("BSKY_USERNAME and BSKY_PASSWORD required")
-        self.client.login(user, pw)
+        if not self._resume_session():
+            self._password_login()
 
-    def search_candidates(self, query: str, limit: int = 25) -> List[Dict]:
-        """Returns list of {did, handle} from post searches."""
-        print(f"Searching for: {query}")
+    def _password_login(self):
+        # createSession is tightly rate limited; only hit it when no usable
+        # saved session exists
+        self._request(
+            "com.atproto.server.createSession",
+            self.client.login,
+            self._user,
+            self._password,
+            fetch_bsky_profile=False,
+        )
+        self._resumed = False
+        metrics.inc("at_sessions_total", mode="password")
+
+    def _resume_session(self) -> bool:
+        """Reuse the session saved by a previous run. No network unless the
+        access token is about to expire, in which case it is refreshed now."""
+        path = self._session_path
+        if not path or not path.exists():
+            return False
         try:
-            # Note: The ATProto SDK search method syntax
-            resp = self.client.app.bsky.feed.search_posts(
-                params={"q": query, "limit": limit}
+            saved = json.loads(path.read_text())
+            if saved.get("login") != self._user:
+                return False  # saved for a different account
+            if saved.get("base_url") != settings.bsky_base_url:
+                return False  # saved against a different server
+            session = Session.decode(saved["session"])
+            now = time.time()
+            if session.refresh_jwt_payload.exp <= now + REFRESH_MARGIN_SECONDS:
+                return False  # refresh token (nearly) expired; log in again
+            self.client.login(session_string=saved["session"], fetch_bsky_profile=False)
+        except Exception as e:
+            print(f"Ignoring unusable saved session {path}: {e}")
+            return False
+
+        self._resumed = True
+        metrics.inc("at_sessions_total", mode="resumed")
+        if session.access_jwt_payload.exp <= now + REFRESH_MARGIN_SECONDS:
+            # Any authenticated call makes the SDK refresh first; this also
+            # proves the refresh token is still accepted
+            self._call(
+                "com.atproto.server.getSession",
+                self.client.com.atproto.server.get_session,
             )
-            candidates = []
-            for post in resp.posts:
-                candidates.append(
-                    {"did": post.author.did, "handle": post.author.handle}
+        return True
+
+    def _save_session(self, event: SessionEvent, session: Session):
+        """Persist new/refreshed tokens (owner-only file, atomic replace)."""
+        path = self._session_path
+        if not path or event == SessionEvent.IMPORT:
+            return
+        data = json.dumps(
+            {
+                "login": self._user,
+                "base_url": settings.bsky_base_url,
+                "session": session.encode(),
+            }
+        )
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        os.chmod(tmp, 0o600)  # in case a stale tmp file had looser permissions
+        os.replace(tmp, path)
+
+    def _request(self, endpoint: str, fn, *args, **kwargs):
+        """Invoke an SDK method, recording latency and errors per XRPC endpoint."""
+        metrics.inc("at_requests_total", endpoint=endpoint)
+        with self._count_lock:
+            self.request_count += 1
+        with metrics.timer("at_request_seconds", endpoint=endpoint):
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                metrics.inc("at_errors_total", endpoint=endpoint)
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if status == 429:
+                    metrics.inc("at_rate_limited_total", endpoint=endpoint)
+                raise
+
+    def _call(self, endpoint: str, fn, *args, **kwargs):
+        try:
+            return self._request(endpoint, fn, *args, **kwargs)
+        except Exception as e:
+            if not (self._resumed and _is_auth_error(e)):
+                raise
+        # The saved session was revoked or expired server-side: log in once
+        # with the password (which saves a fresh session) and retry
+        print("Saved Bluesky session was rejected; logging in again")
+        self._password_login()
+        return self._request(endpoint, fn, *args, **kwargs)
+
+    def search_candidates(
+        self, query: str, limit: int = 25, cursor: Optional[str] = None
+    ) -> Accounts:
+        """Returns list of {did, handle} from post searches (100 per request)."""
+        print(f"Searching for: {query}")
+        candidates = Accounts(cursor=cursor)
+        try:
+            while len(candidates) < limit:
+                # Note: The ATProto SDK search method syntax
+                resp = self._call(
+                    "app.bsky.feed.searchPosts",
+                    self.client.app.bsky.feed.search_posts,
+                    params={
+                        "q": query,
+                        "limit": min(100, limit - len(candidates)),
+                        "cursor": cursor,
+                    },
                 )
-            return candidates
+                for post in resp.posts:
+                    candidates.append(
+                        {"did": post.author.did, "handle": post.author.handle}
+                    )
+                cursor = candidates.cursor = resp.cursor if resp.posts else None
+                if not cursor:
+                    break
         except Exception as e:
             print(f"Search failed: {e}")
-            return []
 
-    def get_followers(self, handle: str, limit: int = 1000) -> List[Dict]:
+        return candidates
+
+    def get_followers(
+        self, did: str, limit: int = 1000, cursor: Optional[str] = None
+    ) -> Accounts:
         """Get followers of an account. Returns list of {did, handle}."""
-        print(f"Fetching followers of: {handle}")
-        followers = []
+        print(f"Fetching followers of: {did}")
+        followers = Accounts(cursor=cursor)
         try:
-            cursor = None
             fetched = 0
 
             while fetched < limit:
-                resp = self.client.get_followers(
-                    actor=handle,
+                resp = self._call(
+                    "app.bsky.graph.getFollowers",
+                    self.client.get_followers,
+                    actor=did,
                     limit=min(100, limit - fetched),
                     cursor=cursor
                 )
@@ -62,26 +253,29 @@ class BskyClient:
                         break
 
                 # Check if there are more results
-                if not resp.cursor or fetched >= limit:
+                cursor = followers.cursor = resp.cursor
+                if not cursor or fetched >= limit:
                     break
-                cursor = resp.cursor
 
         except Exception as e:
-            print(f"Failed to fetch followers for {handle}: {e}")
+            print(f"Failed to fetch followers for {did}: {e}")
 
         return followers
 
-    def get_following(self, handle: str, limit: int = 1000) -> List[Dict]:
+    def get_following(
+        self, did: str, limit: int = 1000, cursor: Optional[str] = None
+    ) -> Accounts:
         """Get accounts that this account follows. Returns list of {did, handle}."""
-        print(f"Fetching following of: {handle}")
-        following = []
+        print(f"Fetching following of: {did}")
+        following = Accounts(cursor=cursor)
         try:
-            cursor = None
             fetched = 0
 
             while fetched < limit:
-                resp = self.client.get_follows(
-                    actor=handle,
+                resp = self._call(
+                    "app.bsky.graph.getFollows",
+                    self.client.get_follows,
+                    actor=did,
                     limit=min(100, limit - fetched),
                     cursor=cursor
                 )
@@ -96,38 +290,206 @@ class BskyClient:
                         break
 
                 # Check if there are more results
-                if not resp.cursor or fetched >= limit:
+                cursor = following.cursor = resp.cursor
+                if not cursor or fetched >= limit:
                     break
-                cursor = resp.cursor
 
         except Exception as e:
-            print(f"Failed to fetch following for {handle}: {e}")
+            print(f"Failed to fetch following for {did}: {e}")
 
         return following
 
-    def fetch_profile(self, did: str) -> Optional[Dict]:
+    def get_list_members(
+        self, list_uri: str, limit: int = 1000, cursor: Optional[str] = None
+    ) -> Accounts:
+        """Members of a curated/moderation list. Returns list of {did, handle}."""
+        print(f"Fetching list members of: {list_uri}")
+        members = Accounts(cursor=cursor)
         try:
-            p = self.client.get_profile(actor=did)
-            return {
-                "did": p.did,
-                "handle": p.handle,
-                "display_name": p.display_name,
-                "description": p.description,
-                "avatar_url": p.avatar,
-            }
+            while len(members) < limit:
+                resp = self._call(
+                    "app.bsky.graph.getList",
+                    self.client.app.bsky.graph.get_list,
+                    params={
+                        "list": list_uri,
+                        "limit": min(100, limit - len(members)),
+                        "cursor": cursor,
+                    },
+                )
+                for item in resp.items[: limit - len(members)]:
+                    members.append(
+                        {"did": item.subject.did, "handle": item.subject.handle}
+                    )
+                cursor = members.cursor = resp.cursor
+                if not cursor:
+                    break
         except Exception as e:
-            print(f"Profile fetch failed for {did}: {e}")
+            print(f"Failed to fetch list members for {list_uri}: {e}")
+
+        return members
+
+    def get_starter_pack_list(self, starter_pack_uri: str) -> Optional[str]:
+        """URI of the list behind a starter pack (its members), or None."""
+        try:
+            resp = self._call(
+                "app.bsky.graph.getStarterPack",
+                self.client.app.bsky.graph.get_starter_pack,
+                params={"starter_pack": starter_pack_uri},
+            )
+        except Exception as e:
+            print(f"Failed to fetch starter pack {starter_pack_uri}: {e}")
             return None
+        pack_list = resp.starter_pack.list
+        return pack_list.uri if pack_list else None
+
+    def fetch_engaged_posts(self, did: str, limit: int = 10) -> List[Dict]:
+        """
+        An account's recent own posts (no replies/reposts) with their
+        interaction counts: [{uri, cid, likes, reposts, replies}].
+        """
+        try:
+            feed = self._call(
+                "app.bsky.feed.getAuthorFeed",
+                self.client.get_author_feed,
+                actor=did,
+                limit=limit,
+                filter="posts_no_replies",
+            )
+        except Exception as e:
+            print(f"Feed fetch failed for {did}: {e}")
+            return []
+        return [
+            {
+                "uri": item.post.uri,
+                "cid": item.post.cid,
+                "likes": item.post.like_count or 0,
+                "reposts": item.post.repost_count or 0,
+                "replies": item.post.reply_count or 0,
+            }
+            for item in feed.feed
+            if not item.reason and item.post.author.did == did
+        ]
+
+    def _actor_pages(
+        self, endpoint: str, fn, key: str, max_pages: int, **params
+    ) -> List[Dict]:
+        """Page a list-of-actors endpoint for at most `max_pages` requests."""
+        actors = []
+        cursor = None
+        for _ in range(max_pages):
+            resp = self._call(endpoint, fn, cursor=cursor, limit=100, **params)
+            for entry in getattr(resp, key):
+                actor = getattr(entry, "actor", entry)  # likes wrap the profile
+                actors.append({"did": actor.did, "handle": actor.handle})
+            cursor = resp.cursor
+            if not cursor:
+                break
+        return actors
+
+    def get_likers(self, uri: str, cid: str, max_pages: int = 1) -> List[Dict]:
+        """Accounts that liked a post. Returns list of {did, handle}."""
+        try:
+            return self._actor_pages(
+                "app.bsky.feed.getLikes", self.client.get_likes, "likes",
+                max_pages, uri=uri, cid=cid,
+            )
+        except Exception as e:
+            print(f"Failed to fetch likes for {uri}: {e}")
+            return []
+
+    def get_reposters(self, uri: str, cid: str, max_pages: int = 1) -> List[Dict]:
+        """Accounts that reposted a post. Returns list of {did, handle}."""
+        try:
+            return self._actor_pages(
+                "app.bsky.feed.getRepostedBy", self.client.get_reposted_by,
+                "reposted_by", max_pages, uri=uri, cid=cid,
+            )
+        except Exception as e:
+            print(f"Failed to fetch reposts for {uri}: {e}")
+            return []
+
+    def get_repliers(self, uri: str) -> List[Dict]:
+        """Authors of direct replies to a post (one request, no paging)."""
+        try:
+            resp = self._call(
+                "app.bsky.feed.getPostThread",
+                self.client.get_post_thread,
+                uri=uri,
+                depth=1,
+                parent_height=0,
+            )
+        except Exception as e:
+            print(f"Failed to fetch thread for {uri}: {e}")
+            return []
+        repliers = []
+        for reply in getattr(resp.thread, "replies", None) or []:
+            post = getattr(reply, "post", None)  # skips blocked/not-found stubs
+            if post is not None:
+                repliers.append({"did": post.author.did, "handle": post.author.handle})
+        return repliers
+
+    def fetch_profile(self, did: str) -> Optional[Dict]:
+        """
+        The profile of `did`. Raises FetchFailed if the account is gone or
+        the request failed; None only when our own session was rejected.
+        """
+        try:
+            p = self._call(
+                "app.bsky.actor.getProfile", self.client.get_profile, actor=did
+            )
+        except Exception as e:
+            if _is_auth_error(e):
+                print(f"Profile fetch failed for {did}: {e}")
+                return None
+            raise _fetch_failed(did, e) from e
+        return {
+            "did": p.did,
+            "handle": p.handle,
+            "display_name": p.display_name,
+            "description": p.description,
+            "avatar_url": p.avatar,
+        }
+
+    def get_profiles(self, actors: List[str]) -> List[Dict]:
+        """
+        Bulk profile lookup for handles and/or DIDs, PROFILES_BATCH per
+        request. Returns {did, handle} for every actor that resolved;
+        unknown, deleted and suspended accounts are simply absent.
+        """
+        found = []
+        for i in range(0, len(actors), PROFILES_BATCH):
+            batch = actors[i : i + PROFILES_BATCH]
+            try:
+                resp = self._call(
+                    "app.bsky.actor.getProfiles", self.client.get_profiles, batch
+                )
+            except Exception as e:
+                print(f"Profile lookup failed for {len(batch)} actors: {e}")
+                continue
+            found.extend({"did": p.did, "handle": p.handle} for p in resp.profiles)
+        return found
 
     def fetch_recent_posts(self, did: str, limit: int = 50) -> List[Dict]:
+        """Recent posts and replies of `did`; raises FetchFailed like fetch_profile."""
         posts = []
         try:
             # filter='posts_no_replies' helps reduce noise if desired,
             # but spec says include replies, exclude pure reposts.
-            feed = self.client.get_author_feed(
-                actor=did, limit=limit, filter="posts_with_replies"
+            feed = self._call(
+                "app.bsky.feed.getAuthorFeed",
+                self.client.get_author_feed,
+                actor=did,
+                limit=limit,
+                filter="posts_with_replies",
             )
+        except Exception as e:
+            if not _is_auth_error(e):
+                raise _fetch_failed(did, e) from e
+            print(f"Feed fetch failed for {did}: {e}")
+            return posts
 
+        # A malformed record keeps the posts parsed before it
+        try:
             for item in feed.feed:
                 # Filter out pure reposts (ReasonRepost)
                 if item.reason:
@@ -155,6 +517,107 @@ class BskyClient:
                     }
                 )
         except Exception as e:
-            print(f"Feed fetch failed for {did}: {e}")
+            print(f"Feed parse failed for {did}: {e}")
 
         return posts
+
+    # ----- Writes to the logged-in account's own repo -----
+
+    def own_did(self) -> str:
+        """DID of the logged-in account (from the session, no request)."""
+        return Session.decode(self.client.export_session_string()).did
+
+    def get_own_lists(self) -> List[Dict]:
+        """The logged-in account's lists: [{uri, name}]."""
+        lists, cursor = [], None
+        while True:
+            resp = self._call(
+                "app.bsky.graph.getLists",
+                self.client.app.bsky.graph.get_lists,
+                params={"actor": self.own_did(), "limit": 100, "cursor": cursor},
+            )
+            lists.extend({"uri": lst.uri, "name": lst.name} for lst in resp.lists)
+            cursor = resp.cursor
+            if not cursor:
+                return lists
+
+    def get_list_items(self, list_uri: str) -> List[Dict]:
+        """
+        The listitem records in our repo that belong to `list_uri`, read from
+        the repo itself (not the AppView, which lags and hides some
+        accounts): [{did, rkey}].
+        """
+        items, cursor = [], None
+        while True:
+            resp = self._call(
+                "com.atproto.repo.listRecords",
+                self.client.com.atproto.repo.list_records,
+                params={
+                    "repo": self.own_did(),
+                    "collection": LISTITEM_COLLECTION,
+                    "limit": 100,
+                    "cursor": cursor,
+                },
+            )
+            for record in resp.records:
+                value = record.value
+                if getattr(value, "list", None) != list_uri:
+                    continue
+                items.append(
+                    {"did": value.subject, "rkey": record.uri.rsplit("/", 1)[1]}
+                )
+            cursor = resp.cursor
+            if not cursor or not resp.records:
+                return items
+
+    def apply_list_writes(
+        self, list_uri: str, add: List[str], remove: List[str]
+    ) -> List[str]:
+        """
+        Add the `add` DIDs to the list and delete the `remove` listitem rkeys
+        in one atomic applyWrites commit (at most APPLY_WRITES_BATCH writes).
+        Returns the new listitems' rkeys, in the order of `add`.
+        """
+        now = self.client.get_current_time_iso()
+        writes = [
+            models.ComAtprotoRepoApplyWrites.Create(
+                collection=LISTITEM_COLLECTION,
+                value=models.AppBskyGraphListitem.Record(
+                    subject=did, list=list_uri, created_at=now
+                ),
+            )
+            for did in add
+        ] + [
+            models.ComAtprotoRepoApplyWrites.Delete(
+                collection=LISTITEM_COLLECTION, rkey=rkey
+            )
+            for rkey in remove
+        ]
+        resp = self._call(
+            "com.atproto.repo.applyWrites",
+            self.client.com.atproto.repo.apply_writes,
+            models.ComAtprotoRepoApplyWrites.Data(repo=self.own_did(), writes=writes),
+        )
+        return [r.uri.rsplit("/", 1)[1] for r in (resp.results or [])[: len(add)]]
+
+    def create_list(self, name: str, description: str) -> str:
+        """Create a curation list in our repo; returns its at:// URI."""
+        record = models.AppBskyGraphList.Record(
+            name=name,
+            purpose="app.bsky.graph.defs#curatelist",
+            description=description,
+            created_at=self.client.get_current_time_iso(),
+        )
+        resp = self._call(
+            "com.atproto.repo.applyWrites",
+            self.client.com.atproto.repo.apply_writes,
+            models.ComAtprotoRepoApplyWrites.Data(
+                repo=self.own_did(),
+                writes=[
+                    models.ComAtprotoRepoApplyWrites.Create(
+                        collection=LIST_COLLECTION, value=record
+                    )
+                ],
+            ),
+        )
+        return resp.results[0].uri
@@ -0,0 +1,337 @@
+"""Offline benchmark: run the real pipeline stages against the fake servers.
+
+    python -m bluesky_finder.bench --size 10k --latency-ms 5 --output bench.json
+
+Reports, per stage, wall time, items/s, per-endpoint request counts and
+p50/p99 latency (as seen by the fake server), SQL query counts, peak traced
+Python memory and the client-side metrics registry, as JSON so runs can be
+diffed across commits.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .fakes import BENCH_HASHTAG, SyntheticWorld, parse_size, serve
+
+STAGES = ["discover", "fetch", "dedupe", "embed", "evaluate", "export"]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).parent,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class _FakeServerProcess:
+    def __init__(self, size: int, **knobs):
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        ctx = multiprocessing.get_context("spawn")
+        ready = ctx.Event()
+        self.process = ctx.Process(
+            target=serve,
+            kwargs=dict(size=size, port=self.port, ready=ready, **knobs),
+            daemon=True,
+        )
+        self.process.start()
+        if not ready.wait(timeout=30):
+            self.process.terminate()
+            raise RuntimeError("Fake server did not start")
+
+    def _get(self, path: str) -> dict:
+        with urllib.request.urlopen(self.base_url + path, timeout=10) as resp:
+            return json.loads(resp.read())
+
+    def reset(self):
+        self._get("/_bench/reset")
+
+    def stats(self) -> dict:
+        return self._get("/_bench/stats")
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join(timeout=5)
+
+
+class _QueryCounter:
+    def __init__(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        self.count = 0
+        event.listen(Engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+
+def _row_count(db, model) -> int:
+    return db.query(model).count()
+
+
+def run_benchmark(
+    size: int,
+    latency_ms: float = 0.0,
+    llm_latency_ms: float = 0.0,
+    rate_limit: float = 0.0,
+    posts_per_account: int = 30,
+    llm_malformed_rate: float = 0.0,
+    structured_output: bool = True,
+    llm_error_rate: float = 0.0,
+    llm_slow_rate: float = 0.0,
+    llm_slow_ms: float = 0.0,
+    llm_down_models: Optional[List[str]] = None,
+    llm_fallback_models: Optional[List[str]] = None,
+    hedge: bool = True,
+    stages: Optional[List[str]] = None,
+    trace_memory: bool = True,
+    workdir: Optional[Path] = None,
+) -> dict:
+    stages = stages or STAGES
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown bench stage(s): {', '.join(unknown)}")
+
+    # Fake Bluesky credentials; the LLM client is injected below
+    os.environ.setdefault("BSKY_USERNAME", "bench.bench.test")
+    os.environ.setdefault("BSKY_PASSWORD", "bench")
+
+    server = _FakeServerProcess(
+        size,
+        latency_ms=latency_ms,
+        llm_latency_ms=llm_latency_ms,
+        rate_limit=rate_limit,
+        posts_per_account=posts_per_account,
+        llm_malformed_rate=llm_malformed_rate,
+        llm_error_rate=llm_error_rate,
+        llm_slow_rate=llm_slow_rate,
+        llm_slow_ms=llm_slow_ms,
+        llm_down_models=llm_down_models,
+    )
+    workdir = Path(workdir or tempfile.mkdtemp(prefix="bluesky-finder-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    old_cwd = os.getcwd()
+
+    try:
+        from . import llm
+        from .config import LlmEndpoint, settings
+        from .database import (
+            DbCandidate,
+            DbLlmEval,
+            DbPostSignature,
+            DbProfile,
+            in_topic,
+        )
+        from .metrics import metrics
+        from .pipeline import Pipeline
+        from .sources import summarize_by_source, yield_report
+
+        world = SyntheticWorld(size, posts_per_account=posts_per_account)
+        settings.db_path = workdir / "bench.db"
+        settings.vectors_path = workdir / "bench.vectors.npy"
+        settings.bsky_base_url = server.base_url
+        settings.openrouter_base_url = f"{server.base_url}/v1"
+        settings.seed_hashtags = [BENCH_HASHTAG]
+        settings.anchor_handles = world.anchor_handles()
+        settings.seed_lists = world.seed_lists()
+        settings.interactions.enabled = True
+        settings.discovery_limits.max_candidates_per_hashtag = 100
+        settings.discovery_limits.max_accounts_per_anchor = 1000
+        settings.fetch_posts_limit = posts_per_account
+        settings.llm.structured_output = structured_output
+        settings.llm.fallbacks = [
+            LlmEndpoint(model=m) for m in llm_fallback_models or []
+        ]
+        settings.llm.hedge = hedge
+        llm.set_client(
+            llm.make_client("bench", settings.openrouter_base_url, max_retries=0)
+        )
+
+        os.chdir(workdir)
+        queries = _QueryCounter()
+        pipeline = Pipeline()
+        db = pipeline.db
+
+        export_threshold = settings.thresholds_for(settings.current_topic).maybe_overall
+        stage_items: Dict[str, Callable[[], int]] = {
+            "discover": lambda: _row_count(db, DbCandidate),
+            "fetch": lambda: _row_count(db, DbProfile),
+            "dedupe": lambda: _row_count(db, DbPostSignature),
+            "embed": lambda: _row_count(db, DbProfile),
+            "evaluate": lambda: _row_count(db, DbLlmEval),
+            "export": lambda: db.query(DbLlmEval)
+            .filter(in_topic(), DbLlmEval.score_overall >= export_threshold)
+            .count(),
+        }
+        stage_funcs: Dict[str, Callable[[], None]] = {
+            "discover": pipeline.run_discovery,
+            "fetch": pipeline.run_fetch,
+            "dedupe": pipeline.run_dedupe,
+            "embed": pipeline.run_embedding,
+            "evaluate": pipeline.run_evaluation,
+            "export": lambda: pipeline.export_results(format="jsonl"),
+        }
+
+        report_stages = {}
+        total_started = time.perf_counter()
+        for stage in stages:
+            before = stage_items[stage]()
+            server.reset()
+            metrics.reset()
+            queries_before = queries.count
+            if trace_memory:
+                tracemalloc.start()
+
+            started = time.perf_counter()
+            # Pipeline output is noise here; the JSON report is the product
+            with open(os.devnull, "w") as devnull:
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    stage_funcs[stage]()
+                finally:
+                    sys.stdout = stdout
+            seconds = time.perf_counter() - started
+
+            peak = None
+            if trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+            after = stage_items[stage]()
+            items = after if stage in ("embed", "export") else after - before
+            report_stages[stage] = {
+                "seconds": round(seconds, 4),
+                "items": items,
+                "items_per_sec": round(items / seconds, 2) if seconds else None,
+                "queries": queries.count - queries_before,
+                "peak_memory_bytes": peak,
+                "api": server.stats(),
+                "client_metrics": metrics.snapshot(),
+            }
+            if stage == "evaluate":
+                evaluated = metrics.total("evaluations_total")
+                report_stages[stage]["wasted_llm_calls_per_1k"] = round(
+                    1000 * metrics.total("llm_wasted_calls_total") / max(evaluated, 1), 2
+                )
+
+        return {
+            "commit": _git_commit(),
+            "size": size,
+            "config": {
+                "latency_ms": latency_ms,
+                "llm_latency_ms": llm_latency_ms,
+                "rate_limit": rate_limit,
+                "posts_per_account": posts_per_account,
+                "llm_malformed_rate": llm_malformed_rate,
+                "structured_output": settings.llm.structured_output,
+                "llm_error_rate": llm_error_rate,
+                "llm_slow_rate": llm_slow_rate,
+                "llm_slow_ms": llm_slow_ms,
+                "llm_down_models": llm_down_models or [],
+                "llm_fallback_models": llm_fallback_models or [],
+                "hedge": hedge,
+                "trace_memory": trace_memory,
+            },
+            "total_seconds": round(time.perf_counter() - total_started, 4),
+            "stages": report_stages,
+            # Requests, new candidates and matches per discovery source kind
+            "yields": [r.as_dict() for r in summarize_by_source(yield_report(db))],
+        }
+    finally:
+        os.chdir(old_cwd)
+        server.stop()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--size", default="1k", help="Synthetic dataset: 1k, 10k, 100k or a number"
+    )
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="Mean injected AT Protocol latency")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0,
+                        help="Mean injected LLM latency")
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="Fake server requests/second per endpoint (0 = unlimited)")
+    parser.add_argument("--posts-per-account", type=int, default=30)
+    parser.add_argument("--llm-malformed-rate", type=float, default=0.0,
+                        help="Share of unstructured LLM replies that aren't valid JSON")
+    parser.add_argument("--no-structured-output", action="store_true",
+                        help="Ask for JSON in the prompt instead of response_format")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0,
+                        help="Share of LLM requests answered with 503")
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0,
+                        help="Share of LLM requests delayed by --llm-slow-ms")
+    parser.add_argument("--llm-slow-ms", type=float, default=0.0)
+    parser.add_argument("--llm-down-model", action="append", default=[],
+                        help="Model whose requests all fail (repeatable)")
+    parser.add_argument("--llm-fallback-model", action="append", default=[],
+                        help="Fallback model on the same endpoint (repeatable)")
+    parser.add_argument("--no-hedge", action="store_true",
+                        help="Don't race slow LLM requests against a second one")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help="Comma-separated stages to run, in order")
+    parser.add_argument("--no-trace-memory", action="store_true",
+                        help="Skip tracemalloc (faster, no peak memory figures)")
+    parser.add_argument("--workdir", type=Path, default=None,
+                        help="Keep the bench DB/exports here instead of a temp dir")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="Write the JSON report here as well as stdout")
+
+
+def run_from_args(args):
+    report = run_benchmark(
+        parse_size(args.size),
+        latency_ms=args.latency_ms,
+        llm_latency_ms=args.llm_latency_ms,
+        rate_limit=args.rate_limit,
+        posts_per_account=args.posts_per_account,
+        llm_malformed_rate=args.llm_malformed_rate,
+        structured_output=not args.no_structured_output,
+        llm_error_rate=args.llm_error_rate,
+        llm_slow_rate=args.llm_slow_rate,
+        llm_slow_ms=args.llm_slow_ms,
+        llm_down_models=args.llm_down_model,
+        llm_fallback_models=args.llm_fallback_model,
+        hedge=not args.no_hedge,
+        stages=[s.strip() for s in args.stages.split(",") if s.strip()],
+        trace_memory=not args.no_trace_memory,
+        workdir=args.workdir,
+    )
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark")
+    add_arguments(parser)
+    run_from_args(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
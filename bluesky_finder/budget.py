@@ -0,0 +1,103 @@
+"""Adaptive discovery budgets: a bandit over discovery origins.
+
+Each origin (see sources.py) is an arm whose payoff is matches per API
+request. Its rate gets a Gamma posterior from the recorded yield: matches so
+far, plus candidates not yet evaluated counted at the overall match rate,
+over the requests spent. A prior worth `prior_requests` requests at the
+overall rate keeps new origins in play. Every run draws one rate per arm
+(Thompson sampling) and splits the request budget in proportion. Productive
+origins grow towards `max_multiplier` times their static budget (origins
+whose paging reached the end last run stay at it). Dead ones shrink to a
+single exploratory request.
+"""
+
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from .config import BudgetSettings
+from .sources import yield_report
+
+
+@dataclass
+class Arm:
+    origin: str
+    default: int  # requests the static DiscoveryLimits would spend
+    requests: int = 0
+    expected_matches: float = 0.0
+    # Paged to the end last run: more requests would only re-read it
+    exhausted: bool = False
+
+
+def load_arms(db: Session, defaults: Dict[str, int]) -> List[Arm]:
+    """Arms for this run's origins, with their recorded yield."""
+    report = {r.origin: r for r in yield_report(db)}
+    evaluated = sum(r.evaluated for r in report.values())
+    matches = sum(r.matches for r in report.values())
+    match_rate = matches / evaluated if evaluated else 0.0
+
+    arms = []
+    for origin, default in defaults.items():
+        arm = Arm(origin, default)
+        r = report.get(origin)
+        if r is not None:
+            pending = max(r.new_candidates - r.evaluated, 0)
+            arm.requests = r.requests
+            arm.expected_matches = r.matches + pending * match_rate
+            arm.exhausted = bool(r.cursors) and not any(r.cursors.values())
+        arms.append(arm)
+    return arms
+
+
+def allocate(
+    arms: List[Arm],
+    config: BudgetSettings,
+    rng: Optional[random.Random] = None,
+) -> Dict[str, int]:
+    """Requests per origin for the next run; static defaults until there is data."""
+    static = {a.origin: a.default for a in arms}
+    spent = sum(a.requests for a in arms)
+    found = sum(a.expected_matches for a in arms)
+    total = config.total_requests or sum(static.values())
+    if not config.adaptive or not arms or not spent or not found:
+        return static
+
+    rng = rng or random.Random()
+    prior_rate = found / spent
+    shape0 = config.prior_requests * prior_rate
+    draws = {
+        a.origin: rng.gammavariate(
+            shape0 + a.expected_matches, 1.0 / (config.prior_requests + a.requests)
+        )
+        for a in arms
+    }
+    caps = {
+        a.origin: a.default
+        if a.exhausted
+        else max(1, int(a.default * config.max_multiplier))
+        for a in arms
+    }
+
+    # One request each to keep exploring, the rest in proportion to the draws;
+    # whatever a capped arm can't take goes round again to the others
+    budgets = {a.origin: 1 for a in arms}
+    remaining = total - len(arms)
+    open_arms = {o for o in budgets if budgets[o] < caps[o]}
+    while remaining > 0 and open_arms:
+        weight = sum(draws[o] for o in open_arms) or float(len(open_arms))
+        handed_out = 0
+        for origin in sorted(open_arms, key=draws.get, reverse=True):
+            share = draws[origin] / weight
+            give = min(max(1, int(remaining * share)), caps[origin] - budgets[origin])
+            give = min(give, remaining - handed_out)
+            budgets[origin] += give
+            handed_out += give
+            if handed_out >= remaining:
+                break
+        remaining -= handed_out
+        open_arms = {o for o in open_arms if budgets[o] < caps[o]}
+        if not handed_out:
+            break
+    return budgets
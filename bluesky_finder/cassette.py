@@ -0,0 +1,274 @@
+"""Record/replay of HTTP exchanges with the AppView and the LLM providers.
+
+With `cassette_path` set (CASSETTE, or --record/--replay), BskyClient and
+the LLM clients send their requests through CassetteTransport. Recording
+passes every request on to the live API and stores the response; replaying
+answers from the cassette alone, so `discover`, `fetch` or `evaluate` can
+be re-run offline, at full speed and with the same answers, for profiling
+and regression checks. Replay against a copy of the database as it was when
+the recording started, or the run asks for different things.
+
+The cassette is one SQLite file with a row per exchange, keyed by a hash of
+method, path, sorted query and (canonical JSON) body. The host is left out,
+so a recording made against one fake server port replays against another.
+Identical requests are told apart by sequence number: the n-th replay of a
+key gets the n-th recorded response (a retried 503, then its success), and
+once those run out the last one again. Response bodies are stored decoded
+and zlib-compressed.
+
+Requests also depend on the run's random choices (the Thompson-sampled
+discovery budgets decide page sizes), so the cassette stores a seed when
+recording and rng() hands out generators seeded with it.
+
+A request the recording never saw raises CassetteMiss, which stops the run:
+answering it with an error would let the run carry on down a different path
+and the replay quietly diverge.
+
+Login bodies (handle and password) are left out of the key and never
+stored; the session tokens in responses are, so the file is created
+owner-only like the saved session.
+"""
+
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional
+
+import httpx
+
+from .config import settings
+from .metrics import metrics
+
+# Their bodies carry credentials
+_AUTH_PATHS = (
+    "/xrpc/com.atproto.server.createSession",
+    "/xrpc/com.atproto.server.refreshSession",
+)
+# Describe the stored (decoded) body no longer
+_DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+_COMMIT_EVERY = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS exchanges (
+    key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    PRIMARY KEY (key, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)
+"""
+
+
+class CassetteMiss(BaseException):
+    """
+    A replayed run made a request the recording never saw. Not an Exception,
+    so the fetchers' catch-all handlers can't turn it into an empty result.
+    """
+
+
+def _kept_headers(response: httpx.Response) -> list:
+    return [
+        (k, v)
+        for k, v in response.headers.multi_items()
+        if k.lower() not in _DROPPED_HEADERS
+    ]
+
+
+def request_key(request: httpx.Request) -> str:
+    url = request.url
+    body = request.read()
+    if url.path in _AUTH_PATHS:
+        body = b""
+    elif body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True).encode()
+        except ValueError:
+            pass
+    query = json.dumps(sorted(url.params.multi_items()))
+    h = hashlib.sha256()
+    for part in (request.method.encode(), url.raw_path.split(b"?")[0], query.encode()):
+        h.update(part + b"\0")
+    h.update(body)
+    return h.hexdigest()
+
+
+class Cassette:
+    def __init__(self, path: Path, mode: str):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if mode == "replay" and not path.exists():
+            raise ValueError(f"No cassette to replay at {path}")
+        self.path = path
+        self.mode = mode
+        if mode == "record" and not path.exists():
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600))
+        # Shared by the fetch/interaction worker threads and hedge requests
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(_SCHEMA)
+        self.lock = threading.Lock()
+        self.played: Dict[str, int] = {}
+        self.counts: Counter = Counter()
+        self._pending = 0
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def seed(self) -> Optional[int]:
+        """
+        Seed of the recorded run's random choices, created on first use when
+        recording. None replaying a cassette recorded without one.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM meta WHERE key = 'seed'"
+            ).fetchone()
+            if row is not None:
+                return int(row[0])
+            if self.replaying:
+                return None
+            seed = random.getrandbits(63)
+            self.conn.execute("INSERT INTO meta VALUES ('seed', ?)", (str(seed),))
+            self.conn.commit()
+            return seed
+
+    def record(self, request: httpx.Request, response: httpx.Response) -> None:
+        key = request_key(request)
+        with self.lock:
+            # Appends: recording several commands into one cassette keeps
+            # every answer, in order
+            self.conn.execute(
+                "INSERT INTO exchanges VALUES (?, "
+                "(SELECT COALESCE(MAX(seq) + 1, 0) FROM exchanges WHERE key = ?), "
+                "?, ?, ?, ?, ?)",
+                (
+                    key,
+                    key,
+                    request.method,
+                    request.url.raw_path.decode("ascii"),
+                    response.status_code,
+                    json.dumps(_kept_headers(response)),
+                    zlib.compress(response.content),
+                ),
+            )
+            self._pending += 1
+            if self._pending >= _COMMIT_EVERY:
+                self.conn.commit()
+                self._pending = 0
+            self.counts["recorded"] += 1
+        metrics.inc("cassette_requests_total", outcome="recorded")
+
+    def play(self, request: httpx.Request) -> httpx.Response:
+        key = request_key(request)
+        with self.lock:
+            seq = self.played.get(key, 0)
+            self.played[key] = seq + 1
+            # Asked more often than recorded: the last answer again
+            row = self.conn.execute(
+                "SELECT status, headers, body FROM exchanges "
+                "WHERE key = ? AND seq <= ? ORDER BY seq DESC LIMIT 1",
+                (key, seq),
+            ).fetchone()
+            self.counts["replayed" if row else "missed"] += 1
+        if row is None:
+            metrics.inc("cassette_requests_total", outcome="missed")
+            raise CassetteMiss(
+                f"Not in cassette {self.path}: {request.method} {request.url}"
+            )
+        metrics.inc("cassette_requests_total", outcome="replayed")
+        status, headers, body = row
+        return httpx.Response(
+            status,
+            headers=json.loads(headers),
+            content=zlib.decompress(body),
+            request=request,
+        )
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """Sends through `inner` and records, or answers from the cassette."""
+
+    def __init__(
+        self, cassette: Cassette, inner: Optional[httpx.BaseTransport] = None
+    ):
+        self.cassette = cassette
+        self.inner = inner
+        if inner is None and not cassette.replaying:
+            self.inner = httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if self.cassette.replaying:
+            return self.cassette.play(request)
+        response = self.inner.handle_request(request)
+        try:
+            response.read()
+        finally:
+            response.close()
+        self.cassette.record(request, response)
+        # A fresh response: the client times and closes its own stream
+        return httpx.Response(
+            response.status_code,
+            headers=_kept_headers(response),
+            content=response.content,
+            request=request,
+        )
+
+    def close(self) -> None:
+        if self.inner is not None:
+            self.inner.close()
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """The configured cassette, opened on first use; None when running live."""
+    global _cassette
+    if settings.cassette_path is None:
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(settings.cassette_path, settings.cassette_mode)
+        return _cassette
+
+
+def transport() -> Optional[CassetteTransport]:
+    """A transport for a new HTTP client, or None to use the default."""
+    cassette = get_cassette()
+    return CassetteTransport(cassette) if cassette is not None else None
+
+
+def rng() -> Optional[random.Random]:
+    """
+    A generator for the run's random choices, seeded from the cassette so a
+    replay draws what the recording drew; None (unseeded) when running live.
+    """
+    cassette = get_cassette()
+    seed = cassette.seed() if cassette is not None else None
+    return random.Random(seed) if seed is not None else None
+
+
+def close_cassette() -> Optional[Cassette]:
+    """Flush and close the cassette; returns it (for its counts) if one was open."""
+    global _cassette
+    with _cassette_lock:
+        cassette, _cassette = _cassette, None
+    if cassette is not None:
+        cassette.close()
+    return cassette
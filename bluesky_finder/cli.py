@@ -1,58 +1,374 @@
 import argparse
+import json
 import sys
-from .pipeline import Pipeline
+from pathlib import Path
+from .config import settings
+from .metrics import metrics, write_run_report
+
+
+def _pipeline():
+    # Imported on demand so `--help`, `status` and `search` skip it; the
+    # heavy SDKs (atproto, openai, numpy, jinja2) load inside the stages
+    from .pipeline import Pipeline
+
+    return Pipeline()
 
 
 def run_discover(args):
-    """Run seed discovery loop (hashtags)."""
-    p = Pipeline()
+    """Run seed discovery loop (hashtags, lists, anchors)."""
+    if args.interactions:
+        settings.interactions.enabled = True
+    p = _pipeline()
     p.run_discovery()
 
 
 def run_fetch(args):
     """Fetch profiles and posts for queued candidates."""
-    p = Pipeline()
-    p.run_fetch(force=args.force)
+    p = _pipeline()
+    p.run_fetch(force=args.force, retry_failed=args.retry_failed)
+
+
+def run_resolve(args):
+    """Refresh stale handle <-> DID mappings in bulk."""
+    p = _pipeline()
+    p.run_resolve(force=args.force)
+
+
+def run_dedupe(args):
+    """Flag spam/bot accounts by near-duplicate post text."""
+    p = _pipeline()
+    p.run_dedupe(rebuild=args.rebuild)
+
+
+def run_embed(args):
+    """Build local similarity vectors for fetched candidates."""
+    p = _pipeline()
+    p.run_embedding()
 
 
 def run_evaluate(args):
     """Run LLM evaluation on fetched candidates."""
-    p = Pipeline()
-    p.run_evaluation(force=args.force)
+    p = _pipeline()
+    p.run_evaluation(
+        force=args.force, max_tokens=args.max_tokens, max_cost=args.max_cost
+    )
+
+
+def run_publish(args):
+    """Sync a Bluesky list with the matches."""
+    if args.list:
+        settings.publish.list_uri = args.list
+    p = _pipeline()
+    p.run_publish(dry_run=args.dry_run, reconcile=args.reconcile)
+
+
+def run_relabel(args):
+    """Recompute labels from scores, or sweep thresholds against a sample."""
+    thresholds = settings.thresholds_for(settings.current_topic)
+    if args.match is not None:
+        thresholds.match_overall = args.match
+    if args.maybe is not None:
+        thresholds.maybe_overall = args.maybe
+    if not args.sweep:
+        p = _pipeline()
+        p.run_relabel(dry_run=args.dry_run)
+        return
+
+    from dataclasses import asdict
+
+    from .database import get_db
+    from .thresholds import format_sweep, load_truth, sweep, threshold_grid
+
+    db = get_db()
+    truth = load_truth(db, Path(args.sweep))
+    result = sweep(db, truth, threshold_grid(args.step))
+    db.close()
+    if args.json:
+        print(json.dumps(asdict(result), indent=2))
+        return
+    print(format_sweep(result, thresholds))
 
 
 def run_all(args):
-    """Run the full pipeline: Discover -> Fetch -> Eval -> Export."""
-    p = Pipeline()
+    """Run the full pipeline: Discover -> Fetch -> Dedupe -> Embed -> Eval -> Export."""
+    p = _pipeline()
     print("--- Step 1: Discover ---")
     p.run_discovery()
     print("\n--- Step 2: Fetch ---")
     p.run_fetch(force=args.force)
-    print("\n--- Step 3: Evaluate ---")
-    p.run_evaluation(force=args.force)
-    print("\n--- Step 4: Export ---")
+    print("\n--- Step 3: Dedupe ---")
+    p.run_dedupe()
+    print("\n--- Step 4: Embed ---")
+    p.run_embedding()
+    print("\n--- Step 5: Evaluate ---")
+    p.run_evaluation(
+        force=args.force, max_tokens=args.max_tokens, max_cost=args.max_cost
+    )
+    print("\n--- Step 6: Export ---")
     p.export_results(format=args.format)
 
 
 def run_export(args):
-    """Export results to HTML or JSONL."""
-    p = Pipeline()
+    """Export results to HTML or JSONL, or as an incremental delta."""
+    p = _pipeline()
+    if args.incremental or args.compact:
+        p.export_incremental(compact=args.compact)
+        return
     p.export_results(format=args.format)
 
 
+def run_compact(args):
+    """Apply post retention, compress stored text and VACUUM."""
+    if args.keep_per_author is not None:
+        settings.storage.keep_posts_per_author = args.keep_per_author
+    if args.max_age_days is not None:
+        settings.storage.max_post_age_days = args.max_age_days
+    if args.keep_rejected:
+        settings.storage.drop_rejected_posts = False
+    p = _pipeline()
+    p.run_compact(vacuum=not args.no_vacuum)
+
+
+def run_status(args):
+    """Print maintained DB counters (no network, no table scans)."""
+    from .database import format_stats, get_db, read_stats, rebuild_stats
+
+    db = get_db()
+    if args.rebuild:
+        rebuild_stats(db.connection())
+        db.commit()
+    stats = read_stats(db)
+    db.close()
+
+    if args.json:
+        print(json.dumps(stats, indent=2, sort_keys=True))
+        return
+    print(format_stats(stats))
+    for key in sorted(stats):
+        # label:<label> is the current topic's; label:<topic>:<label> below
+        if key.startswith(("source:", "failed:")) or (
+            key.startswith("label:") and key.count(":") == 1
+        ):
+            print(f"  {key:<28} {stats[key]}")
+    if len(settings.topics) > 1:
+        for topic in settings.topics:
+            prefix = f"label:{topic.name}:"
+            labels = ", ".join(
+                f"{key[len(prefix):]} {value}"
+                for key, value in sorted(stats.items())
+                if key.startswith(prefix)
+            )
+            evals = stats.get(f"evals:{topic.name}", 0)
+            print(f"  topic {topic.name:<22} {evals} evaluated ({labels or '-'})")
+
+
+def run_yields(args):
+    """Print per-origin discovery yield (no network)."""
+    from .database import get_db
+    from .sources import (
+        format_runs,
+        format_yields,
+        run_report,
+        summarize_by_source,
+        yield_report,
+    )
+
+    db = get_db()
+    if args.runs:
+        runs = run_report(db)
+        db.close()
+        if args.json:
+            print(json.dumps([r.as_dict() for r in runs], indent=2, default=str))
+        else:
+            print(format_runs(runs))
+        return
+    rows = yield_report(db)
+    db.close()
+    if args.by_source:
+        rows = summarize_by_source(rows)
+
+    if args.json:
+        print(json.dumps([r.as_dict() for r in rows], indent=2, default=str))
+        return
+    print(format_yields(rows))
+
+
+def run_costs(args):
+    """Print LLM tokens, cost and cost per match (no network)."""
+    from .costs import format_costs, model_costs, run_costs
+    from .database import get_db
+
+    db = get_db()
+    rows = model_costs(db) if args.by_model else run_costs(db)
+    db.close()
+    if args.json:
+        print(json.dumps([r.as_dict() for r in rows], indent=2, default=str))
+        return
+    print(format_costs(rows, by_model=args.by_model))
+
+
+def run_search(args):
+    """Full-text search over collected bios and posts (local, no network)."""
+    from sqlalchemy.exc import OperationalError
+
+    from .database import get_db, rebuild_fts
+    from .queries import search_bios, search_posts
+
+    db = get_db()
+    if args.rebuild_index:
+        rebuild_fts(db.connection())
+        db.commit()
+        print("[*] Full-text index rebuilt.")
+        if not args.query:
+            return
+    if not args.query:
+        print("Nothing to search for.")
+        sys.exit(2)
+
+    query = " ".join(args.query)
+    try:
+        hits = []
+        if args.where in ("all", "bios"):
+            hits += search_bios(db, query, limit=args.limit)
+        if args.where in ("all", "posts"):
+            hits += search_posts(db, query, limit=args.limit)
+    except OperationalError as e:
+        print(f"Bad search query {query!r}: {e.orig}")
+        sys.exit(2)
+
+    for hit in hits:
+        when = f" {hit.created_at[:10]}" if hit.created_at else ""
+        print(f"[{hit.where}{when}] @{hit.handle}: {hit.snippet}")
+    print(f"\n{len(hits)} hit(s) for {query!r}")
+
+    if args.rediscover:
+        args.read_only = False
+        _pipeline().run_local_discovery(query)
+
+
+def run_serve(args):
+    """Serve candidates, evaluations and stats as a read-only JSON API."""
+    from .api import serve
+
+    serve(host=args.host, port=args.port)
+
+
+def run_bench(args):
+    """Benchmark every stage offline against fake AppView/LLM servers."""
+    from .bench import run_from_args
+
+    run_from_args(args)
+
+
+def _report_dir(args):
+    if args.no_report:
+        return None
+    if args.report_dir:
+        return args.report_dir
+    # Read-only commands only leave a report behind when REPORTS_DIR is set
+    # explicitly, not in the default ./reports of whatever the cwd is
+    if getattr(args, "read_only", False) and "reports_dir" not in (
+        settings.model_fields_set
+    ):
+        return None
+    return settings.reports_dir
+
+
+def _write_report(args, status: str):
+    # Trailer lines go to stderr so `--json` output stays parseable on stdout
+    textfile = args.prometheus_textfile or settings.metrics_textfile
+    try:
+        path = write_run_report(args.command, status, _report_dir(args), textfile)
+    except OSError as e:
+        print(f"Could not write run report: {e}", file=sys.stderr)
+        return
+    if path:
+        print(f"Run report: {path}", file=sys.stderr)
+
+
+def _close_cassette():
+    from .cassette import close_cassette
+
+    cassette = close_cassette()
+    if cassette is None:
+        return
+    counts = cassette.counts
+    if cassette.replaying:
+        print(
+            f"Cassette {cassette.path}: {counts['replayed']} replayed, "
+            f"{counts['missed']} not recorded",
+            file=sys.stderr,
+        )
+    else:
+        print(
+            f"Cassette {cassette.path}: {counts['recorded']} recorded",
+            file=sys.stderr,
+        )
+
+
+def _add_budget_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--max-tokens", type=int, default=None,
+        help="Stop evaluating before this run's LLM tokens would exceed N",
+    )
+    parser.add_argument(
+        "--max-cost", type=float, default=None,
+        help="Stop evaluating before this run's LLM cost would exceed $N",
+    )
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="DC-Area Techies Discovery on Bluesky",
         formatter_class=argparse.RawDescriptionHelpFormatter,
     )
 
+    parser.add_argument(
+        "--report-dir",
+        default=None,
+        help=f"Directory for the JSON run report (default: {settings.reports_dir}; "
+        "status, yields, costs, search and serve only write one when given)",
+    )
+    parser.add_argument(
+        "--prometheus-textfile",
+        default=None,
+        help="Also write metrics in Prometheus text format to this file",
+    )
+    parser.add_argument(
+        "--no-report", action="store_true", help="Skip the JSON run report"
+    )
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument(
+        "--record",
+        metavar="CASSETTE",
+        default=None,
+        help="Record every AT Protocol and LLM exchange to this SQLite file",
+    )
+    cassette.add_argument(
+        "--replay",
+        metavar="CASSETTE",
+        default=None,
+        help="Answer AT Protocol and LLM requests from a recording (offline)",
+    )
+    parser.add_argument(
+        "--topic",
+        default=None,
+        help="Topic to read results for, and the only one `evaluate` scores "
+        f"(default: {settings.topics[0].name} for results, all for evaluate)",
+    )
+
     subparsers = parser.add_subparsers(
         dest="command", required=True, help="Available commands"
     )
 
     # Command: discover
     parser_discover = subparsers.add_parser(
-        "discover", help="Run seed discovery loop (hashtags)"
+        "discover", help="Run seed discovery loop (hashtags, lists, anchors)"
+    )
+    parser_discover.add_argument(
+        "--interactions",
+        action="store_true",
+        help="Also add accounts that like/repost/reply to anchors' recent posts",
     )
     parser_discover.set_defaults(func=run_discover)
 
@@ -65,8 +381,41 @@ def main():
         action="store_true",
         help="Force re-fetch of profiles/posts regardless of TTL",
     )
+    parser_fetch.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="Also retry accounts that are gone or backing off after a failure",
+    )
     parser_fetch.set_defaults(func=run_fetch)
 
+    # Command: resolve
+    parser_resolve = subparsers.add_parser(
+        "resolve", help="Refresh candidate handles (bulk, cached with a TTL)"
+    )
+    parser_resolve.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-check every candidate, not just stale ones",
+    )
+    parser_resolve.set_defaults(func=run_resolve)
+
+    # Command: dedupe
+    parser_dedupe = subparsers.add_parser(
+        "dedupe", help="Flag spam/bot accounts with near-duplicate posts (MinHash)"
+    )
+    parser_dedupe.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Drop stored signatures and re-sign every post",
+    )
+    parser_dedupe.set_defaults(func=run_dedupe)
+
+    # Command: embed
+    parser_embed = subparsers.add_parser(
+        "embed", help="Build local similarity vectors (no network)"
+    )
+    parser_embed.set_defaults(func=run_embed)
+
     # Command: evaluate
     parser_eval = subparsers.add_parser(
         "evaluate", help="Run LLM evaluation on fetched candidates"
@@ -76,8 +425,54 @@ def main():
         action="store_true",
         help="Force re-evaluation even if already scored",
     )
+    _add_budget_arguments(parser_eval)
     parser_eval.set_defaults(func=run_evaluate)
 
+    # Command: publish-list
+    parser_publish = subparsers.add_parser(
+        "publish-list",
+        help="Add matches to / remove non-matches from a Bluesky list",
+    )
+    parser_publish.add_argument(
+        "--list", default=None,
+        help="at:// URI or bsky.app link of one of your lists (default: settings)",
+    )
+    parser_publish.add_argument(
+        "--dry-run", action="store_true", help="Only show what would change"
+    )
+    parser_publish.add_argument(
+        "--reconcile", action="store_true",
+        help="Rebuild the local membership table from the repo first",
+    )
+    parser_publish.set_defaults(func=run_publish)
+
+    # Command: relabel
+    parser_relabel = subparsers.add_parser(
+        "relabel",
+        help="Recompute labels from scores after a threshold change (no LLM calls)",
+    )
+    parser_relabel.add_argument(
+        "--match", type=float, default=None, help="match_overall threshold to apply"
+    )
+    parser_relabel.add_argument(
+        "--maybe", type=float, default=None, help="maybe_overall threshold to apply"
+    )
+    parser_relabel.add_argument(
+        "--dry-run", action="store_true", help="Show what would change, write nothing"
+    )
+    parser_relabel.add_argument(
+        "--sweep", metavar="TRUTH",
+        help="Instead, report counts and precision/recall over a grid of "
+        "thresholds against a labelled sample (CSV/JSONL: did or handle, label)",
+    )
+    parser_relabel.add_argument(
+        "--step", type=float, default=0.05, help="Sweep grid step"
+    )
+    parser_relabel.add_argument(
+        "--json", action="store_true", help="Print the sweep as JSON"
+    )
+    parser_relabel.set_defaults(func=run_relabel)
+
     # Command: run-all
     parser_all = subparsers.add_parser(
         "run-all", help="Run the full pipeline sequentially"
@@ -91,6 +486,7 @@ def main():
         default="html",
         help="Export format (default: html)",
     )
+    _add_budget_arguments(parser_all)
     parser_all.set_defaults(func=run_all)
 
     # Command: export
@@ -103,18 +499,152 @@ def main():
         default="html",
         help="Export format (default: html)",
     )
+    parser_export.add_argument(
+        "--incremental", action="store_true",
+        help=f"Write only what changed since the last export as JSONL to "
+        f"{settings.export_dir}/ (with a manifest)",
+    )
+    parser_export.add_argument(
+        "--compact", action="store_true",
+        help="Roll the incremental deltas up into a fresh full snapshot",
+    )
     parser_export.set_defaults(func=run_export)
 
+    # Command: compact
+    parser_compact = subparsers.add_parser(
+        "compact", help="Apply post retention, compress post text and VACUUM"
+    )
+    parser_compact.add_argument(
+        "--keep-per-author", type=int, default=None,
+        help="Keep only the newest N posts per candidate",
+    )
+    parser_compact.add_argument(
+        "--max-age-days", type=int, default=None, help="Drop posts older than this"
+    )
+    parser_compact.add_argument(
+        "--keep-rejected", action="store_true",
+        help='Keep posts of candidates labelled "no"',
+    )
+    parser_compact.add_argument(
+        "--no-vacuum", action="store_true", help="Skip returning space to the OS"
+    )
+    parser_compact.set_defaults(func=run_compact)
+
+    # Command: status
+    parser_status = subparsers.add_parser(
+        "status", help="Show candidate/label/source counts and stage backlogs"
+    )
+    parser_status.add_argument("--json", action="store_true", help="Print as JSON")
+    parser_status.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Recount every aggregate from the tables first",
+    )
+    parser_status.set_defaults(func=run_status, read_only=True)
+
+    # Command: yields
+    parser_yields = subparsers.add_parser(
+        "yields",
+        help="Show requests, new candidates and matches per discovery origin",
+    )
+    parser_yields.add_argument("--json", action="store_true", help="Print as JSON")
+    parser_yields.add_argument(
+        "--by-source",
+        action="store_true",
+        help="Add up origins of the same kind (hashtag, list, anchor)",
+    )
+    parser_yields.add_argument(
+        "--runs",
+        action="store_true",
+        help="Matches per request of each discovery run instead",
+    )
+    parser_yields.set_defaults(func=run_yields, read_only=True)
+
+    # Command: costs
+    parser_costs = subparsers.add_parser(
+        "costs", help="Show LLM tokens, cost and cost per match per evaluate run"
+    )
+    parser_costs.add_argument("--json", action="store_true", help="Print as JSON")
+    parser_costs.add_argument(
+        "--by-model",
+        action="store_true",
+        help="Current evaluations per model instead",
+    )
+    parser_costs.set_defaults(func=run_costs, read_only=True)
+
+    # Command: search
+    parser_search = subparsers.add_parser(
+        "search", help="Full-text search collected bios and posts (FTS5 syntax)"
+    )
+    parser_search.add_argument(
+        "query", nargs="*",
+        help='e.g. wmata OR arlington, "capital bikeshare", bike*',
+    )
+    parser_search.add_argument(
+        "--in", dest="where", choices=["all", "bios", "posts"], default="all"
+    )
+    parser_search.add_argument("--limit", type=int, default=20, help="Hits per kind")
+    parser_search.add_argument(
+        "--rediscover",
+        action="store_true",
+        help="Tag every matching candidate with the local_search source",
+    )
+    parser_search.add_argument(
+        "--rebuild-index", action="store_true", help="Re-index bios and posts first"
+    )
+    parser_search.set_defaults(func=run_search, read_only=True)
+
+    # Command: serve
+    parser_serve = subparsers.add_parser(
+        "serve", help="Read-only JSON API over candidates, evaluations and stats"
+    )
+    parser_serve.add_argument(
+        "--host", default=None, help=f"Default {settings.api.host}"
+    )
+    parser_serve.add_argument(
+        "--port", type=int, default=None, help=f"Default {settings.api.port}"
+    )
+    parser_serve.set_defaults(func=run_serve, read_only=True)
+
+    # Command: bench
+    parser_bench = subparsers.add_parser(
+        "bench", help="Benchmark all stages offline against fake servers (JSON report)"
+    )
+    from .bench import add_arguments as add_bench_arguments
+
+    add_bench_arguments(parser_bench)
+    parser_bench.set_defaults(func=run_bench)
+
     # Parse args
     args = parser.parse_args()
 
+    if args.topic:
+        settings.topic = args.topic
+    if args.record or args.replay:
+        settings.cassette_path = Path(args.record or args.replay)
+        settings.cassette_mode = "record" if args.record else "replay"
+
     # Execute the selected function
     if hasattr(args, "func"):
+        metrics.reset()
+        status = "ok"
         try:
             args.func(args)
         except Exception as e:
+            status = "error"
             print(f"Error: {e}")
             sys.exit(1)
+        except BaseException as e:
+            from .cassette import CassetteMiss
+
+            if not isinstance(e, CassetteMiss):
+                raise
+            status = "error"
+            print(f"Error: replay diverged from the recording. {e}")
+            sys.exit(1)
+        finally:
+            _close_cassette()
+            _write_report(args, status)
     else:
         parser.print_help()
 
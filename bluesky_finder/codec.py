@@ -0,0 +1,62 @@
+"""Compact encoding for short post text.
+
+Posts are a few hundred bytes, too short for plain zlib to find much
+repetition on its own, so text is deflated against a preset dictionary of
+common English words and Bluesky/URL fragments. The stored value is a blob:
+one version byte, then raw deflate data. Text that doesn't get smaller is
+kept as a plain string, and readers accept both.
+
+Never edit a dictionary once data has been written with it; add a new
+version instead.
+"""
+
+import zlib
+from typing import Dict, Optional, Union
+
+# Deflate favours matches near the end of the dictionary, so the most common
+# fragments come last
+_DICT_V1 = (
+    "government software engineer developer security product design data "
+    "science cloud infrastructure terraform kubernetes python javascript "
+    "typescript rust golang docker github gitlab linux devops startup "
+    "washington arlington alexandria bethesda silver spring virginia "
+    "maryland northern dc metro wmata capital district neighborhood "
+    "conference meetup podcast newsletter article thread video photo "
+    "election policy congress senate federal agency contract remote hiring "
+    "working building learning writing reading watching thinking "
+    "something everything nothing anything someone everyone because "
+    "actually probably already another through without between "
+    "yesterday tomorrow tonight morning weekend week month year "
+    "please thanks thank love great awesome pretty little better "
+    "should could would might never always still again every "
+    "about after before over under into only also back than then them "
+    "these those their there where which while what when with from "
+    "have just like more some your will been were this that they "
+    "http://www. https://bsky.app/profile/ https://www. https:// .com/ "
+    ".org .gov .social .bsky.social #dctech #python @ "
+    "I'm it's don't can't that's you're I've "
+    " people time today really think know good work make need want "
+    " new one all get out now can not but are was be so my we do if "
+    " you it for on is in a to and of the "
+)
+
+DICTIONARIES: Dict[int, bytes] = {1: _DICT_V1.encode("utf-8")}
+CURRENT_VERSION = 1
+
+
+def compress_text(value: Optional[str]) -> Union[str, bytes, None]:
+    """Dictionary-deflated blob, or the original string if that is smaller."""
+    if not value:
+        return value
+    raw = value.encode("utf-8")
+    c = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=DICTIONARIES[CURRENT_VERSION])
+    blob = bytes([CURRENT_VERSION]) + c.compress(raw) + c.flush()
+    return blob if len(blob) < len(raw) else value
+
+
+def decompress_text(value: Union[str, bytes, None]) -> Optional[str]:
+    """Inverse of compress_text; plain strings pass through."""
+    if value is None or isinstance(value, str):
+        return value
+    d = zlib.decompressobj(-15, zdict=DICTIONARIES[value[0]])
+    return (d.decompress(value[1:]) + d.flush()).decode("utf-8")
@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import timedelta
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
@@ -12,6 +12,104 @@ load_dotenv()
 class DiscoveryLimits(BaseModel):
     max_candidates_per_hashtag: int = 100
     max_accounts_per_anchor: int = 200
+    max_members_per_list: int = 1000
+
+
+class BudgetSettings(BaseModel):
+    # Re-split discovery requests across origins (each hashtag, list, anchor)
+    # by their past matches per request; see budget.py
+    adaptive: bool = True
+    # Requests per discovery run; None = what the static limits would spend
+    total_requests: Optional[int] = None
+    # Weight of the prior (the overall match rate), in requests
+    prior_requests: float = 5.0
+    # Most an origin can get, as a multiple of its static budget
+    max_multiplier: float = 5.0
+
+
+class InteractionSettings(BaseModel):
+    # Discover accounts that like/repost/reply to anchors' recent posts
+    # (also `discover --interactions`)
+    enabled: bool = False
+    posts_per_anchor: int = 10
+    # Most XRPC requests per anchor: 1 feed + likes/reposts/thread pages
+    requests_per_anchor: int = 30
+    workers: int = 4
+    # A candidate's score is the weighted count of its interactions
+    like_weight: float = 1.0
+    repost_weight: float = 2.0
+    reply_weight: float = 3.0
+    min_score: float = 2.0
+    max_candidates_per_anchor: int = 200
+
+
+class LlmEndpoint(BaseModel):
+    model: str
+    # None = OPENROUTER_BASE_URL; any OpenAI-compatible endpoint works
+    base_url: Optional[str] = None
+    # Env var holding the endpoint's key; None = OPENROUTER_API_KEY
+    api_key_env: Optional[str] = None
+    name: Optional[str] = None  # in metrics/logs; defaults to the model
+
+
+class LlmSettings(BaseModel):
+    # Ask for JSON-schema structured output (response_format) built from
+    # LlmEvaluationResult. If the provider rejects it, the run falls back to
+    # asking for JSON in the prompt
+    structured_output: bool = True
+    # A verdict is ~150 tokens; the cap stops runaway rationales from billing
+    max_tokens: int = 600
+    # Re-asks that send back only the unparseable reply (not the profile and
+    # posts) for fixing; 0 = give up on the first bad reply
+    repair_attempts: int = 1
+    # With several topics, score every topic a candidate needs in a single
+    # request (max_tokens then applies per topic); False = one request each
+    multi_topic: bool = True
+    # USD per million tokens, for providers that don't report each call's
+    # cost (OpenRouter does)
+    prompt_usd_per_mtok: float = 0.0
+    completion_usd_per_mtok: float = 0.0
+    # Per evaluate run (also `evaluate --max-tokens/--max-cost`); the run
+    # stops before a call that would likely cross one and the rest waits for
+    # the next run. None = unlimited
+    max_run_tokens: Optional[int] = None
+    max_run_cost: Optional[float] = None
+    # Tried in order when the primary (openrouter_model) errors, is slow or
+    # has its circuit open; see hedging.py
+    fallbacks: List[LlmEndpoint] = []
+    request_timeout_seconds: float = 60.0
+    # Race a second request once the first is slower than this quantile of
+    # the provider's recent latencies; the first answer wins
+    hedge: bool = True
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+    hedge_initial_seconds: float = 20.0  # until there are enough samples
+    # Consecutive errors that open a provider's circuit, and for how long
+    breaker_failures: int = 5
+    breaker_cooldown_seconds: float = 30.0
+
+
+class PublishSettings(BaseModel):
+    # The list `publish-list` keeps in sync with the matches: an at:// URI or
+    # bsky.app link of one of the account's own lists. None = the account's
+    # list called `list_name`, created on the first publish
+    list_uri: Optional[str] = None
+    list_name: str = "DC-area tech"
+    list_description: str = "DC / NoVA / Maryland tech people, found by bluesky-finder"
+    labels: List[str] = ["match"]
+    # PDS write limits: 5,000 points an hour and 35,000 a day; a create
+    # costs 3 points, a delete 1
+    points_per_hour: int = 5000
+    points_per_day: int = 35000
+
+
+class ApiSettings(BaseModel):
+    # `serve`: read-only JSON API over the results. Binds to localhost only
+    # unless told otherwise; there is no authentication
+    host: str = "127.0.0.1"
+    port: int = 8787
+    page_size: int = 200
+    max_page_size: int = 1000
 
 
 class ScoringThresholds(BaseModel):
@@ -19,25 +117,129 @@ class ScoringThresholds(BaseModel):
     maybe_overall: float = 0.50
 
 
+class TopicProfile(BaseModel):
+    # What one topic looks for. Evaluations are stored per (DID, name), so
+    # renaming a topic leaves its old evaluations behind under the old name
+    name: str
+    title: str  # what a match is
+    location: str  # scored as score_location
+    subject: str  # scored as score_tech
+    subject_label: str = "Profession"
+    # None = the global scoring_thresholds
+    thresholds: Optional[ScoringThresholds] = None
+    # List `publish-list` syncs; None = publish.list_name for the first
+    # topic, the title for the others
+    list_name: Optional[str] = None
+
+
+DEFAULT_TOPIC = TopicProfile(
+    name="dc-tech",
+    title="DC-area Tech Professional",
+    location="DC / Northern VA / Maryland suburbs (DMV).",
+    subject="Software, Data, Security, Product, Design, DevRel, etc.",
+)
+
+
+class SimilaritySettings(BaseModel):
+    enabled: bool = True
+    dimensions: int = 1024
+    # Need this many confirmed matches before the centroid is trusted
+    min_matches: int = 20
+    # 0 = score against the centroid, otherwise mean of the k nearest matches
+    k_neighbors: int = 0
+    # Unevaluated candidates below this cosine similarity skip the LLM
+    reject_below: float = 0.05
+
+
+class DedupeSettings(BaseModel):
+    enabled: bool = True
+    # Changing num_perm/bands/shingle_size needs `dedupe --rebuild`
+    num_perm: int = 64
+    bands: int = 16
+    shingle_size: int = 3
+    # Estimated Jaccard at or above this counts as a near-duplicate
+    jaccard_threshold: float = 0.7
+    # Bucket-mates verified per post and direction (self / other accounts)
+    max_compare: int = 8
+    min_posts: int = 5
+    max_self_dup_ratio: float = 0.5
+    max_cross_dup_ratio: float = 0.5
+
+
+class StorageSettings(BaseModel):
+    # Store new post text dictionary-compressed (see codec.py)
+    compress_posts: bool = True
+    # Retention, applied by `compact` (None = keep everything)
+    keep_posts_per_author: Optional[int] = None
+    max_post_age_days: Optional[int] = None
+    # Drop posts of candidates already labelled "no"
+    drop_rejected_posts: bool = True
+    # Drop posts of accounts found deleted, taken down or blocked
+    drop_gone_posts: bool = True
+
+
+class FetchFailureSettings(BaseModel):
+    # Accounts whose fetch failed transiently (rate limit, 5xx, deactivated)
+    # wait base * 2^(failures - 1) before the next try, capped at max
+    retry_base_minutes: int = 30
+    retry_max_hours: int = 168  # 1 week
+
+
+class KeywordGateSettings(BaseModel):
+    # FTS5 terms/phrases (e.g. "arlington", "capital bikeshare", "wmata*");
+    # unevaluated candidates whose bio and posts match none skip the LLM.
+    # Empty = gate disabled.
+    terms: List[str] = []
+
+
 class AppConfig(BaseSettings):
     # Seed Data
     seed_hashtags: List[str] = ["#python", "#terraform", "#rstats"]
     anchor_handles: List[str] = ["capitalweather.bsky.social"]
+    # Curated lists / starter packs whose members are candidates: at:// URIs
+    # or bsky.app links (.../profile/<actor>/lists/<rkey>,
+    # .../starter-pack/<actor>/<rkey>)
+    seed_lists: List[str] = []
 
     # Limits
     discovery_limits: DiscoveryLimits = DiscoveryLimits()
+    interactions: InteractionSettings = InteractionSettings()
+    discovery_budget: BudgetSettings = BudgetSettings()
     fetch_posts_limit: int = 50
+    fetch_failures: FetchFailureSettings = FetchFailureSettings()
 
     # TTLs (hours)
     ttl_profile_hours: int = 24
     ttl_posts_hours: int = 6
     ttl_llm_hours: int = 168  # 1 week
+    ttl_identity_hours: int = 24  # handle <-> DID mappings
 
     # Storage
     db_path: Path = Path("dctech.db")
+    vectors_path: Path = Path("dctech.vectors.npy")
+    # `export --incremental`: a snapshot, delta files and manifest.json
+    export_dir: Path = Path("exports")
+
+    # Record every AT Protocol and LLM exchange to this SQLite cassette, or
+    # replay a recorded run from it offline (see cassette.py); None = live
+    cassette_path: Optional[Path] = Field(None, validation_alias="CASSETTE")
+    cassette_mode: Literal["record", "replay"] = Field(
+        "replay", validation_alias="CASSETTE_MODE"
+    )
+
+    # Run reports (JSON per command) and optional Prometheus textfile
+    reports_dir: Optional[Path] = Path("reports")
+    metrics_textfile: Optional[Path] = Field(None, validation_alias="METRICS_TEXTFILE")
 
-    # LLM (OpenRouter / OpenAI-compatible)
-    openrouter_api_key: str = Field(..., validation_alias="OPENROUTER_API_KEY")
+    # Bluesky (None = SDK default, https://bsky.social)
+    bsky_base_url: Optional[str] = Field(None, validation_alias="BSKY_BASE_URL")
+    # Saved session tokens (owner-only file) so runs skip password login;
+    # None = always log in with BSKY_USERNAME/BSKY_PASSWORD
+    session_path: Optional[Path] = Path(".bsky_session.json")
+
+    # LLM (OpenRouter / OpenAI-compatible). Keys are only checked when an
+    # LLM client is first needed, so export/status/search run without them
+    openrouter_api_key: Optional[str] = Field(None, validation_alias="OPENROUTER_API_KEY")
     openrouter_base_url: str = Field(
         "https://openrouter.ai/api/v1",
         validation_alias="OPENROUTER_BASE_URL",
@@ -48,11 +250,24 @@ class AppConfig(BaseSettings):
     )
 
     # LLM
-    openai_api_key: str = Field(..., validation_alias="OPENAI_API_KEY")
+    openai_api_key: Optional[str] = Field(None, validation_alias="OPENAI_API_KEY")
     openai_model: str = "gpt-4-turbo-preview"
+    llm: LlmSettings = LlmSettings()
+
+    # Topics candidates are evaluated for. Discovery, profiles and posts are
+    # shared; evaluations are kept per topic. Commands that read results use
+    # `topic` (TOPIC / --topic), the first one when unset
+    topics: List[TopicProfile] = [DEFAULT_TOPIC]
+    topic: Optional[str] = Field(None, validation_alias="TOPIC")
 
     # Scoring
     scoring_thresholds: ScoringThresholds = ScoringThresholds()
+    similarity: SimilaritySettings = SimilaritySettings()
+    dedupe: DedupeSettings = DedupeSettings()
+    keyword_gate: KeywordGateSettings = KeywordGateSettings()
+    storage: StorageSettings = StorageSettings()
+    publish: PublishSettings = PublishSettings()
+    api: ApiSettings = ApiSettings()
 
     model_config = SettingsConfigDict(
         env_prefix="",
@@ -60,6 +275,25 @@ class AppConfig(BaseSettings):
         extra="ignore",
     )
 
+    @property
+    def current_topic(self) -> TopicProfile:
+        """The topic results are read for: `topic`, else the first configured."""
+        if self.topic is None:
+            return self.topics[0]
+        for topic in self.topics:
+            if topic.name == self.topic:
+                return topic
+        names = ", ".join(t.name for t in self.topics)
+        raise ValueError(f"Unknown topic {self.topic!r} (configured: {names})")
+
+    @property
+    def evaluate_topics(self) -> List[TopicProfile]:
+        """Topics `evaluate` scores: every configured one unless `topic` is set."""
+        return list(self.topics) if self.topic is None else [self.current_topic]
+
+    def thresholds_for(self, topic: TopicProfile) -> ScoringThresholds:
+        return topic.thresholds or self.scoring_thresholds
+
     @property
     def min_interval_profile_refresh(self) -> timedelta:
         return timedelta(hours=self.ttl_profile_hours)
@@ -72,5 +306,9 @@ class AppConfig(BaseSettings):
     def min_interval_llm_refresh(self) -> timedelta:
         return timedelta(hours=self.ttl_llm_hours)
 
+    @property
+    def min_interval_identity_refresh(self) -> timedelta:
+        return timedelta(hours=self.ttl_identity_hours)
+
 
 settings = AppConfig()
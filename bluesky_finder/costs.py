@@ -0,0 +1,126 @@
+"""LLM spend per evaluate run and per model, and what a match costs.
+
+Each evaluate run records its calls, tokens and cost in `evaluation_runs`
+(failed and repair calls included); each evaluation keeps its own share on
+llm_evals (a request that scored several topics is split evenly between
+them). A run is credited with the current topic's matches among the
+evaluations written while it ran, the same way discovery runs are in
+sources.py.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+
+from .database import DbEvaluationRun, DbLlmEval, in_topic
+
+
+@dataclass
+class RunCost:
+    run_id: int
+    started_at: datetime
+    model: Optional[str]
+    calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    cost_usd: float
+    evaluated: int
+    matches: int
+    stop_reason: Optional[str]
+
+    @property
+    def cost_per_match(self) -> Optional[float]:
+        return self.cost_usd / self.matches if self.matches else None
+
+    @property
+    def tokens_per_match(self) -> Optional[float]:
+        tokens = self.prompt_tokens + self.completion_tokens
+        return tokens / self.matches if self.matches else None
+
+    def as_dict(self) -> dict:
+        return {
+            **self.__dict__,
+            "cost_per_match": self.cost_per_match,
+            "tokens_per_match": self.tokens_per_match,
+        }
+
+
+def run_costs(db: Session) -> List[RunCost]:
+    """Each finished evaluate run's spend and the matches it produced."""
+    matched = case((DbLlmEval.label == "match", 1), else_=0)
+    rows = (
+        db.query(
+            DbEvaluationRun.id,
+            DbEvaluationRun.started_at,
+            DbEvaluationRun.model,
+            DbEvaluationRun.calls,
+            DbEvaluationRun.prompt_tokens,
+            DbEvaluationRun.completion_tokens,
+            DbEvaluationRun.cost_usd,
+            DbEvaluationRun.evaluated,
+            func.coalesce(func.sum(matched), 0),
+            DbEvaluationRun.stop_reason,
+        )
+        .outerjoin(
+            DbLlmEval,
+            and_(
+                DbLlmEval.run_at >= DbEvaluationRun.started_at,
+                DbLlmEval.run_at <= DbEvaluationRun.finished_at,
+                DbLlmEval.prompt_tokens.isnot(None),
+                in_topic(),
+            ),
+        )
+        .filter(DbEvaluationRun.finished_at.isnot(None))
+        .group_by(DbEvaluationRun.id)
+        .order_by(DbEvaluationRun.id)
+    )
+    return [RunCost(*row) for row in rows]
+
+
+def model_costs(db: Session) -> List[RunCost]:
+    """
+    Spend and matches of the current topic's evaluations, per model (run_id 0).
+    Only successful calls are in here; `run_costs` has the full bill.
+    """
+    matched = case((DbLlmEval.label == "match", 1), else_=0)
+    rows = (
+        db.query(
+            DbLlmEval.model,
+            func.count(DbLlmEval.did),
+            func.sum(DbLlmEval.prompt_tokens),
+            func.sum(DbLlmEval.completion_tokens),
+            func.sum(func.coalesce(DbLlmEval.cost_usd, 0.0)),
+            func.sum(matched),
+            func.min(DbLlmEval.run_at),
+        )
+        .filter(DbLlmEval.prompt_tokens.isnot(None), in_topic())
+        .group_by(DbLlmEval.model)
+        .order_by(DbLlmEval.model)
+    )
+    return [
+        RunCost(0, first, model, n, prompt, completion, cost, n, matches, None)
+        for model, n, prompt, completion, cost, matches, first in rows
+    ]
+
+
+def format_costs(rows: List[RunCost], by_model: bool = False) -> str:
+    first = f"{'model':<36}" if by_model else f"{'run':>4} {'started':<17}"
+    lines = [
+        f"{first} {'evals':>6} {'tokens':>10} {'cost $':>9} {'match':>6} "
+        f"{'$/match':>8} {'stop':<6}"
+    ]
+    for r in rows:
+        if by_model:
+            name = r.model or "?"
+            head = f"{name if len(name) <= 36 else '...' + name[-33:]:<36}"
+        else:
+            head = f"{r.run_id:>4} {r.started_at:%Y-%m-%d %H:%M}"
+        per_match = f"{r.cost_per_match:.4f}" if r.cost_per_match is not None else "-"
+        lines.append(
+            f"{head} {r.evaluated:>6} {r.prompt_tokens + r.completion_tokens:>10,} "
+            f"{r.cost_usd:>9.4f} {r.matches:>6} {per_match:>8} {r.stop_reason or '':<6}"
+        )
+    return "\n".join(lines)
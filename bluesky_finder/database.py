@@ -1,6 +1,8 @@
 from datetime import datetime
+from typing import Dict, Optional, Union
 from sqlalchemy import (
     create_engine,
+    event,
     Column,
     String,
     Integer,
@@ -9,20 +11,62 @@ from sqlalchemy import (
     JSON,
     ForeignKey,
     Boolean,
+    LargeBinary,
+    Index,
+    select,
+    text,
 )
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship, Session
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import (
+    attribute_keyed_dict,
+    declarative_base,
+    sessionmaker,
+    relationship,
+    Session,
+)
+from sqlalchemy.types import TypeDecorator
+from .codec import compress_text, decompress_text
 from .config import settings
 
 Base = declarative_base()
 
 
+class CompressedText(TypeDecorator):
+    """
+    Text stored as a dictionary-compressed blob (see codec.py) when
+    settings.storage.compress_posts is on and that is smaller. Reads accept
+    both, so rows written before compression was enabled stay readable.
+    Reads in SQL that need the text itself go through the unz() function,
+    which only this package's connections have (see _on_connect).
+    """
+
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if settings.storage.compress_posts:
+            return compress_text(value)
+        return value
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
+
+
 class DbCandidate(Base):
     __tablename__ = "candidates"
     did = Column(String, primary_key=True)
     handle = Column(String, index=True)
     # Storing set as JSON list
     discovery_sources = Column(JSON, default=list)
-    discovered_at = Column(DateTime, default=datetime.utcnow)
+    discovered_at = Column(DateTime, default=datetime.utcnow, index=True)
+    # Last successful posts fetch; retention may leave a candidate with no
+    # posts, and that must not look like "never fetched"
+    posts_fetched_at = Column(DateTime, nullable=True)
+    # Origin (hashtag/anchor/list, see sources.py) that first found this
+    # candidate; credits its eventual label to that origin's yield
+    discovered_via = Column(String, nullable=True, index=True)
+    # Highest weighted like/repost/reply count towards one anchor's posts
+    interaction_score = Column(Float, nullable=True)
 
     profile = relationship(
         "DbProfile",
@@ -33,13 +77,19 @@ class DbCandidate(Base):
     posts = relationship(
         "DbPost", back_populates="candidate", cascade="all, delete-orphan"
     )
-    llm_eval = relationship(
+    # Evaluations by topic name (see TopicProfile)
+    llm_evals = relationship(
         "DbLlmEval",
         back_populates="candidate",
-        uselist=False,
+        collection_class=attribute_keyed_dict("topic"),
         cascade="all, delete-orphan",
     )
 
+    @property
+    def llm_eval(self) -> Optional["DbLlmEval"]:
+        """The evaluation for the current topic, if any."""
+        return self.llm_evals.get(settings.current_topic.name)
+
 
 class DbProfile(Base):
     __tablename__ = "profiles"
@@ -50,7 +100,7 @@ class DbProfile(Base):
     display_name = Column(String, nullable=True)
     description = Column(String, nullable=True)
     avatar_url = Column(String, nullable=True)
-    fetched_at = Column(DateTime, default=datetime.utcnow)
+    fetched_at = Column(DateTime, default=datetime.utcnow, index=True)
 
     candidate = relationship("DbCandidate", back_populates="profile")
 
@@ -61,7 +111,7 @@ class DbPost(Base):
     cid = Column(String)
     author_did = Column(String, ForeignKey("candidates.did"), index=True)
     created_at = Column(DateTime)
-    text = Column(String)
+    text = Column(CompressedText)
     is_repost = Column(Boolean, default=False)
 
     candidate = relationship("DbCandidate", back_populates="posts")
@@ -70,6 +120,7 @@ class DbPost(Base):
 class DbLlmEval(Base):
     __tablename__ = "llm_evals"
     did = Column(String, ForeignKey("candidates.did"), primary_key=True)
+    topic = Column(String, primary_key=True)  # TopicProfile.name
     model = Column(String)
     run_at = Column(DateTime, default=datetime.utcnow)
     score_location = Column(Float)
@@ -79,11 +130,669 @@ class DbLlmEval(Base):
     rationale = Column(String)
     evidence = Column(JSON)
     uncertainties = Column(JSON)
+    # What the evaluation cost, repair re-asks included (NULL before tracking
+    # and for local auto-rejects)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    cost_usd = Column(Float, nullable=True)
+
+    candidate = relationship("DbCandidate", back_populates="llm_evals")
+
+    # Keyset pagination for the results browser: (score, did) walks in index
+    # order within a topic, with or without a label filter
+    __table_args__ = (
+        Index("ix_llm_evals_overall", "topic", "score_overall", "did"),
+        Index("ix_llm_evals_tech", "topic", "score_tech", "did"),
+        Index("ix_llm_evals_location", "topic", "score_location", "did"),
+        Index("ix_llm_evals_label_overall", "topic", "label", "score_overall", "did"),
+        Index("ix_llm_evals_label_tech", "topic", "label", "score_tech", "did"),
+        Index(
+            "ix_llm_evals_label_location", "topic", "label", "score_location", "did"
+        ),
+        # The API's evaluation feed: (run_at, did) in order of evaluation
+        Index("ix_llm_evals_run_at", "topic", "run_at", "did"),
+    )
+
+
+def in_topic(topic: Optional[str] = None):
+    """Filter on DbLlmEval rows of `topic` (default: the current topic)."""
+    return DbLlmEval.topic == (topic or settings.current_topic.name)
+
+
+# Both dedupe tables refer to posts by rowid instead of repeating the uri and
+# author strings in every row; authors come from a join with posts. Deleting
+# a post drops its rows (see _DEDUPE_TRIGGERS), and a full VACUUM, which may
+# renumber rowids, empties both (storage.vacuum).
+
+
+class DbPostSignature(Base):
+    """MinHash signature of a post's text (empty when the post has no shingles)."""
+
+    __tablename__ = "post_signatures"
+    post_id = Column(Integer, primary_key=True)  # posts.rowid
+    signature = Column(LargeBinary)
+    computed_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class DbLshBucket(Base):
+    """One row per (post, LSH band); posts sharing a bucket are near-dup candidates."""
+
+    __tablename__ = "lsh_buckets"
+    band = Column(Integer, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    post_id = Column(Integer, primary_key=True)  # posts.rowid
+
+    __table_args__ = (
+        Index("ix_lsh_buckets_post_id", "post_id"),
+        {"sqlite_with_rowid": False},
+    )
+
+
+class DbSpamFlag(Base):
+    __tablename__ = "spam_flags"
+    did = Column(String, ForeignKey("candidates.did"), primary_key=True)
+    posts = Column(Integer)
+    self_dup_ratio = Column(Float)
+    cross_dup_ratio = Column(Float)
+    flagged = Column(Boolean, default=False, index=True)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+    # Some of the account's signed posts were deleted since; `dedupe` re-checks
+    stale = Column(Boolean, default=False)
+
+
+class DbIdentity(Base):
+    """Last known handle of a DID (see identity.py). Handles move; DIDs don't."""
+
+    __tablename__ = "identities"
+    did = Column(String, primary_key=True)
+    # A handle belongs to one DID at a time; NULL once another DID took it
+    handle = Column(String)
+    # Earlier handles of this DID, oldest first
+    previous_handles = Column(JSON, default=list)
+    resolved_at = Column(DateTime, default=datetime.utcnow)
+    changed_at = Column(DateTime, nullable=True, index=True)
+
+    __table_args__ = (Index("ux_identities_handle", "handle", unique=True),)
+
+
+class DbSourceYield(Base):
+    """Cumulative discovery cost and outcome of one origin (hashtag, anchor, list)."""
+
+    __tablename__ = "source_yields"
+    origin = Column(String, primary_key=True)
+    source = Column(String, index=True)  # DiscoverySource value
+    runs = Column(Integer, default=0, nullable=False)
+    requests = Column(Integer, default=0, nullable=False)
+    seen = Column(Integer, default=0, nullable=False)
+    new_candidates = Column(Integer, default=0, nullable=False)
+    last_run_at = Column(DateTime, nullable=True)
+    # Paging cursors to continue from next run ({} = start over)
+    cursors = Column(JSON, default=dict)
+
+
+class DbDiscoveryRun(Base):
+    """One discovery run's spend; its matches are the candidates found in between."""
+
+    __tablename__ = "discovery_runs"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    adaptive = Column(Boolean, default=False)
+    requests = Column(Integer, default=0)
+    new_candidates = Column(Integer, default=0)
+    # Requests allotted per origin
+    budgets = Column(JSON, default=dict)
+
+
+class DbEvaluationRun(Base):
+    """One evaluate run's LLM spend, failed calls included; its matches are the
+    evaluations written in between."""
+
+    __tablename__ = "evaluation_runs"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    model = Column(String, nullable=True)  # as reported by the provider
+    calls = Column(Integer, default=0)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    cost_usd = Column(Float, default=0.0)
+    evaluated = Column(Integer, default=0)
+    # The run's budgets, and why it stopped early: "tokens"/"cost" (a budget),
+    # "cancelled" or "error"; totals are written either way
+    max_tokens = Column(Integer, nullable=True)
+    max_cost = Column(Float, nullable=True)
+    stop_reason = Column(String, nullable=True)
+
+
+class DbListMember(Base):
+    """An account on a list we publish to (see publish.py)."""
+
+    __tablename__ = "list_members"
+    list_uri = Column(String, primary_key=True)
+    did = Column(String, primary_key=True)
+    rkey = Column(String, nullable=True)  # of its listitem; NULL until created
+    # "present", or "adding"/"removing" while an applyWrites batch touching it
+    # is in flight. Leftovers mean a run died mid-batch: reconcile first
+    state = Column(String, nullable=False, default="present")
+    added_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DbListWriteBatch(Base):
+    """One applyWrites commit to a published list, for the PDS write budget."""
+
+    __tablename__ = "list_write_batches"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    list_uri = Column(String)
+    at = Column(DateTime, default=datetime.utcnow, index=True)
+    creates = Column(Integer, default=0)
+    deletes = Column(Integer, default=0)
+    points = Column(Integer, default=0)
+
+
+class DbExportState(Base):
+    """What incremental exports have published per candidate (see exports.py)."""
+
+    __tablename__ = "export_state"
+    topic = Column(String, primary_key=True)
+    did = Column(String, primary_key=True)
+    label = Column(String)
+    # sha1 of the exported row; an unchanged row isn't written again
+    digest = Column(String)
+    exported_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DbFetchFailure(Base):
+    """An account whose profile or feed couldn't be fetched (see failures.py)."""
+
+    __tablename__ = "fetch_failures"
+    did = Column(String, ForeignKey("candidates.did"), primary_key=True)
+    # "permanent" (deleted, taken down, blocked): left out of every stage;
+    # "transient": retried once retry_after has passed
+    kind = Column(String, nullable=False)
+    reason = Column(String)
+    failures = Column(Integer, default=1, nullable=False)
+    first_failed_at = Column(DateTime, default=datetime.utcnow)
+    last_failed_at = Column(DateTime, default=datetime.utcnow, index=True)
+    retry_after = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_fetch_failures_kind_retry", "kind", "retry_after"),)
+
+
+def not_gone(did_column):
+    """Filter out DIDs whose accounts are permanently gone."""
+    return did_column.not_in(
+        select(DbFetchFailure.did).where(DbFetchFailure.kind == "permanent")
+    )
+
+
+class DbStat(Base):
+    """Aggregate counters kept current by SQLite triggers (see _STATS_TRIGGERS)."""
+
+    __tablename__ = "stats"
+    key = Column(String, primary_key=True)
+    value = Column(Integer, default=0, nullable=False)
+
+
+def _bump(key_sql: str, delta: Union[int, str]) -> str:
+    return (
+        f"INSERT INTO stats (key, value) VALUES ({key_sql}, {delta}) "
+        "ON CONFLICT(key) DO UPDATE SET value = stats.value + excluded.value;"
+    )
+
+
+def _bump_sources(column: str, delta: int) -> str:
+    return (
+        f"INSERT INTO stats (key, value) SELECT 'source:' || value, {delta} "
+        f"FROM json_each({column}) WHERE true "
+        "ON CONFLICT(key) DO UPDATE SET value = stats.value + excluded.value;"
+    )
+
+
+def _label_key(row: str) -> str:
+    return f"'label:' || {row}.topic || ':' || coalesce({row}.label, '')"
+
+
+# Every write path (ORM, raw SQL, other tools) updates the counters in the
+# same transaction, so reading stats never needs a COUNT(*) over big tables.
+_STATS_TRIGGERS = {
+    "stats_candidates_ins": (
+        "AFTER INSERT ON candidates",
+        _bump("'candidates'", 1) + _bump_sources("NEW.discovery_sources", 1),
+    ),
+    "stats_candidates_del": (
+        "AFTER DELETE ON candidates",
+        _bump("'candidates'", -1) + _bump_sources("OLD.discovery_sources", -1),
+    ),
+    "stats_candidates_upd": (
+        "AFTER UPDATE OF discovery_sources ON candidates",
+        _bump_sources("OLD.discovery_sources", -1)
+        + _bump_sources("NEW.discovery_sources", 1),
+    ),
+    "stats_profiles_ins": ("AFTER INSERT ON profiles", _bump("'profiles'", 1)),
+    "stats_profiles_del": ("AFTER DELETE ON profiles", _bump("'profiles'", -1)),
+    "stats_posts_ins": ("AFTER INSERT ON posts", _bump("'posts'", 1)),
+    "stats_posts_del": ("AFTER DELETE ON posts", _bump("'posts'", -1)),
+    # Per topic: 'evals:<topic>' and 'label:<topic>:<label>'
+    "stats_evals_ins": (
+        "AFTER INSERT ON llm_evals",
+        _bump("'evals:' || NEW.topic", 1) + _bump(_label_key("NEW"), 1),
+    ),
+    "stats_evals_del": (
+        "AFTER DELETE ON llm_evals",
+        _bump("'evals:' || OLD.topic", -1) + _bump(_label_key("OLD"), -1),
+    ),
+    "stats_evals_upd": (
+        "AFTER UPDATE OF label ON llm_evals",
+        _bump(_label_key("OLD"), -1) + _bump(_label_key("NEW"), 1),
+    ),
+    "stats_spam_ins": (
+        "AFTER INSERT ON spam_flags WHEN NEW.flagged",
+        _bump("'spam_flagged'", 1),
+    ),
+    "stats_spam_del": (
+        "AFTER DELETE ON spam_flags WHEN OLD.flagged",
+        _bump("'spam_flagged'", -1),
+    ),
+    "stats_spam_upd": (
+        "AFTER UPDATE OF flagged ON spam_flags",
+        _bump("'spam_flagged'", "(NEW.flagged = 1) - (OLD.flagged = 1)"),
+    ),
+    # 'failed:permanent' / 'failed:transient'
+    "stats_failures_ins": (
+        "AFTER INSERT ON fetch_failures",
+        _bump("'failed:' || NEW.kind", 1),
+    ),
+    "stats_failures_del": (
+        "AFTER DELETE ON fetch_failures",
+        _bump("'failed:' || OLD.kind", -1),
+    ),
+    "stats_failures_upd": (
+        "AFTER UPDATE OF kind ON fetch_failures",
+        _bump("'failed:' || OLD.kind", -1) + _bump("'failed:' || NEW.kind", 1),
+    ),
+}
+
+# Deleting a post (fetch replacing an author's posts, `compact` retention,
+# any other writer) drops its signature and buckets right away and marks the
+# author for re-checking, so `dedupe` never has to diff against all of posts.
+_DEDUPE_TRIGGERS = {
+    "dedupe_posts_del": (
+        "AFTER DELETE ON posts",
+        "DELETE FROM lsh_buckets WHERE post_id = OLD.rowid; "
+        "DELETE FROM post_signatures WHERE post_id = OLD.rowid; "
+        "UPDATE spam_flags SET stale = 1 "
+        "WHERE did = OLD.author_did AND stale IS NOT 1;",
+    ),
+}
+
+# One counter ('changes') bumped by every write to the tables results are read
+# from, so "has anything changed?" is a single-row lookup; the HTTP API builds
+# its ETags from it. Post updates are left out: `compact` only re-encodes text.
+_CHANGE_TRIGGERS = {
+    f"changes_{table}_{op.lower()}": (f"AFTER {op} ON {table}", _bump("'changes'", 1))
+    for table, ops in [
+        ("candidates", ["INSERT", "UPDATE", "DELETE"]),
+        ("profiles", ["INSERT", "UPDATE", "DELETE"]),
+        ("posts", ["INSERT", "DELETE"]),
+        ("llm_evals", ["INSERT", "UPDATE", "DELETE"]),
+        ("spam_flags", ["INSERT", "UPDATE", "DELETE"]),
+        # Accounts going (or coming back) drop out of (or return to) results
+        ("fetch_failures", ["INSERT", "UPDATE", "DELETE"]),
+    ]
+    for op in ops
+}
+
+
+# Full-text indexes over bios and posts, kept in step by triggers keyed on
+# the indexed table's rowid. None of the triggers call application-defined
+# functions, so the sqlite3 CLI and other tools can still write every table.
+# fts table -> (indexed table, columns, content)
+_FTS_TABLES = {
+    # "external": the text is stored once, in profiles
+    "profiles_fts": ("profiles", ["display_name", "description"], "external"),
+    # "decoded": post text may be a compressed blob, which plain SQL can't
+    # read. Triggers index plain text and queue compressed rows in
+    # posts_fts_pending, whichever connection wrote them (ORM, Core, raw SQL);
+    # index_pending_fts() decodes and indexes the queue when a database is
+    # opened, before every search and after `compact`. With SQLite >= 3.43
+    # the index is contentless and stores no copy of the text; older
+    # versions can't delete from a contentless index by rowid, so there it
+    # keeps its own decoded copy.
+    "posts_fts": ("posts", ["text"], "decoded"),
+}
+
+# First SQLite whose contentless FTS5 tables can delete rows by rowid
+_CONTENTLESS_DELETE = (3, 43, 0)
+
+
+def _contentless_delete(conn) -> bool:
+    version = conn.execute(text("SELECT sqlite_version()")).scalar()
+    return tuple(int(part) for part in version.split(".")) >= _CONTENTLESS_DELETE
+
+
+def _fts_options(table: str, content: str, contentless: bool) -> str:
+    if content == "external":
+        return f"content='{table}', content_rowid='rowid', "
+    return "content='', contentless_delete=1, " if contentless else ""
+
+
+def _fts_current(existing: str, options: str) -> bool:
+    """Whether an FTS table was created with `options` (see _fts_options)."""
+    if options:
+        return options.rstrip(", ") in existing
+    return "content=" not in existing
+
+
+def _fts_triggers(
+    fts: str, table: str, columns: list, content: str
+) -> Dict[str, str]:
+    def values(row: str) -> str:
+        return ", ".join(f"{row}.{c}" for c in columns)
+
+    cols = ", ".join(columns)
+    if content == "external":
+        insert = (
+            f"INSERT INTO {fts} (rowid, {cols}) VALUES (NEW.rowid, {values('NEW')});"
+        )
+        delete = (
+            f"INSERT INTO {fts} ({fts}, rowid, {cols}) "
+            f"VALUES ('delete', OLD.rowid, {values('OLD')});"
+        )
+        changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in columns)
+        return {
+            f"{fts}_ins": f"AFTER INSERT ON {table} BEGIN {insert} END",
+            f"{fts}_del": f"AFTER DELETE ON {table} BEGIN {delete} END",
+            f"{fts}_upd": (
+                f"AFTER UPDATE OF {cols} ON {table} WHEN {changed} "
+                f"BEGIN {delete} {insert} END"
+            ),
+        }
+    # Decoded: plain text goes straight in, blobs wait in the queue. Deletes
+    # go by rowid, which needs neither the old text nor a decoder
+    plain = " AND ".join(f"typeof(NEW.{c}) != 'blob'" for c in columns)
+    insert = (
+        f"INSERT INTO {fts} (rowid, {cols}) "
+        f"SELECT NEW.rowid, {values('NEW')} WHERE {plain}; "
+        f"INSERT OR IGNORE INTO {fts}_pending (rowid) "
+        f"SELECT NEW.rowid WHERE NOT ({plain});"
+    )
+    delete = (
+        f"DELETE FROM {fts} WHERE rowid = OLD.rowid; "
+        f"DELETE FROM {fts}_pending WHERE rowid = OLD.rowid;"
+    )
+    return {
+        f"{fts}_ins": f"AFTER INSERT ON {table} BEGIN {insert} END",
+        f"{fts}_del": f"AFTER DELETE ON {table} BEGIN {delete} END",
+        f"{fts}_upd": f"AFTER UPDATE OF {cols} ON {table} BEGIN {delete} {insert} END",
+    }
 
-    candidate = relationship("DbCandidate", back_populates="llm_eval")
+
+def index_pending_fts(conn) -> int:
+    """Index the compressed rows the triggers queued. Returns rows indexed."""
+    indexed = 0
+    for fts, (table, columns, content) in _FTS_TABLES.items():
+        if content != "decoded":
+            continue
+        queued = conn.execute(text(f"SELECT 1 FROM {fts}_pending LIMIT 1")).first()
+        if not queued:
+            continue
+        cols = ", ".join(columns)
+        decoded = ", ".join(f"unz(t.{c})" for c in columns)
+        indexed += conn.execute(
+            text(
+                f"INSERT INTO {fts} (rowid, {cols}) SELECT t.rowid, {decoded} "
+                f"FROM {fts}_pending q JOIN {table} t ON t.rowid = q.rowid"
+            )
+        ).rowcount
+        conn.execute(text(f"DELETE FROM {fts}_pending"))
+    return indexed
+
+
+def rebuild_fts(conn) -> None:
+    """Re-index every FTS table from its indexed table (backfill / repair)."""
+    for fts, (table, columns, content) in _FTS_TABLES.items():
+        if content == "external":
+            conn.execute(text(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')"))
+            continue
+        cols = ", ".join(columns)
+        decoded = ", ".join(f"unz({c})" for c in columns)
+        conn.execute(text(f"DELETE FROM {fts}"))
+        conn.execute(text(f"DELETE FROM {fts}_pending"))
+        conn.execute(
+            text(
+                f"INSERT INTO {fts} (rowid, {cols}) "
+                f"SELECT rowid, {decoded} FROM {table}"
+            )
+        )
+
+
+def rebuild_stats(conn) -> None:
+    """Recount every aggregate from scratch (one-off backfill / repair)."""
+    # The change counter isn't a count: it only ever goes up
+    conn.execute(text("DELETE FROM stats WHERE key != 'changes'"))
+    for sql in [
+        "SELECT 'candidates', COUNT(*) FROM candidates",
+        "SELECT 'profiles', COUNT(*) FROM profiles",
+        "SELECT 'posts', COUNT(*) FROM posts",
+        "SELECT 'evals:' || topic, COUNT(*) FROM llm_evals GROUP BY 1",
+        "SELECT 'spam_flagged', COUNT(*) FROM spam_flags WHERE flagged",
+        "SELECT 'label:' || topic || ':' || coalesce(label, ''), COUNT(*) "
+        "FROM llm_evals GROUP BY 1",
+        "SELECT 'source:' || j.value, COUNT(*) FROM candidates c, "
+        "json_each(c.discovery_sources) j GROUP BY 1",
+        "SELECT 'failed:' || kind, COUNT(*) FROM fetch_failures GROUP BY 1",
+    ]:
+        conn.execute(text(f"INSERT INTO stats (key, value) {sql}"))
+
+
+def _add_missing_columns(conn) -> None:
+    """create_all() never alters existing tables; add new (nullable) columns."""
+    for table in Base.metadata.sorted_tables:
+        existing = {
+            row[1] for row in conn.execute(text(f"PRAGMA table_info({table.name})"))
+        }
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = column.type.compile(dialect=conn.dialect)
+                conn.execute(
+                    text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {ddl}")
+                )
+
+
+# Tables whose primary key gained `topic`; their old rows belong to the
+# first configured topic
+_TOPIC_KEYED = ("llm_evals", "export_state")
+
+
+def _add_topic_keys(conn) -> bool:
+    """
+    Rebuild tables still keyed without `topic` (SQLite can't change a primary
+    key in place): rename, create anew, copy, drop. Dropping the old table
+    takes its triggers along; _ensure_schema recreates them. Returns True if
+    any table was rebuilt.
+    """
+    rebuilt = False
+    for name in _TOPIC_KEYED:
+        table = Base.metadata.tables[name]
+        columns = [row[1] for row in conn.execute(text(f"PRAGMA table_info({name})"))]
+        if not columns or "topic" in columns:
+            continue
+        for index in table.indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        conn.execute(text(f"ALTER TABLE {name} RENAME TO {name}_old"))
+        table.create(conn)
+        copied = ", ".join(c for c in columns if c in table.columns)
+        conn.execute(
+            text(
+                f"INSERT INTO {name} ({copied}, topic) "
+                f"SELECT {copied}, :topic FROM {name}_old"
+            ),
+            {"topic": settings.topics[0].name},
+        )
+        conn.execute(text(f"DROP TABLE {name}_old"))
+        rebuilt = True
+    return rebuilt
+
+
+def _rekey_dedupe_tables(conn) -> None:
+    """
+    Recreate post_signatures and lsh_buckets if they still have the old uri
+    keys. Their rows are dropped with them; the next `dedupe` signs every
+    post again.
+    """
+    columns = {row[1] for row in conn.execute(text("PRAGMA table_info(lsh_buckets)"))}
+    if "uri" not in columns:
+        return
+    for model in (DbLshBucket, DbPostSignature):
+        conn.execute(text(f"DROP TABLE {model.__tablename__}"))
+        model.__table__.create(conn)
+
+
+def _unique_handles(conn) -> None:
+    """
+    Before handles were unique, a handle that moved to another DID stayed on
+    the old one too. Keep it on the most recently resolved DID only, so the
+    unique index can be built.
+    """
+    built = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = 'ux_identities_handle'")
+    ).first()
+    if built:
+        return
+    conn.execute(
+        text(
+            "UPDATE identities SET handle = NULL WHERE did IN ("
+            "SELECT did FROM (SELECT did, ROW_NUMBER() OVER ("
+            "PARTITION BY handle ORDER BY resolved_at DESC, did) AS rn "
+            "FROM identities WHERE handle IS NOT NULL) WHERE rn > 1)"
+        )
+    )
+    conn.execute(text("DROP INDEX IF EXISTS ix_identities_handle"))
+
+
+def _on_connect(dbapi_conn, _record) -> None:
+    # SQL-side decoder for CompressedText (reads only: no trigger uses it)
+    dbapi_conn.create_function("unz", 1, decompress_text, deterministic=True)
+    # Only takes effect on a new database; `compact` converts old ones
+    dbapi_conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+
+def _ensure_schema(engine: Engine) -> None:
+    """Objects create_all() doesn't manage: columns and indexes added to
+    existing tables, triggers, FTS5 tables, plus one-off stats and full-text
+    backfills."""
+    with engine.begin() as conn:
+        rekeyed = _add_topic_keys(conn)
+        _rekey_dedupe_tables(conn)
+        _add_missing_columns(conn)
+        _unique_handles(conn)
+    for model in (DbCandidate, DbProfile, DbLlmEval, DbIdentity):
+        for index in model.__table__.indexes:
+            index.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        triggers = {**_STATS_TRIGGERS, **_CHANGE_TRIGGERS, **_DEDUPE_TRIGGERS}
+        for name, (when, body) in triggers.items():
+            conn.execute(
+                text(f"CREATE TRIGGER IF NOT EXISTS {name} {when} BEGIN {body} END")
+            )
+        initialized = conn.execute(
+            text("SELECT 1 FROM stats WHERE key = 'candidates'")
+        ).first()
+        if not initialized or rekeyed:
+            rebuild_stats(conn)
+
+        # Earlier versions indexed posts through a view decoding with unz()
+        conn.execute(text("DROP VIEW IF EXISTS posts_text"))
+
+        backfill = False
+        contentless = _contentless_delete(conn)
+        for fts, (table, columns, content) in _FTS_TABLES.items():
+            triggers = _fts_triggers(fts, table, columns, content)
+            options = _fts_options(table, content, contentless)
+            existing = conn.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :n"),
+                {"n": fts},
+            ).scalar()
+            stale = existing and not _fts_current(existing, options)
+            if content == "decoded":
+                queued = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE name = :n"),
+                    {"n": f"{fts}_pending"},
+                ).first()
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {fts}_pending "
+                    "(rowid INTEGER PRIMARY KEY)"
+                ))
+                if existing and not queued:
+                    # Triggers from before the queue left compressed rows to
+                    # the ORM: replace them, re-index everything once
+                    for name in triggers:
+                        conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+                    backfill = True
+            if stale:
+                # Index definition changed (e.g. now contentless): recreate
+                conn.execute(text(f"DROP TABLE {fts}"))
+                for name in triggers:
+                    conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+                existing = None
+            if not existing:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE {fts} USING fts5("
+                    f"{', '.join(columns)}, {options}"
+                    "tokenize='unicode61 remove_diacritics 2')"
+                ))
+                backfill = True
+            for name, body in triggers.items():
+                conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {name} {body}"))
+        if backfill:
+            rebuild_fts(conn)
+        else:
+            index_pending_fts(conn)
+
+
+def read_stats(db: Session, topic: Optional[str] = None) -> Dict[str, int]:
+    """
+    All maintained counters plus derived stage backlogs. O(#keys), not O(rows).
+    'evals' and 'label:<label>' are the given (default: current) topic's.
+    """
+    stats = {key: value for key, value in db.query(DbStat.key, DbStat.value)}
+    topic = topic or settings.current_topic.name
+    prefix = f"label:{topic}:"
+    for key, value in list(stats.items()):
+        if key.startswith(prefix):
+            stats["label:" + key[len(prefix):]] = value
+    stats["evals"] = stats.get(f"evals:{topic}", 0)
+    candidates = stats.get("candidates", 0)
+    profiles = stats.get("profiles", 0)
+    evals = stats["evals"]
+    # Approximate: candidates without a profile still need fetching (unless
+    # gone), profiled candidates without an evaluation still need scoring
+    gone = stats.get("failed:permanent", 0)
+    stats["backlog:fetch"] = max(candidates - profiles - gone, 0)
+    stats["backlog:evaluate"] = max(profiles - evals, 0)
+    return stats
+
+
+def change_counter(db: Session) -> int:
+    """Writes to the result tables so far; goes up with every change."""
+    return db.query(DbStat.value).filter(DbStat.key == "changes").scalar() or 0
+
+
+def format_stats(stats: Dict[str, int]) -> str:
+    return (
+        f"DB: {stats.get('candidates', 0)} candidates | "
+        f"{stats.get('evals', 0)} evaluated | "
+        f"{stats.get('label:match', 0)} match | "
+        f"{stats.get('label:maybe', 0)} maybe | "
+        f"backlog: {stats['backlog:fetch']} fetch, "
+        f"{stats['backlog:evaluate']} evaluate"
+    )
 
 
 def get_db() -> Session:
     engine = create_engine(f"sqlite:///{settings.db_path}")
+    event.listen(engine, "connect", _on_connect)
     Base.metadata.create_all(engine)
+    _ensure_schema(engine)
     return sessionmaker(bind=engine)()
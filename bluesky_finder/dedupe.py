@@ -0,0 +1,235 @@
+"""MinHash/LSH near-duplicate detection over stored post text.
+
+Each post gets a MinHash signature once; signatures are split into LSH bands
+and stored as (band, bucket, post rowid) rows, so only posts that share a
+bucket are ever compared. Deleted posts are dropped from both tables by a
+trigger, which also marks their author for re-checking. Accounts whose posts are mostly near-duplicates of their own
+posts (templated bots) or of other accounts' posts (spam rings) are flagged
+in `spam_flags` and skipped by evaluation.
+"""
+
+import hashlib
+import re
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, List, Set
+
+import numpy as np
+from sqlalchemy import DateTime, bindparam, insert, text
+from sqlalchemy.orm import Session
+
+from .config import DedupeSettings
+from .database import DbLshBucket, DbPostSignature, DbSpamFlag
+
+# Mersenne prime used by the universal hash family
+_PRIME = np.uint64((1 << 61) - 1)
+_WORD_RE = re.compile(r"\w+")
+_URL_RE = re.compile(r"https?://\S+")
+
+BATCH_SIZE = 2000
+
+
+def shingles(text: str, size: int) -> np.ndarray:
+    """Word n-gram shingles of normalized text, hashed to uint32."""
+    words = _WORD_RE.findall(_URL_RE.sub(" ", text.lower()))
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    if len(words) < size:
+        grams = {" ".join(words)}
+    else:
+        grams = {" ".join(words[i : i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter(
+        (zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64
+    )
+
+
+class MinHasher:
+    def __init__(self, num_perm: int, bands: int, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        rng = np.random.default_rng(seed)
+        # a, b < 2**31 and x < 2**32 keep a*x + b inside uint64
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+    def signature(self, shingle_hashes: np.ndarray) -> np.ndarray:
+        hashed = (np.outer(self.a, shingle_hashes) + self.b[:, None]) % _PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def band_buckets(self, signature: np.ndarray) -> List[int]:
+        buckets = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows : (band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(chunk, digest_size=8).digest()
+            buckets.append(int.from_bytes(digest, "big", signed=True))
+        return buckets
+
+
+def _similar(sig: np.ndarray, other: bytes, threshold: float) -> bool:
+    other_sig = np.frombuffer(other, dtype=np.uint32)
+    return bool(np.mean(sig == other_sig) >= threshold)
+
+
+class DuplicateDetector:
+    def __init__(self, db: Session, config: DedupeSettings):
+        self.db = db
+        self.config = config
+        self.hasher = MinHasher(config.num_perm, config.bands)
+
+    def rebuild(self):
+        """Drop every stored signature, bucket and flag."""
+        self.db.query(DbLshBucket).delete()
+        self.db.query(DbPostSignature).delete()
+        self.db.query(DbSpamFlag).delete()
+        self.db.commit()
+
+    def update(self) -> Dict[str, int]:
+        """Sign new posts and re-flag every affected account."""
+        started = datetime.utcnow()
+        affected: Set[str] = set()
+
+        # Accounts that lost signed posts since the last run; the posts' rows
+        # are already gone (_DEDUPE_TRIGGERS)
+        stale = [
+            did for (did,) in self.db.query(DbSpamFlag.did).filter(DbSpamFlag.stale)
+        ]
+        affected.update(stale)
+
+        signed = 0
+        while True:
+            batch = self.db.execute(
+                text(
+                    "SELECT p.rowid, p.author_did, unz(p.text) FROM posts p "
+                    "LEFT JOIN post_signatures s ON s.post_id = p.rowid "
+                    "WHERE s.post_id IS NULL LIMIT :n"
+                ),
+                {"n": BATCH_SIZE},
+            ).fetchall()
+            if not batch:
+                break
+            self._sign(batch, started)
+            affected.update(did for _, did, _ in batch)
+            signed += len(batch)
+
+        # Older accounts that now share a bucket with a freshly signed post
+        affected.update(
+            did
+            for (did,) in self.db.execute(
+                text(
+                    "SELECT DISTINCT p.author_did FROM post_signatures s "
+                    "JOIN lsh_buckets b1 ON b1.post_id = s.post_id "
+                    "JOIN lsh_buckets b2 ON b2.band = b1.band "
+                    "AND b2.bucket = b1.bucket AND b2.post_id != b1.post_id "
+                    "JOIN posts p ON p.rowid = b2.post_id "
+                    "WHERE s.computed_at >= :since"
+                ).bindparams(bindparam("since", type_=DateTime())),
+                {"since": started},
+            )
+        )
+
+        flagged = 0
+        for did in affected:
+            if self._flag_account(did):
+                flagged += 1
+        self.db.commit()
+
+        return {
+            "stale": len(stale),
+            "signed": signed,
+            "accounts_checked": len(affected),
+            "accounts_flagged": flagged,
+        }
+
+    def _sign(self, batch: Iterable, computed_at: datetime):
+        sig_rows = []
+        bucket_rows = []
+        for post_id, _author_did, post_text in batch:
+            hashes = shingles(post_text or "", self.config.shingle_size)
+            if len(hashes) == 0:
+                sig_rows.append(
+                    {"post_id": post_id, "signature": b"", "computed_at": computed_at}
+                )
+                continue
+            sig = self.hasher.signature(hashes)
+            sig_rows.append(
+                {
+                    "post_id": post_id,
+                    "signature": sig.tobytes(),
+                    "computed_at": computed_at,
+                }
+            )
+            for band, bucket in enumerate(self.hasher.band_buckets(sig)):
+                bucket_rows.append({"band": band, "bucket": bucket, "post_id": post_id})
+
+        self.db.execute(insert(DbPostSignature.__table__), sig_rows)
+        if bucket_rows:
+            self.db.execute(insert(DbLshBucket.__table__), bucket_rows)
+        self.db.commit()
+
+    def _flag_account(self, did: str) -> bool:
+        own = {
+            post_id: np.frombuffer(sig, dtype=np.uint32)
+            for post_id, sig in self.db.execute(
+                text(
+                    "SELECT s.post_id, s.signature FROM posts p "
+                    "JOIN post_signatures s ON s.post_id = p.rowid "
+                    "WHERE p.author_did = :did AND length(s.signature) > 0"
+                ),
+                {"did": did},
+            )
+        }
+
+        # Up to max_compare bucket-mates per post and direction, with signatures
+        mates = self.db.execute(
+            text(
+                "SELECT r.post_id, r.mate, r.is_self, s.signature FROM ("
+                "  SELECT m.*, ROW_NUMBER() OVER ("
+                "    PARTITION BY m.post_id, m.is_self ORDER BY m.mate) AS rn"
+                "  FROM (SELECT DISTINCT b1.post_id AS post_id, b2.post_id AS mate,"
+                "        p2.author_did = :did AS is_self"
+                "        FROM posts p1"
+                "        JOIN lsh_buckets b1 ON b1.post_id = p1.rowid"
+                "        JOIN lsh_buckets b2 ON b2.band = b1.band"
+                "        AND b2.bucket = b1.bucket AND b2.post_id != b1.post_id"
+                "        JOIN posts p2 ON p2.rowid = b2.post_id"
+                "        WHERE p1.author_did = :did) m"
+                ") r JOIN post_signatures s ON s.post_id = r.mate "
+                "WHERE r.rn <= :k"
+            ),
+            {"did": did, "k": self.config.max_compare},
+        )
+
+        self_dups: Set[int] = set()
+        cross_dups: Set[int] = set()
+        threshold = self.config.jaccard_threshold
+        for post_id, _mate, is_self, mate_sig in mates:
+            found = self_dups if is_self else cross_dups
+            if post_id in found or post_id not in own:
+                continue
+            if _similar(own[post_id], mate_sig, threshold):
+                found.add(post_id)
+
+        total = len(own)
+        self_ratio = len(self_dups) / total if total else 0.0
+        cross_ratio = len(cross_dups) / total if total else 0.0
+        flagged = total >= self.config.min_posts and (
+            self_ratio >= self.config.max_self_dup_ratio
+            or cross_ratio >= self.config.max_cross_dup_ratio
+        )
+
+        rec = self.db.get(DbSpamFlag, did) or DbSpamFlag(did=did)
+        rec.posts = total
+        rec.self_dup_ratio = self_ratio
+        rec.cross_dup_ratio = cross_ratio
+        rec.flagged = flagged
+        rec.stale = False
+        rec.computed_at = datetime.utcnow()
+        self.db.add(rec)
+        return flagged
+
+
+def flagged_dids(db: Session) -> Set[str]:
+    return {did for (did,) in db.query(DbSpamFlag.did).filter(DbSpamFlag.flagged)}
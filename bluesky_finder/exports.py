@@ -0,0 +1,330 @@
+"""Export rows, and incremental exports (`export --incremental`): a full
+snapshot plus delta files, tied together by a manifest.
+
+Each topic exports to its own directory, <export_dir>/<topic name>, and
+keeps its own export_state rows. The directory's manifest.json names the
+current snapshot, the deltas written since (in order) and the watermark the
+last one was cut at:
+
+  {"version": 1, "sequence": 7,
+   "snapshot": "snapshot_000005_20261019T120000.jsonl", "snapshot_rows": 812,
+   "deltas": [{"file": "delta_000006_20261020T120000.jsonl", "upserts": 10,
+               "removes": 2, "created_at": "..."}, ...],
+   "watermark": {"run_at": "...", "fetched_at": "...", "handle_changed_at": "...",
+                 "failed_at": "..."}}
+
+A consumer loads the snapshot (one export row per line) and applies every
+delta in order; delta lines are {"op": "upsert", "did", "row"} or
+{"op": "remove", "did"}. Both are idempotent, so replaying a delta is safe.
+
+A delta only reads candidates that may have changed since the watermark:
+re-evaluated (llm_evals.run_at), re-fetched (profiles.fetched_at), renamed
+(identities.changed_at) or found gone (fetch_failures.last_failed_at; gone
+accounts are removed), plus those export_state shows entering or leaving
+the export, or changing label, without a new evaluation (a threshold change,
+`relabel`). Rows whose digest matches export_state are skipped, so the work
+follows the churn rather than the table size. Discovery sources picked up by
+an exported candidate show with its next fetch or evaluation, or the next
+snapshot.
+
+Files and the manifest are written before export_state is committed: a
+crash in between only makes the next delta repeat some rows, never skip one.
+Compaction writes a fresh snapshot and deletes the files it replaces.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from .config import settings
+from .database import (
+    DbCandidate,
+    DbExportState,
+    DbFetchFailure,
+    DbIdentity,
+    DbLlmEval,
+    DbProfile,
+    in_topic,
+    not_gone,
+)
+
+MANIFEST = "manifest.json"
+CHUNK = 500
+
+
+def export_row(cand: DbCandidate) -> dict:
+    """One exported candidate (current topic), as written by every export format."""
+    ev = cand.llm_eval
+    profile = cand.profile
+    return {
+        "handle": cand.handle,
+        "did": cand.did,
+        "score": ev.score_overall,
+        "label": ev.label,
+        "location_score": ev.score_location,
+        "tech_score": ev.score_tech,
+        "bio": profile.description if profile else "",
+        "rationale": ev.rationale,
+        "profile_url": f"https://bsky.app/profile/{cand.handle}",
+        "avatar_url": profile.avatar_url if profile else None,
+        "display_name": profile.display_name if profile else cand.handle,
+        "discovery_sources": cand.discovery_sources,
+    }
+
+
+def row_digest(row: dict) -> str:
+    return hashlib.sha1(
+        json.dumps(row, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def load_manifest(directory: Path) -> Optional[dict]:
+    path = directory / MANIFEST
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _write_atomic(path: Path, lines: Iterable[str]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + "\n")
+    os.replace(tmp, path)
+
+
+def _write_manifest(directory: Path, manifest: dict) -> None:
+    _write_atomic(directory / MANIFEST, [json.dumps(manifest, indent=2)])
+
+
+@dataclass
+class ExportResult:
+    kind: str  # "snapshot" or "delta"
+    file: Optional[str]  # None: nothing changed, no delta written
+    rows: int = 0  # snapshot rows
+    upserts: int = 0
+    removes: int = 0
+    examined: int = 0  # candidates a delta had to look at
+    deltas: int = 0  # deltas on top of the current snapshot
+
+
+def _watermark(db: Session) -> Dict[str, Optional[str]]:
+    marks = {
+        "run_at": db.query(func.max(DbLlmEval.run_at)).filter(in_topic()).scalar(),
+        "fetched_at": db.query(func.max(DbProfile.fetched_at)).scalar(),
+        "handle_changed_at": db.query(func.max(DbIdentity.changed_at)).scalar(),
+        "failed_at": db.query(func.max(DbFetchFailure.last_failed_at))
+        .filter(DbFetchFailure.kind == "permanent")
+        .scalar(),
+    }
+    return {k: v.isoformat() if v else None for k, v in marks.items()}
+
+
+def _changed_dids(db: Session, watermark: dict, threshold: float) -> Set[str]:
+    """Candidates whose export row may differ from what export_state recorded."""
+
+    def since(column, key):
+        # >= rather than >: rows stamped with the watermark itself may have
+        # landed after it was read; the digest check drops repeats
+        value = watermark.get(key)
+        if value is None:
+            return column.isnot(None)
+        return column >= datetime.fromisoformat(value)
+
+    topic = settings.current_topic.name
+    state = and_(DbExportState.did == DbLlmEval.did, DbExportState.topic == topic)
+    score = func.coalesce(DbLlmEval.score_overall, -1.0)
+    queries = [
+        db.query(DbLlmEval.did).filter(in_topic(), since(DbLlmEval.run_at, "run_at")),
+        db.query(DbProfile.did).filter(since(DbProfile.fetched_at, "fetched_at")),
+        db.query(DbIdentity.did).filter(
+            since(DbIdentity.changed_at, "handle_changed_at")
+        ),
+        db.query(DbFetchFailure.did).filter(
+            DbFetchFailure.kind == "permanent",
+            since(DbFetchFailure.last_failed_at, "failed_at"),
+        ),
+        # Qualifies but was never exported
+        db.query(DbLlmEval.did)
+        .outerjoin(DbExportState, state)
+        .filter(
+            in_topic(),
+            score >= threshold,
+            DbExportState.did.is_(None),
+            not_gone(DbLlmEval.did),
+        ),
+        # Exported, but gone, below the threshold now or relabeled
+        db.query(DbExportState.did)
+        .outerjoin(DbLlmEval, and_(state, in_topic()))
+        .filter(
+            DbExportState.topic == topic,
+            or_(
+                DbLlmEval.did.is_(None),
+                score < threshold,
+                DbLlmEval.label.is_distinct_from(DbExportState.label),
+            )
+        ),
+    ]
+    return {did for q in queries for (did,) in q}
+
+
+def _chunks(items: List[str]) -> Iterable[List[str]]:
+    for i in range(0, len(items), CHUNK):
+        yield items[i:i + CHUNK]
+
+
+def _stamp() -> str:
+    return datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+
+
+def write_snapshot(db: Session, directory: Path, threshold: float) -> ExportResult:
+    """Full export of every qualifying candidate; replaces snapshot and deltas."""
+    topic = settings.current_topic.name
+    directory.mkdir(parents=True, exist_ok=True)
+    old = load_manifest(directory) or {}
+    sequence = old.get("sequence", 0) + 1
+    watermark = _watermark(db)
+    name = f"snapshot_{sequence:06d}_{_stamp()}.jsonl"
+
+    candidates = (
+        db.query(DbCandidate)
+        .join(DbCandidate.llm_evals)
+        .options(selectinload(DbCandidate.llm_evals), joinedload(DbCandidate.profile))
+        .filter(
+            in_topic(),
+            DbLlmEval.score_overall >= threshold,
+            not_gone(DbCandidate.did),
+        )
+        .order_by(DbLlmEval.score_overall.desc(), DbCandidate.did)
+    )
+    states = []
+
+    def lines():
+        for cand in candidates.yield_per(CHUNK):
+            row = export_row(cand)
+            states.append(
+                {
+                    "topic": topic,
+                    "did": cand.did,
+                    "label": row["label"],
+                    "digest": row_digest(row),
+                }
+            )
+            yield json.dumps(row)
+
+    _write_atomic(directory / name, lines())
+    _write_manifest(
+        directory,
+        {
+            "version": 1,
+            "sequence": sequence,
+            "snapshot": name,
+            "snapshot_rows": len(states),
+            "deltas": [],
+            "watermark": watermark,
+            "updated_at": datetime.utcnow().isoformat(),
+        },
+    )
+
+    db.query(DbExportState).filter(DbExportState.topic == topic).delete(
+        synchronize_session=False
+    )
+    now = datetime.utcnow()
+    for i in range(0, len(states), CHUNK):
+        db.bulk_insert_mappings(
+            DbExportState, [{**s, "exported_at": now} for s in states[i:i + CHUNK]]
+        )
+    db.commit()
+
+    # Only now is nothing pointing at the replaced files any more
+    replaced = [old.get("snapshot")] + [d["file"] for d in old.get("deltas", [])]
+    for old_name in filter(None, replaced):
+        (directory / old_name).unlink(missing_ok=True)
+    return ExportResult("snapshot", name, rows=len(states))
+
+
+def write_delta(db: Session, directory: Path, threshold: float) -> ExportResult:
+    """Changes since the manifest's watermark; a snapshot if there is none yet."""
+    manifest = load_manifest(directory)
+    if manifest is None:
+        return write_snapshot(db, directory, threshold)
+
+    topic = settings.current_topic.name
+    watermark = _watermark(db)
+    dids = sorted(_changed_dids(db, manifest["watermark"], threshold))
+    upserts: List[dict] = []
+    removes: List[str] = []
+    states: Dict[str, dict] = {}
+    for chunk in _chunks(dids):
+        exported = {
+            s.did: s
+            for s in db.query(DbExportState).filter(
+                DbExportState.topic == topic, DbExportState.did.in_(chunk)
+            )
+        }
+        current = {
+            c.did: c
+            for c in db.query(DbCandidate)
+            .options(
+                joinedload(DbCandidate.profile), selectinload(DbCandidate.llm_evals)
+            )
+            .filter(DbCandidate.did.in_(chunk), not_gone(DbCandidate.did))
+        }
+        for did in chunk:
+            cand = current.get(did)  # None: gone (or deleted), so removed
+            ev = cand.llm_eval if cand is not None else None
+            score = ev.score_overall if ev is not None else None
+            if score is not None and score >= threshold:
+                row = export_row(cand)
+                digest = row_digest(row)
+                state = exported.get(did)
+                if state is None or state.digest != digest:
+                    upserts.append(row)
+                    states[did] = {"label": row["label"], "digest": digest}
+            elif did in exported:
+                removes.append(did)
+
+    name = None
+    if upserts or removes:
+        manifest["sequence"] = manifest.get("sequence", 0) + 1
+        name = f"delta_{manifest['sequence']:06d}_{_stamp()}.jsonl"
+        _write_atomic(
+            directory / name,
+            [json.dumps({"op": "upsert", "did": r["did"], "row": r}) for r in upserts]
+            + [json.dumps({"op": "remove", "did": did}) for did in removes],
+        )
+        manifest["deltas"].append(
+            {
+                "file": name,
+                "upserts": len(upserts),
+                "removes": len(removes),
+                "created_at": datetime.utcnow().isoformat(),
+            }
+        )
+    manifest["watermark"] = watermark
+    manifest["updated_at"] = datetime.utcnow().isoformat()
+    _write_manifest(directory, manifest)
+
+    now = datetime.utcnow()
+    for did, state in states.items():
+        db.merge(DbExportState(topic=topic, did=did, exported_at=now, **state))
+    for chunk in _chunks(removes):
+        db.query(DbExportState).filter(
+            DbExportState.topic == topic, DbExportState.did.in_(chunk)
+        ).delete(synchronize_session=False)
+    db.commit()
+    return ExportResult(
+        "delta",
+        name,
+        upserts=len(upserts),
+        removes=len(removes),
+        examined=len(dids),
+        deltas=len(manifest["deltas"]),
+    )
@@ -0,0 +1,77 @@
+"""Negative cache of accounts whose profile or posts couldn't be fetched (the
+`fetch_failures` table).
+
+BskyClient raises FetchFailed, classified from the AppView's answer:
+
+  permanent  deleted (Profile not found), taken down, blocking or blocked.
+             The account is left out of every stage (fetch, evaluate,
+             export, publish, resolve) until `fetch --retry-failed` finds it
+             back.
+  transient  rate limits, 5xx, timeouts, deactivated accounts, anything
+             else. Retried after an exponential backoff: retry_base_minutes
+             doubling with every consecutive failure, up to retry_max_hours.
+
+A successful fetch deletes the row again. The other stages filter on
+database.not_gone(); only `fetch` looks at the backoff.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import DbFetchFailure
+from .metrics import metrics
+
+
+class FetchFailed(Exception):
+    """A profile or feed fetch failed; `permanent` if the account is gone."""
+
+    def __init__(self, did: str, reason: str, permanent: bool):
+        super().__init__(f"{did}: {reason}")
+        self.did = did
+        self.reason = reason
+        self.permanent = permanent
+
+    @property
+    def kind(self) -> str:
+        return "permanent" if self.permanent else "transient"
+
+
+def backoff(failures: int) -> timedelta:
+    """How long to leave an account alone after its n-th consecutive failure."""
+    cfg = settings.fetch_failures
+    cap = timedelta(hours=cfg.retry_max_hours)
+    # Exponent bounded so a long-failing account can't overflow timedelta
+    delay = timedelta(minutes=cfg.retry_base_minutes * 2 ** min(failures - 1, 20))
+    return min(delay, cap)
+
+
+def record_failure(db: Session, failure: FetchFailed) -> DbFetchFailure:
+    now = datetime.utcnow()
+    row = db.get(DbFetchFailure, failure.did)
+    if row is None:
+        row = DbFetchFailure(did=failure.did, failures=0, first_failed_at=now)
+        db.add(row)
+    row.kind = failure.kind
+    row.reason = failure.reason
+    row.failures += 1
+    row.last_failed_at = now
+    row.retry_after = None if failure.permanent else now + backoff(row.failures)
+    metrics.inc("fetch_failures_total", kind=failure.kind)
+    return row
+
+
+def clear_failure(db: Session, did: str) -> bool:
+    """Forget a failure after a successful fetch. True if there was one."""
+    return db.query(DbFetchFailure).filter_by(did=did).delete() > 0
+
+
+def blocked_dids(db: Session, now: Optional[datetime] = None) -> Dict[str, str]:
+    """{did: kind} of accounts `fetch` should skip: gone, or still backing off."""
+    now = now or datetime.utcnow()
+    q = db.query(DbFetchFailure.did, DbFetchFailure.kind).filter(
+        (DbFetchFailure.kind == "permanent") | (DbFetchFailure.retry_after > now)
+    )
+    return dict(q)
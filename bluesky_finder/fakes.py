@@ -0,0 +1,989 @@
+"""Local fake AT Protocol AppView/PDS and OpenAI-compatible LLM servers.
+
+Everything is generated on demand from a deterministic synthetic world, so a
+100K-candidate dataset costs no memory up front. Used by the benchmark
+harness; can also be run by hand:
+
+    python -m bluesky_finder.fakes --size 10k --port 8765 --latency-ms 20
+
+then point BSKY_BASE_URL at http://127.0.0.1:8765 and OPENROUTER_BASE_URL at
+http://127.0.0.1:8765/v1.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+DATASET_SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+# Accounts covered by one synthetic anchor (half followers, half follows)
+ACCOUNTS_PER_ANCHOR = 1000
+BENCH_HASHTAG = "#benchtag"
+
+_LOCAL_WORDS = ["DC", "Arlington", "WMATA", "Bethesda", "Alexandria", "NoVA", "DMV"]
+_TECH_WORDS = ["python", "kubernetes", "SRE", "terraform", "rust", "data", "devops"]
+_OTHER_WORDS = [
+    "coffee", "garden", "weekend", "music", "soccer", "recipe", "travel",
+    "movie", "book", "weather", "dog", "cat", "hiking", "photo", "family",
+]
+_SPAM_TEMPLATE = "Huge giveaway today follow and repost to win free tokens now {n}"
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().lower()
+    if value in DATASET_SIZES:
+        return DATASET_SIZES[value]
+    return int(value)
+
+
+def _fake_cid(seed: str) -> str:
+    digest = hashlib.sha256(seed.encode()).digest()
+    return "bafyrei" + base64.b32encode(digest).decode().lower().rstrip("=")[:52]
+
+
+_TID_CHARS = "234567abcdefghijklmnopqrstuvwxyz"
+
+
+def _tid(micros: int, clock_id: int = 0) -> str:
+    """A record key in the atproto TID format (base32-sortable timestamp)."""
+    value = (micros << 10) | (clock_id & 0x3FF)
+    return "".join(_TID_CHARS[(value >> (5 * i)) & 31] for i in range(12, -1, -1))
+
+
+def _fake_jwt(did: str, lifetime: timedelta) -> str:
+    def b64(data: dict) -> str:
+        raw = json.dumps(data).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    now = int(time.time())
+    return ".".join(
+        [
+            b64({"alg": "ES256K", "typ": "JWT"}),
+            b64({"sub": did, "iat": now, "exp": now + int(lifetime.total_seconds()),
+                 "scope": "com.atproto.access"}),
+            "c2ln",
+        ]
+    )
+
+
+class SyntheticWorld:
+    """
+    Deterministic synthetic Bluesky: `size` accounts, ~10% DC techies, ~5%
+    templated spam bots, grouped under anchors that each have
+    ACCOUNTS_PER_ANCHOR followers + follows.
+    """
+
+    def __init__(self, size: int, posts_per_account: int = 30, seed: int = 7):
+        self.size = size
+        self.posts_per_account = posts_per_account
+        self.seed = seed
+        self.anchor_count = max(1, math.ceil(size / ACCOUNTS_PER_ANCHOR))
+        self._epoch = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    # ----- identities -----
+
+    def did(self, i: int) -> str:
+        return f"did:plc:bench{i:07d}"
+
+    def handle(self, i: int) -> str:
+        return f"user{i}.bench.test"
+
+    def anchor_handle(self, a: int) -> str:
+        return f"anchor{a}.bench.test"
+
+    def anchor_did(self, a: int) -> str:
+        return f"did:plc:anchor{a:05d}"
+
+    def anchor_handles(self) -> List[str]:
+        return [self.anchor_handle(a) for a in range(self.anchor_count)]
+
+    def list_uri(self, a: int) -> str:
+        return f"at://{self.anchor_did(a)}/app.bsky.graph.list/bench"
+
+    def starter_pack_uri(self, a: int) -> str:
+        return f"at://{self.anchor_did(a)}/app.bsky.graph.starterpack/bench"
+
+    def seed_lists(self) -> List[str]:
+        """One curated source per anchor: starter packs and plain lists alternate."""
+        return [
+            self.starter_pack_uri(a) if a % 2 == 0 else self.list_uri(a)
+            for a in range(self.anchor_count)
+        ]
+
+    def index_of(self, actor: str) -> Optional[int]:
+        """Account index for a did/handle, or None for anchors/unknown actors."""
+        if actor.startswith("did:plc:bench"):
+            i = int(actor[len("did:plc:bench"):])
+        elif actor.startswith("user") and actor.endswith(".bench.test"):
+            i = int(actor[len("user"):-len(".bench.test")])
+        else:
+            return None
+        return i if 0 <= i < self.size else None
+
+    def anchor_index_of(self, actor: str) -> Optional[int]:
+        if actor.startswith("did:plc:anchor"):
+            a = int(actor[len("did:plc:anchor"):])
+        elif actor.startswith("anchor") and actor.endswith(".bench.test"):
+            a = int(actor[len("anchor"):-len(".bench.test")])
+        else:
+            return None
+        return a if 0 <= a < self.anchor_count else None
+
+    def kind(self, i: int) -> str:
+        r = random.Random(self.seed * 1_000_003 + i).random()
+        if r < 0.10:
+            return "techie"
+        if r < 0.15:
+            return "spam"
+        return "other"
+
+    # ----- content -----
+
+    def profile(self, i: int) -> dict:
+        rng = random.Random(self.seed * 7919 + i)
+        kind = self.kind(i)
+        if kind == "techie":
+            bio = (f"{rng.choice(_TECH_WORDS)} engineer in {rng.choice(_LOCAL_WORDS)}. "
+                   f"Opinions my own.")
+        elif kind == "spam":
+            bio = "Giveaways every day. Follow for free tokens."
+        else:
+            bio = " ".join(rng.choice(_OTHER_WORDS) for _ in range(6))
+        return {
+            "did": self.did(i),
+            "handle": self.handle(i),
+            "displayName": f"Bench User {i}",
+            "description": bio,
+            "avatar": f"https://cdn.bench.test/avatar/{i}.jpg",
+            "followersCount": 100,
+            "followsCount": 100,
+            "postsCount": self.posts_per_account,
+        }
+
+    def anchor_profile(self, a: int) -> dict:
+        return {
+            "did": self.anchor_did(a),
+            "handle": self.anchor_handle(a),
+            "displayName": f"Anchor {a}",
+            "description": "Synthetic anchor account",
+        }
+
+    def basic(self, i: int) -> dict:
+        return {"did": self.did(i), "handle": self.handle(i),
+                "displayName": f"Bench User {i}"}
+
+    def post_text(self, i: int, n: int) -> str:
+        kind = self.kind(i)
+        rng = random.Random((self.seed * 104_729 + i) * 1000 + n)
+        if kind == "spam":
+            return _SPAM_TEMPLATE.format(n=n % 3)
+        words = [rng.choice(_OTHER_WORDS) for _ in range(rng.randint(8, 20))]
+        if kind == "techie":
+            words[0] = rng.choice(_LOCAL_WORDS)
+            words[-1] = rng.choice(_TECH_WORDS)
+        return " ".join(words)
+
+    def post_view(self, i: int, n: int) -> dict:
+        created = self._epoch - timedelta(hours=n * 7 + i % 13)
+        uri = f"at://{self.did(i)}/app.bsky.feed.post/{n:08d}"
+        return {
+            "uri": uri,
+            "cid": _fake_cid(uri),
+            "author": self.basic(i),
+            "record": {
+                "$type": "app.bsky.feed.post",
+                "text": self.post_text(i, n),
+                "createdAt": created.isoformat().replace("+00:00", "Z"),
+            },
+            "indexedAt": created.isoformat().replace("+00:00", "Z"),
+        }
+
+    # ----- graph -----
+
+    def anchor_members(self, a: int, relation: str) -> range:
+        start = a * ACCOUNTS_PER_ANCHOR
+        end = min(start + ACCOUNTS_PER_ANCHOR, self.size)
+        mid = start + (end - start) // 2
+        return range(start, mid) if relation == "followers" else range(mid, end)
+
+    def list_members(self, a: int) -> List[int]:
+        """Anchor a's curated list: all its techies, plus a few others."""
+        start = a * ACCOUNTS_PER_ANCHOR
+        end = min(start + ACCOUNTS_PER_ANCHOR, self.size)
+        return [i for i in range(start, end) if self.kind(i) == "techie" or i % 10 == 0]
+
+    # Chance that a member of anchor a likes / reposts / replies to one of its
+    # posts, for techies and for everyone else
+    _INTERACTION_RATES = {
+        "like": (0.3, 0.03),
+        "repost": (0.1, 0.005),
+        "reply": (0.05, 0.003),
+    }
+
+    def interactors(self, a: int, n: int, kind: str) -> List[int]:
+        """Members of anchor a who interacted (`kind`) with its post n."""
+        techie, other = self._INTERACTION_RATES[kind]
+        rng = random.Random(f"{self.seed}:{a}:{n}:{kind}")
+        start = a * ACCOUNTS_PER_ANCHOR
+        end = min(start + ACCOUNTS_PER_ANCHOR, self.size)
+        return [
+            i for i in range(start, end)
+            if rng.random() < (techie if self.kind(i) == "techie" else other)
+        ]
+
+    def anchor_post_view(self, a: int, n: int) -> dict:
+        created = self._epoch - timedelta(hours=n * 5)
+        uri = f"at://{self.anchor_did(a)}/app.bsky.feed.post/{n:08d}"
+        return {
+            "uri": uri,
+            "cid": _fake_cid(uri),
+            "author": {"did": self.anchor_did(a), "handle": self.anchor_handle(a)},
+            "record": {
+                "$type": "app.bsky.feed.post",
+                "text": f"Anchor {a} update number {n}",
+                "createdAt": created.isoformat().replace("+00:00", "Z"),
+            },
+            "indexedAt": created.isoformat().replace("+00:00", "Z"),
+            "likeCount": len(self.interactors(a, n, "like")),
+            "repostCount": len(self.interactors(a, n, "repost")),
+            "replyCount": len(self.interactors(a, n, "reply")),
+        }
+
+    def search(self, query: str, offset: int, limit: int) -> List[int]:
+        """Posts matching `query`: a deterministic pseudo-random walk over accounts."""
+        rng = random.Random(f"{self.seed}:{query}")
+        step = rng.randrange(1, max(2, self.size)) | 1
+        start = rng.randrange(self.size)
+        return [(start + (offset + k) * step) % self.size for k in range(limit)]
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class FakeServerState:
+    """Knobs plus per-endpoint request statistics shared by all handler threads."""
+
+    def __init__(
+        self,
+        world: SyntheticWorld,
+        latency_ms: float = 0.0,
+        llm_latency_ms: float = 0.0,
+        rate_limit: float = 0.0,
+        llm_error_rate: float = 0.0,
+        llm_slow_rate: float = 0.0,
+        llm_slow_ms: float = 0.0,
+        llm_malformed_rate: float = 0.0,
+        llm_reject_schema: bool = False,
+        llm_down_models: Optional[List[str]] = None,
+        write_points_per_hour: int = 0,
+        write_error_rate: float = 0.0,
+        gone_rate: float = 0.0,
+        seed: int = 7,
+    ):
+        self.world = world
+        self.latency_ms = latency_ms
+        self.llm_latency_ms = llm_latency_ms
+        self.rate_limit = rate_limit
+        self.llm_error_rate = llm_error_rate
+        self.llm_slow_rate = llm_slow_rate
+        self.llm_slow_ms = llm_slow_ms
+        self.llm_malformed_rate = llm_malformed_rate
+        self.llm_reject_schema = llm_reject_schema
+        # Models that answer every request with 503, like an outage
+        self.llm_down_models = set(llm_down_models or [])
+        # The bench account's repo: collection -> rkey -> record. Writes cost
+        # PDS rate-limit points (create 3, delete 1) against an hourly budget
+        # (0 = unlimited). write_error_rate applies a batch but still answers
+        # 500, as when the connection drops after the commit
+        self.repo: Dict[str, Dict[str, dict]] = defaultdict(dict)
+        self.write_points_per_hour = write_points_per_hour
+        self.write_error_rate = write_error_rate
+        self.write_log: List[tuple] = []
+        self.last_tid = 0
+        self.rng = random.Random(seed)
+        # Accounts taken down since discovery: still listed as followers,
+        # but getProfile/getAuthorFeed answer AccountTakedown
+        gone = random.Random(seed + 1)
+        self.gone = {
+            world.did(i) for i in range(world.size) if gone.random() < gone_rate
+        }
+        self.lock = threading.Lock()
+        self.buckets: Dict[str, _TokenBucket] = {}
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.latencies: Dict[str, List[float]] = defaultdict(list)
+            self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, error: bool):
+        with self.lock:
+            self.latencies[endpoint].append(seconds * 1000.0)
+            if error:
+                self.errors[endpoint] += 1
+
+    def allow(self, endpoint: str) -> bool:
+        if self.rate_limit <= 0:
+            return True
+        with self.lock:
+            bucket = self.buckets.get(endpoint)
+            if bucket is None:
+                bucket = self.buckets[endpoint] = _TokenBucket(
+                    self.rate_limit, max(1.0, self.rate_limit)
+                )
+        return bucket.take()
+
+    def next_tid(self) -> str:
+        with self.lock:
+            self.last_tid = max(self.last_tid + 1, int(time.time() * 1e6))
+            return _tid(self.last_tid)
+
+    def spend_write_points(self, points: int) -> bool:
+        """Charge a write batch to the hourly budget; False if it won't fit."""
+        if self.write_points_per_hour <= 0:
+            return True
+        with self.lock:
+            now = time.time()
+            self.write_log = [(t, p) for t, p in self.write_log if t > now - 3600]
+            if sum(p for _, p in self.write_log) + points > self.write_points_per_hour:
+                return False
+            self.write_log.append((now, points))
+            return True
+
+    def delay(self, base_ms: float):
+        if base_ms > 0:
+            with self.lock:
+                factor = self.rng.uniform(0.5, 1.5)
+            time.sleep(base_ms * factor / 1000.0)
+
+    def stats(self) -> dict:
+        with self.lock:
+            out = {}
+            for endpoint, samples in self.latencies.items():
+                ordered = sorted(samples)
+                out[endpoint] = {
+                    "requests": len(ordered),
+                    "errors": self.errors.get(endpoint, 0),
+                    "p50_ms": percentile(ordered, 50),
+                    "p99_ms": percentile(ordered, 99),
+                }
+            return out
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return round(ordered[k], 3)
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    server_version = "BlueskyFinderFake/1.0"
+    state: FakeServerState  # injected by make_server()
+
+    def log_message(self, format, *args):
+        pass
+
+    # ----- plumbing -----
+
+    def _send(self, status: int, body: dict, headers: Optional[Dict[str, str]] = None):
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str):
+        parsed = urlparse(self.path)
+        path = parsed.path
+        query = {k: v if len(v) > 1 else v[0] for k, v in parse_qs(parsed.query).items()}
+
+        if path == "/_bench/stats":
+            return self._send(200, self.state.stats())
+        if path == "/_bench/reset":
+            self.state.reset()
+            return self._send(200, {})
+
+        if path.startswith("/xrpc/"):
+            endpoint = path[len("/xrpc/"):]
+            handler = getattr(self, "xrpc_" + endpoint.replace(".", "_"), None)
+            base_latency = self.state.latency_ms
+        elif path.endswith("/chat/completions"):
+            endpoint = "chat.completions"
+            handler = self.llm_chat_completions
+            base_latency = self.state.llm_latency_ms
+        else:
+            return self._send(404, {"error": "NotFound", "message": path})
+
+        started = time.perf_counter()
+        if handler is None:
+            self._send(501, {"error": "MethodNotImplemented", "message": endpoint})
+            return self.state.record(endpoint, time.perf_counter() - started, True)
+
+        if not self.state.allow(endpoint):
+            self._send(
+                429,
+                {"error": "RateLimitExceeded", "message": "Rate Limit Exceeded"},
+                {
+                    "ratelimit-limit": str(int(self.state.rate_limit)),
+                    "ratelimit-remaining": "0",
+                    "ratelimit-reset": str(int(time.time()) + 1),
+                },
+            )
+            return self.state.record(endpoint, time.perf_counter() - started, True)
+
+        self.state.delay(base_latency)
+        try:
+            status, body = handler(query, self._body() if method == "POST" else {})
+        except Exception as e:
+            status, body = 500, {"error": "InternalServerError", "message": str(e)}
+        self._send(status, body)
+        self.state.record(endpoint, time.perf_counter() - started, status >= 400)
+
+    # ----- com.atproto -----
+
+    def _session(self, identifier: str) -> dict:
+        did = "did:plc:benchself"
+        return {
+            "did": did,
+            "handle": identifier or "bench.bench.test",
+            "accessJwt": _fake_jwt(did, timedelta(hours=2)),
+            "refreshJwt": _fake_jwt(did, timedelta(days=60)),
+            "active": True,
+        }
+
+    def xrpc_com_atproto_server_createSession(self, query, body):
+        return 200, self._session(body.get("identifier", ""))
+
+    def xrpc_com_atproto_server_refreshSession(self, query, body):
+        return 200, self._session("bench.bench.test")
+
+    def xrpc_com_atproto_server_getSession(self, query, body):
+        session = self._session("bench.bench.test")
+        return 200, {"did": session["did"], "handle": session["handle"], "active": True}
+
+    def xrpc_com_atproto_identity_resolveHandle(self, query, body):
+        world = self.state.world
+        handle = query.get("handle", "")
+        i = world.index_of(handle)
+        if i is not None:
+            return 200, {"did": world.did(i)}
+        a = world.anchor_index_of(handle)
+        if a is not None:
+            return 200, {"did": world.anchor_did(a)}
+        return 400, {"error": "InvalidRequest", "message": "Unable to resolve handle"}
+
+    # ----- app.bsky -----
+
+    def _profile_for(self, actor: str) -> Optional[dict]:
+        world = self.state.world
+        i = world.index_of(actor)
+        if i is not None:
+            return world.profile(i)
+        a = world.anchor_index_of(actor)
+        if a is not None:
+            return world.anchor_profile(a)
+        if actor in ("did:plc:benchself", "bench.bench.test"):
+            return {"did": "did:plc:benchself", "handle": "bench.bench.test"}
+        return None
+
+    def _taken_down(self, actor: str):
+        i = self.state.world.index_of(actor)
+        if i is not None and self.state.world.did(i) in self.state.gone:
+            return 400, {
+                "error": "AccountTakedown",
+                "message": "Account has been suspended",
+            }
+        return None
+
+    def xrpc_app_bsky_actor_getProfile(self, query, body):
+        taken_down = self._taken_down(query.get("actor", ""))
+        if taken_down:
+            return taken_down
+        profile = self._profile_for(query.get("actor", ""))
+        if profile is None:
+            return 400, {"error": "InvalidRequest", "message": "Profile not found"}
+        return 200, profile
+
+    def xrpc_app_bsky_actor_getProfiles(self, query, body):
+        actors = query.get("actors", [])
+        if isinstance(actors, str):
+            actors = [actors]
+        profiles = [p for p in (self._profile_for(a) for a in actors) if p]
+        return 200, {"profiles": profiles}
+
+    def xrpc_app_bsky_feed_searchPosts(self, query, body):
+        world = self.state.world
+        limit = int(query.get("limit", 25))
+        offset = int(query.get("cursor", 0))
+        accounts = world.search(query.get("q", ""), offset, limit)
+        posts = [world.post_view(i, 0) for i in accounts]
+        return 200, {"posts": posts, "cursor": str(offset + limit)}
+
+    def _graph_page(self, query, relation: str, key: str):
+        world = self.state.world
+        actor = query.get("actor", "")
+        a = world.anchor_index_of(actor)
+        members = world.anchor_members(a, relation) if a is not None else range(0)
+        limit = int(query.get("limit", 50))
+        offset = int(query.get("cursor", 0))
+        page = members[offset : offset + limit]
+        body = {
+            "subject": self._profile_for(actor) or {"did": actor, "handle": actor},
+            key: [world.basic(i) for i in page],
+        }
+        if offset + limit < len(members):
+            body["cursor"] = str(offset + limit)
+        return 200, body
+
+    def xrpc_app_bsky_graph_getFollowers(self, query, body):
+        return self._graph_page(query, "followers", "followers")
+
+    def xrpc_app_bsky_graph_getFollows(self, query, body):
+        return self._graph_page(query, "follows", "follows")
+
+    def _list_view(self, a: int) -> dict:
+        world = self.state.world
+        return {
+            "uri": world.list_uri(a),
+            "cid": _fake_cid(world.list_uri(a)),
+            "creator": world.anchor_profile(a),
+            "name": f"Anchor {a} picks",
+            "purpose": "app.bsky.graph.defs#curatelist",
+            "indexedAt": world._epoch.isoformat().replace("+00:00", "Z"),
+        }
+
+    def _anchor_of_uri(self, uri: str, collection: str) -> Optional[int]:
+        parts = uri[len("at://"):].split("/") if uri.startswith("at://") else []
+        if len(parts) != 3 or parts[1] != collection:
+            return None
+        return self.state.world.anchor_index_of(parts[0])
+
+    def xrpc_app_bsky_graph_getList(self, query, body):
+        world = self.state.world
+        a = self._anchor_of_uri(query.get("list", ""), "app.bsky.graph.list")
+        if a is None:
+            return 400, {"error": "InvalidRequest", "message": "List not found"}
+        members = world.list_members(a)
+        limit = int(query.get("limit", 50))
+        offset = int(query.get("cursor", 0))
+        items = [
+            {"uri": f"at://{world.anchor_did(a)}/app.bsky.graph.listitem/{i}",
+             "subject": world.profile(i)}
+            for i in members[offset : offset + limit]
+        ]
+        body = {"list": self._list_view(a), "items": items}
+        if offset + limit < len(members):
+            body["cursor"] = str(offset + limit)
+        return 200, body
+
+    def xrpc_app_bsky_graph_getStarterPack(self, query, body):
+        world = self.state.world
+        uri = query.get("starterPack", "")
+        a = self._anchor_of_uri(uri, "app.bsky.graph.starterpack")
+        if a is None:
+            return 400, {"error": "InvalidRequest", "message": "Starter pack not found"}
+        created = world._epoch.isoformat().replace("+00:00", "Z")
+        view = self._list_view(a)
+        del view["creator"], view["indexedAt"]
+        return 200, {
+            "starterPack": {
+                "uri": uri,
+                "cid": _fake_cid(uri),
+                "record": {
+                    "$type": "app.bsky.graph.starterpack",
+                    "name": f"Anchor {a} starter pack",
+                    "list": world.list_uri(a),
+                    "createdAt": created,
+                },
+                "creator": world.anchor_profile(a),
+                "indexedAt": created,
+                "list": view,
+            }
+        }
+
+    def _anchor_post(self, uri: str):
+        """(anchor, post number) of an anchor post URI, or None."""
+        a = self._anchor_of_uri(uri, "app.bsky.feed.post")
+        if a is None:
+            return None
+        return a, int(uri.rsplit("/", 1)[1])
+
+    def _interaction_page(self, query, kind: str, key: str, wrap):
+        world = self.state.world
+        post = self._anchor_post(query.get("uri", ""))
+        if post is None:
+            return 400, {"error": "InvalidRequest", "message": "Post not found"}
+        people = world.interactors(post[0], post[1], kind)
+        limit = int(query.get("limit", 50))
+        offset = int(query.get("cursor", 0))
+        page = people[offset : offset + limit]
+        body = {"uri": query["uri"], key: [wrap(world.basic(i)) for i in page]}
+        if offset + limit < len(people):
+            body["cursor"] = str(offset + limit)
+        return 200, body
+
+    def xrpc_app_bsky_feed_getLikes(self, query, body):
+        created = self.state.world._epoch.isoformat().replace("+00:00", "Z")
+        return self._interaction_page(
+            query, "like", "likes",
+            lambda actor: {"actor": actor, "createdAt": created, "indexedAt": created},
+        )
+
+    def xrpc_app_bsky_feed_getRepostedBy(self, query, body):
+        return self._interaction_page(query, "repost", "repostedBy", lambda actor: actor)
+
+    def xrpc_app_bsky_feed_getPostThread(self, query, body):
+        world = self.state.world
+        post = self._anchor_post(query.get("uri", ""))
+        if post is None:
+            return 400, {"error": "NotFound", "message": "Post not found"}
+        a, n = post
+        replies = []
+        for i in world.interactors(a, n, "reply"):
+            reply = world.post_view(i, 0)
+            reply["uri"] = f"at://{world.did(i)}/app.bsky.feed.post/r{a}x{n}"
+            replies.append({"$type": "app.bsky.feed.defs#threadViewPost", "post": reply})
+        return 200, {
+            "thread": {
+                "$type": "app.bsky.feed.defs#threadViewPost",
+                "post": world.anchor_post_view(a, n),
+                "replies": replies,
+            }
+        }
+
+    def xrpc_app_bsky_feed_getAuthorFeed(self, query, body):
+        world = self.state.world
+        a = world.anchor_index_of(query.get("actor", ""))
+        if a is not None:
+            limit = int(query.get("limit", 50))
+            feed = [{"post": world.anchor_post_view(a, n)} for n in range(limit)]
+            return 200, {"feed": feed}
+        i = world.index_of(query.get("actor", ""))
+        if i is None:
+            return 400, {"error": "InvalidRequest", "message": "Profile not found"}
+        taken_down = self._taken_down(query.get("actor", ""))
+        if taken_down:
+            return taken_down
+        limit = int(query.get("limit", 50))
+        offset = int(query.get("cursor", 0))
+        end = min(offset + limit, world.posts_per_account)
+        feed = [{"post": world.post_view(i, n)} for n in range(offset, end)]
+        body = {"feed": feed}
+        if end < world.posts_per_account:
+            body["cursor"] = str(end)
+        return 200, body
+
+    # ----- com.atproto.repo (the bench account's own repo) -----
+
+    def _own_repo(self, repo: str) -> bool:
+        return repo in (self._session("")["did"], "bench.bench.test")
+
+    def xrpc_com_atproto_repo_applyWrites(self, query, body):
+        state = self.state
+        if not self._own_repo(body.get("repo", "")):
+            return 400, {"error": "InvalidRequest", "message": "Not your repo"}
+        writes = body.get("writes", [])
+        if len(writes) > 200:
+            message = "Too many writes. Max: 200"
+            return 400, {"error": "InvalidRequest", "message": message}
+        points = sum(3 if w["$type"].endswith("#create") else 1 for w in writes)
+        if not state.spend_write_points(points):
+            message = "Rate Limit Exceeded"
+            return 429, {"error": "RateLimitExceeded", "message": message}
+
+        did = self._session("")["did"]
+        results = []
+        for w in writes:
+            collection = w["collection"]
+            if w["$type"].endswith("#delete"):
+                with state.lock:
+                    state.repo[collection].pop(w["rkey"], None)
+                results.append({"$type": "com.atproto.repo.applyWrites#deleteResult"})
+                continue
+            rkey = w.get("rkey") or state.next_tid()
+            with state.lock:
+                state.repo[collection][rkey] = w["value"]
+            uri = f"at://{did}/{collection}/{rkey}"
+            results.append(
+                {
+                    "$type": "com.atproto.repo.applyWrites#createResult",
+                    "uri": uri,
+                    "cid": _fake_cid(uri),
+                    "validationStatus": "valid",
+                }
+            )
+        with state.lock:
+            failed = state.rng.random() < state.write_error_rate
+        if failed:
+            return 500, {"error": "InternalServerError", "message": "injected"}
+        commit = {"cid": _fake_cid(str(state.last_tid)), "rev": state.next_tid()}
+        return 200, {"commit": commit, "results": results}
+
+    def xrpc_com_atproto_repo_listRecords(self, query, body):
+        state = self.state
+        if not self._own_repo(query.get("repo", "")):
+            return 200, {"records": []}
+        collection = query.get("collection", "")
+        limit = int(query.get("limit", 50))
+        cursor = query.get("cursor")
+        did = self._session("")["did"]
+        with state.lock:
+            rkeys = sorted(k for k in state.repo[collection] if k > (cursor or ""))
+            page = [(k, state.repo[collection][k]) for k in rkeys[:limit]]
+        records = []
+        for rkey, value in page:
+            uri = f"at://{did}/{collection}/{rkey}"
+            records.append({"uri": uri, "cid": _fake_cid(uri), "value": value})
+        out = {"records": records}
+        if len(rkeys) > limit:
+            out["cursor"] = page[-1][0]
+        return 200, out
+
+    def xrpc_app_bsky_graph_getLists(self, query, body):
+        if not self._own_repo(query.get("actor", "")):
+            return 200, {"lists": []}
+        session = self._session("")
+        creator = {"did": session["did"], "handle": session["handle"]}
+        with self.state.lock:
+            own = sorted(self.state.repo["app.bsky.graph.list"].items())
+        lists = []
+        for rkey, value in own:
+            uri = f"at://{session['did']}/app.bsky.graph.list/{rkey}"
+            lists.append(
+                {
+                    "uri": uri,
+                    "cid": _fake_cid(uri),
+                    "name": value.get("name", ""),
+                    "purpose": value.get("purpose", "app.bsky.graph.defs#curatelist"),
+                    "creator": creator,
+                    "indexedAt": value.get("createdAt"),
+                }
+            )
+        return 200, {"lists": lists}
+
+    # ----- OpenAI-compatible -----
+
+    def llm_chat_completions(self, query, body):
+        state = self.state
+        with state.lock:
+            roll = state.rng.random()
+            slow = state.rng.random() < state.llm_slow_rate
+            malformed = state.rng.random() < state.llm_malformed_rate
+        down = body.get("model") in state.llm_down_models
+        if roll < state.llm_error_rate or down:
+            return 503, {"error": {"message": "injected upstream error", "code": 503}}
+        if slow:
+            time.sleep(state.llm_slow_ms / 1000.0)
+        schema = (body.get("response_format") or {}).get("type") == "json_schema"
+        if schema and state.llm_reject_schema:
+            message = "response_format is not supported"
+            return 400, {"error": {"message": message, "code": 400}}
+
+        messages = body.get("messages", [])
+        # Judge only the user payload; the system prompt names the topic words
+        prompt = " ".join(
+            str(m.get("content", "")) for m in messages if m.get("role") == "user"
+        )
+        quoted = r'"score_location": ([\d.]+), "score_tech": ([\d.]+)'
+        repair = re.search(quoted, prompt)
+        if repair:
+            # A repair re-ask: keep the verdict of the broken reply it quotes
+            loc, tech_score = float(repair.group(1)), float(repair.group(2))
+        else:
+            local = any(w.lower() in prompt.lower() for w in _LOCAL_WORDS)
+            tech = any(w.lower() in prompt.lower() for w in _TECH_WORDS)
+            loc, tech_score = (0.9 if local else 0.1), (0.9 if tech else 0.1)
+        if min(loc, tech_score) > 0.5:
+            overall = 0.9
+        else:
+            overall = 0.55 if max(loc, tech_score) > 0.5 else 0.1
+        verdict = {
+            "score_location": loc,
+            "score_tech": tech_score,
+            "score_overall": overall,
+            "label": "match" if overall >= 0.75 else "maybe" if overall >= 0.5 else "no",
+            "rationale": "Synthetic verdict from the fake LLM endpoint.",
+            "evidence": [],
+            "uncertainties": [],
+        }
+        # A multi-topic request gets the same verdict for every topic
+        system = " ".join(
+            str(m.get("content", "")) for m in messages if m.get("role") == "system"
+        )
+        topics = re.search(r"evaluation per topic key: ([^.\n]+)", system)
+        if topics:
+            names = [n.strip() for n in topics.group(1).split(",")]
+            content = json.dumps({"evaluations": {n: verdict for n in names}})
+        else:
+            content = json.dumps(verdict)
+        # Without a response_format schema, some replies come back as prose
+        # around not-quite-JSON, as real models sometimes do
+        if malformed and not schema and not repair:
+            content = "Here is my assessment:\n" + content[:-1] + ",}"
+        finish_reason = "stop"
+        max_tokens = body.get("max_tokens")
+        if max_tokens and len(content) // 4 > max_tokens:
+            content, finish_reason = content[: max_tokens * 4], "length"
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(content) // 4)
+        return 200, {
+            "id": f"chatcmpl-bench-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "bench-model"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": finish_reason,
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                # Billed USD, as OpenRouter reports it ($0.30/$2.50 per Mtok)
+                "cost": (prompt_tokens * 0.3 + completion_tokens * 2.5) / 1e6,
+            },
+        }
+
+
+def make_server(state: FakeServerState, host: str = "127.0.0.1", port: int = 0):
+    handler = type("BoundFakeHandler", (FakeHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(
+    size: int,
+    port: int,
+    latency_ms: float = 0.0,
+    llm_latency_ms: float = 0.0,
+    rate_limit: float = 0.0,
+    posts_per_account: int = 30,
+    llm_error_rate: float = 0.0,
+    llm_slow_rate: float = 0.0,
+    llm_slow_ms: float = 0.0,
+    llm_malformed_rate: float = 0.0,
+    llm_reject_schema: bool = False,
+    llm_down_models: Optional[List[str]] = None,
+    write_points_per_hour: int = 0,
+    write_error_rate: float = 0.0,
+    gone_rate: float = 0.0,
+    ready=None,
+):
+    """Run the fake server until killed. `ready` (an Event) is set once listening."""
+    state = FakeServerState(
+        SyntheticWorld(size, posts_per_account=posts_per_account),
+        latency_ms=latency_ms,
+        llm_latency_ms=llm_latency_ms,
+        rate_limit=rate_limit,
+        llm_error_rate=llm_error_rate,
+        llm_slow_rate=llm_slow_rate,
+        llm_slow_ms=llm_slow_ms,
+        llm_malformed_rate=llm_malformed_rate,
+        llm_reject_schema=llm_reject_schema,
+        llm_down_models=llm_down_models,
+        write_points_per_hour=write_points_per_hour,
+        write_error_rate=write_error_rate,
+        gone_rate=gone_rate,
+    )
+    server = make_server(state, port=port)
+    if ready is not None:
+        ready.set()
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake AppView + LLM servers")
+    parser.add_argument("--size", default="1k", help="1k, 10k, 100k or a number")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="Requests/second per endpoint (0 = unlimited)")
+    parser.add_argument("--posts-per-account", type=int, default=30)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0)
+    parser.add_argument("--llm-slow-ms", type=float, default=0.0)
+    parser.add_argument("--llm-malformed-rate", type=float, default=0.0,
+                        help="Share of unstructured LLM replies that aren't valid JSON")
+    parser.add_argument("--llm-reject-schema", action="store_true",
+                        help="Answer response_format requests with 400, like "
+                        "providers without structured output")
+    parser.add_argument("--llm-down-model", action="append", default=[],
+                        help="Model whose requests all fail with 503 (repeatable)")
+    parser.add_argument("--write-points-per-hour", type=int, default=0,
+                        help="PDS write budget (create 3, delete 1; 0 = unlimited)")
+    parser.add_argument("--write-error-rate", type=float, default=0.0,
+                        help="Share of applyWrites batches applied but answered 500")
+    parser.add_argument("--gone-rate", type=float, default=0.0,
+                        help="Share of accounts taken down (AccountTakedown)")
+    args = parser.parse_args()
+
+    print(f"Fake servers listening on http://127.0.0.1:{args.port}")
+    serve(
+        parse_size(args.size),
+        args.port,
+        latency_ms=args.latency_ms,
+        llm_latency_ms=args.llm_latency_ms,
+        rate_limit=args.rate_limit,
+        posts_per_account=args.posts_per_account,
+        llm_error_rate=args.llm_error_rate,
+        llm_slow_rate=args.llm_slow_rate,
+        llm_slow_ms=args.llm_slow_ms,
+        llm_malformed_rate=args.llm_malformed_rate,
+        llm_reject_schema=args.llm_reject_schema,
+        llm_down_models=args.llm_down_model,
+        write_points_per_hour=args.write_points_per_hour,
+        write_error_rate=args.write_error_rate,
+        gone_rate=args.gone_rate,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,44 +4,75 @@ import logging
 import threading
 import tkinter as tk
 from tkinter import ttk, scrolledtext
-from io import StringIO
 from contextlib import redirect_stdout, redirect_stderr
 
+from .progress import PipelineCancelled, ProgressQueue, QueueWriter
 
-class _TkTextHandler(logging.Handler):
-    """Logging handler that appends records to a tkinter ScrolledText widget."""
+# How often the Tk thread drains the progress queue, and how much log it keeps
+POLL_MS = 150
+MAX_LOG_LINES = 5000
 
-    def __init__(self, widget: scrolledtext.ScrolledText):
+# Results browser: columns shown, and the label filter choices
+RESULT_COLUMNS = [
+    ("handle", "Handle", 220),
+    ("display_name", "Name", 200),
+    ("label", "Label", 70),
+    ("overall", "Overall", 70),
+    ("tech", "Tech", 70),
+    ("location", "Location", 70),
+]
+LABEL_FILTERS = ["all", "match", "maybe", "no"]
+
+
+class _QueueLogHandler(logging.Handler):
+    """Logging handler that feeds records into the GUI's ProgressQueue.
+    The Tk thread picks them up on its next poll instead of one after() per record."""
+
+    def __init__(self, queue: ProgressQueue):
         super().__init__()
-        self.widget = widget
+        self.queue = queue
 
     def emit(self, record: logging.LogRecord):
-        msg = self.format(record) + "\n"
-        # Schedule on the main thread to be thread-safe
-        self.widget.after(0, self._append, msg)
-
-    def _append(self, msg: str):
-        self.widget.config(state="normal")
-        self.widget.insert("end", msg)
-        self.widget.see("end")
-        self.widget.config(state="disabled")
+        self.queue.put_log(self.format(record) + "\n")
 
 
 class PipelineGUI:
     def __init__(self, root: tk.Tk):
         self.root = root
         self.root.title("Bluesky Finder")
-        self.root.geometry("920x780")
+        self.root.geometry("960x800")
         self.root.minsize(800, 600)
 
         self._running = False
+        self._cancel = threading.Event()
+        self.events = ProgressQueue()
 
         self._build_ui()
+        self.root.after(POLL_MS, self._poll_events)
 
     def _build_ui(self):
+        tabs = ttk.Notebook(self.root)
+        tabs.pack(fill="both", expand=True, padx=10, pady=10)
+
+        pipeline_tab = ttk.Frame(tabs)
+        tabs.add(pipeline_tab, text="Pipeline")
+        results_tab = ttk.Frame(tabs, padding=4)
+        tabs.add(results_tab, text="Results")
+
+        self._build_pipeline_tab(pipeline_tab)
+        self._build_results(results_tab)
+
+        # Load the first page the first time the Results tab is shown
+        def on_tab_changed(_event):
+            if tabs.select() == str(results_tab) and self._page is None:
+                self._results_first_page()
+
+        tabs.bind("<<NotebookTabChanged>>", on_tab_changed)
+
+    def _build_pipeline_tab(self, parent):
         # Use a PanedWindow so user can resize config vs output
-        pane = ttk.PanedWindow(self.root, orient="vertical")
-        pane.pack(fill="both", expand=True, padx=10, pady=10)
+        pane = ttk.PanedWindow(parent, orient="vertical")
+        pane.pack(fill="both", expand=True)
 
         # ===== Top: config + controls =====
         top = ttk.Frame(pane)
@@ -182,8 +213,9 @@ class PipelineGUI:
             self.max_per_hashtag_var.set(settings.discovery_limits.max_candidates_per_hashtag)
             self.max_per_anchor_var.set(settings.discovery_limits.max_accounts_per_anchor)
             self.fetch_posts_var.set(settings.fetch_posts_limit)
-            self.thresh_match_var.set(settings.scoring_thresholds.match_overall)
-            self.thresh_maybe_var.set(settings.scoring_thresholds.maybe_overall)
+            thresholds = settings.thresholds_for(settings.current_topic)
+            self.thresh_match_var.set(thresholds.match_overall)
+            self.thresh_maybe_var.set(thresholds.maybe_overall)
             self.model_var.set(settings.openrouter_model)
             self.db_path_var.set(str(settings.db_path))
             self.ttl_profile_var.set(settings.ttl_profile_hours)
@@ -221,9 +253,10 @@ class PipelineGUI:
         settings.discovery_limits.max_accounts_per_anchor = self.max_per_anchor_var.get()
         settings.fetch_posts_limit = self.fetch_posts_var.get()
 
-        # Scoring
-        settings.scoring_thresholds.match_overall = self.thresh_match_var.get()
-        settings.scoring_thresholds.maybe_overall = self.thresh_maybe_var.get()
+        # Scoring (the current topic's thresholds)
+        thresholds = settings.thresholds_for(settings.current_topic)
+        thresholds.match_overall = self.thresh_match_var.get()
+        thresholds.maybe_overall = self.thresh_maybe_var.get()
 
         # LLM
         settings.openrouter_model = self.model_var.get()
@@ -256,6 +289,7 @@ class PipelineGUI:
             ("Discover", self._run_discover),
             ("Fetch", self._run_fetch),
             ("Evaluate", self._run_evaluate),
+            ("Relabel", self._run_relabel),
             ("Run All", self._run_all),
             ("Export", self._run_export),
         ]:
@@ -263,6 +297,11 @@ class PipelineGUI:
             b.pack(side="left", padx=3)
             self.buttons[label] = b
 
+        self.cancel_button = ttk.Button(
+            ctl, text="Cancel", command=self._request_cancel, state="disabled"
+        )
+        self.cancel_button.pack(side="right", padx=3)
+
     # ---------- log ----------
 
     def _build_log(self, parent):
@@ -271,6 +310,15 @@ class PipelineGUI:
         ttk.Label(parent, textvariable=self.stats_var, relief="sunken",
                   anchor="w", padding=4).pack(fill="x", pady=(0, 4))
 
+        # Progress of the running stage
+        prog = ttk.Frame(parent)
+        prog.pack(fill="x", pady=(0, 4))
+        self.progress_bar = ttk.Progressbar(prog, mode="determinate", maximum=1)
+        self.progress_bar.pack(side="left", fill="x", expand=True)
+        self.progress_var = tk.StringVar(value="")
+        ttk.Label(prog, textvariable=self.progress_var, width=48,
+                  anchor="w").pack(side="left", padx=(6, 0))
+
         log_frame = ttk.LabelFrame(parent, text="Output", padding=4)
         log_frame.pack(fill="both", expand=True)
 
@@ -286,7 +334,7 @@ class PipelineGUI:
 
     def _setup_logging(self):
         """Route the root logger (INFO+) into the output widget."""
-        handler = _TkTextHandler(self.log)
+        handler = _QueueLogHandler(self.events)
         handler.setFormatter(
             logging.Formatter("%(asctime)s %(name)s %(levelname)s: %(message)s",
                               datefmt="%H:%M:%S")
@@ -295,41 +343,297 @@ class PipelineGUI:
         root_logger.setLevel(logging.INFO)
         root_logger.addHandler(handler)
 
+    # ---------- results browser ----------
+
+    def _build_results(self, parent):
+        """
+        Paged candidate browser. The Treeview only ever holds one page; paging
+        uses (score, did) cursors and every query runs on a worker thread.
+        """
+        self._page = None  # rows currently shown, or None before first load
+        self._page_sort = "overall"  # sort column the shown page was fetched with
+        self._page_number = 0
+        self._query_generation = {}  # channel -> id of the latest query
+
+        bar = ttk.Frame(parent)
+        bar.pack(fill="x", pady=(0, 4))
+
+        ttk.Label(bar, text="Label:").pack(side="left")
+        self.result_label_var = tk.StringVar(value="all")
+        label_box = ttk.Combobox(bar, textvariable=self.result_label_var,
+                                 values=LABEL_FILTERS, state="readonly", width=7)
+        label_box.pack(side="left", padx=4)
+        label_box.bind("<<ComboboxSelected>>", lambda _e: self._results_first_page())
+
+        ttk.Label(bar, text="  Sort:").pack(side="left")
+        self.result_sort_var = tk.StringVar(value="overall")
+        sort_box = ttk.Combobox(bar, textvariable=self.result_sort_var,
+                                values=["overall", "tech", "location"],
+                                state="readonly", width=9)
+        sort_box.pack(side="left", padx=4)
+        sort_box.bind("<<ComboboxSelected>>", lambda _e: self._results_first_page())
+
+        self.result_desc_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(bar, text="Descending", variable=self.result_desc_var,
+                        command=self._results_first_page).pack(side="left", padx=4)
+
+        ttk.Button(bar, text="Refresh",
+                   command=self._results_first_page).pack(side="left", padx=3)
+
+        self.next_button = ttk.Button(bar, text="Next >", command=self._results_next)
+        self.next_button.pack(side="right", padx=3)
+        self.prev_button = ttk.Button(bar, text="< Prev", command=self._results_prev)
+        self.prev_button.pack(side="right", padx=3)
+        self.results_status_var = tk.StringVar(value="")
+        ttk.Label(bar, textvariable=self.results_status_var).pack(side="right", padx=8)
+
+        pane = ttk.PanedWindow(parent, orient="vertical")
+        pane.pack(fill="both", expand=True)
+
+        table = ttk.Frame(pane)
+        pane.add(table, weight=3)
+        self.results_tree = ttk.Treeview(
+            table, columns=[c[0] for c in RESULT_COLUMNS], show="headings",
+            selectmode="browse",
+        )
+        for key, heading, width in RESULT_COLUMNS:
+            self.results_tree.heading(key, text=heading)
+            anchor = "e" if key in ("overall", "tech", "location") else "w"
+            self.results_tree.column(key, width=width, anchor=anchor,
+                                     stretch=key in ("handle", "display_name"))
+        for key in ("overall", "tech", "location"):
+            self.results_tree.heading(
+                key, command=lambda k=key: self._results_sort_by(k)
+            )
+        scroll = ttk.Scrollbar(table, orient="vertical",
+                               command=self.results_tree.yview)
+        self.results_tree.configure(yscrollcommand=scroll.set)
+        self.results_tree.pack(side="left", fill="both", expand=True)
+        scroll.pack(side="right", fill="y")
+        self.results_tree.bind("<<TreeviewSelect>>", self._results_selected)
+
+        detail_frame = ttk.LabelFrame(pane, text="Detail", padding=4)
+        pane.add(detail_frame, weight=2)
+        self.detail = scrolledtext.ScrolledText(
+            detail_frame, wrap="word", state="disabled", font=("Consolas", 9)
+        )
+        self.detail.pack(fill="both", expand=True)
+
+    def _query_in_background(self, channel: str, query, on_result):
+        """Run `query(db)` off the Tk thread; drop the result if a newer query
+        on the same channel was issued meanwhile."""
+        generation = self._query_generation.get(channel, 0) + 1
+        self._query_generation[channel] = generation
+
+        def work():
+            try:
+                from .database import get_db
+                db = get_db()
+                try:
+                    result = query(db)
+                finally:
+                    db.close()
+            except Exception as e:
+                result = e
+
+            def deliver():
+                if generation != self._query_generation[channel]:
+                    return
+                if isinstance(result, Exception):
+                    self.results_status_var.set(f"Query failed: {result}")
+                else:
+                    on_result(result)
+
+            self.root.after(0, deliver)
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def _load_page(self, page_number: int, after=None, before=None):
+        from .queries import PAGE_SIZE, page_candidates
+
+        sort = self.result_sort_var.get()
+        descending = self.result_desc_var.get()
+        label = self.result_label_var.get()
+        label = None if label == "all" else label
+        self.results_status_var.set("Loading...")
+
+        def query(db):
+            rows = page_candidates(db, sort, descending, label, after=after,
+                                   before=before, limit=PAGE_SIZE)
+            # A short forward page is the end; peek so Next is disabled exactly
+            has_more = None
+            if before is None and len(rows) == PAGE_SIZE:
+                has_more = bool(page_candidates(
+                    db, sort, descending, label,
+                    after=rows[-1].cursor(sort), limit=1,
+                ))
+            return rows, has_more
+
+        def show(result):
+            rows, has_more = result
+            if not rows and page_number > 0:
+                # Everything after the cursor vanished (e.g. relabelled); stay put
+                self.results_status_var.set("No more rows")
+                self.next_button.config(state="disabled")
+                return
+            self._page = rows
+            self._page_sort = sort
+            self._page_number = page_number
+            self.results_tree.delete(*self.results_tree.get_children())
+            for row in rows:
+                self.results_tree.insert("", "end", iid=row.did, values=(
+                    row.handle or "", row.display_name or "", row.label or "",
+                    f"{row.score_overall:.2f}", f"{row.score_tech:.2f}",
+                    f"{row.score_location:.2f}",
+                ))
+            first = page_number * PAGE_SIZE + 1
+            shown = f"{first}-{first + len(rows) - 1}" if rows else "0"
+            self.results_status_var.set(f"Rows {shown}")
+            self.prev_button.config(state="normal" if page_number > 0 else "disabled")
+            if has_more is not None:
+                self.next_button.config(state="normal" if has_more else "disabled")
+            elif before is None:
+                self.next_button.config(state="disabled")
+            else:
+                self.next_button.config(state="normal")
+
+        self._query_in_background("page", query, show)
+
+    def _results_first_page(self):
+        self._load_page(0)
+
+    def _results_next(self):
+        if self._page:
+            self._load_page(self._page_number + 1,
+                            after=self._page[-1].cursor(self._page_sort))
+
+    def _results_prev(self):
+        if self._page and self._page_number > 0:
+            self._load_page(self._page_number - 1,
+                            before=self._page[0].cursor(self._page_sort))
+
+    def _results_sort_by(self, key: str):
+        if self.result_sort_var.get() == key:
+            self.result_desc_var.set(not self.result_desc_var.get())
+        else:
+            self.result_sort_var.set(key)
+            self.result_desc_var.set(True)
+        self._results_first_page()
+
+    def _results_selected(self, _event):
+        selection = self.results_tree.selection()
+        if not selection:
+            return
+        did = selection[0]
+
+        def query(db):
+            from .queries import candidate_detail
+            return candidate_detail(db, did)
+
+        self._query_in_background("detail", query, self._show_detail)
+
+    def _show_detail(self, detail):
+        lines = []
+        if detail is None:
+            lines.append("Candidate no longer in the database.")
+        else:
+            name = detail["display_name"] or ""
+            lines.append(f"{name} @{detail['handle']}  ({detail['did']})")
+            lines.append(f"Sources: {', '.join(detail['sources']) or '-'}")
+            if detail["spam_flagged"]:
+                lines.append("** Flagged as likely spam/bot (near-duplicate posts) **")
+            if detail["description"]:
+                lines.append(f"\n{detail['description']}")
+            if detail["label"] is not None:
+                lines.append(
+                    f"\nLabel: {detail['label']}  overall {detail['score_overall']:.2f}"
+                    f"  tech {detail['score_tech']:.2f}"
+                    f"  location {detail['score_location']:.2f}"
+                    f"  ({detail['model'] or 'unknown model'})"
+                )
+                lines.append(f"\nRationale:\n{detail['rationale'] or '-'}")
+            if detail["evidence"]:
+                lines.append("\nEvidence:")
+                lines.extend(f"  - {e}" for e in detail["evidence"])
+            if detail["uncertainties"]:
+                lines.append("\nUncertainties:")
+                lines.extend(f"  - {u}" for u in detail["uncertainties"])
+            if detail["posts"]:
+                lines.append(f"\nRecent posts ({len(detail['posts'])}):")
+                for post in detail["posts"]:
+                    when = post["created_at"].strftime("%Y-%m-%d") if post["created_at"] else "?"
+                    prefix = "[repost] " if post["is_repost"] else ""
+                    lines.append(f"  {when}  {prefix}{post['text']}")
+
+        self.detail.config(state="normal")
+        self.detail.delete("1.0", "end")
+        self.detail.insert("1.0", "\n".join(lines))
+        self.detail.config(state="disabled")
+
     # ---------- helpers ----------
 
     def _append_log(self, text: str):
         self.log.config(state="normal")
         self.log.insert("end", text)
+        # Cap the widget so a multi-hour run doesn't grow without bound
+        lines = int(self.log.index("end-1c").split(".")[0])
+        if lines > MAX_LOG_LINES:
+            self.log.delete("1.0", f"{lines - MAX_LOG_LINES + 1}.0")
         self.log.see("end")
         self.log.config(state="disabled")
 
+    def _poll_events(self):
+        """Drain coalesced output/progress from the worker thread (Tk thread only)."""
+        events, text = self.events.drain()
+        if text:
+            self._append_log(text)
+        if events:
+            # Show the most recently active stage
+            event = max(events, key=lambda e: (not e.finished, e.done))
+            if event.total:
+                self.progress_bar.config(mode="determinate", maximum=event.total)
+                self.progress_bar["value"] = event.done
+            else:
+                self.progress_bar.config(mode="determinate", maximum=1)
+                self.progress_bar["value"] = 1 if event.finished else 0
+            self.progress_var.set(event.describe())
+        self.root.after(POLL_MS, self._poll_events)
+
+    def _request_cancel(self):
+        self._cancel.set()
+        self.cancel_button.config(state="disabled")
+        self.stats_var.set("Cancelling after the current item...")
+
     def _set_buttons_state(self, state: str):
         for b in self.buttons.values():
             b.config(state=state)
+        self.cancel_button.config(state="disabled" if state == "normal" else "normal")
 
     def _load_stats(self):
-        try:
-            from .database import get_db, DbCandidate, DbLlmEval
-            db = get_db()
-            total = db.query(DbCandidate).count()
-            evaluated = db.query(DbLlmEval).count()
-            matched = db.query(DbLlmEval).filter(DbLlmEval.label == "match").count()
-            maybe = db.query(DbLlmEval).filter(DbLlmEval.label == "maybe").count()
-            db.close()
-            self.stats_var.set(
-                f"DB: {total} candidates | {evaluated} evaluated | "
-                f"{matched} match | {maybe} maybe"
-            )
-        except Exception as e:
-            self.stats_var.set(f"DB stats unavailable: {e}")
+        """Read the maintained stats table on a worker thread, never the Tk thread."""
+
+        def work():
+            try:
+                from .database import format_stats, get_db, read_stats
+                db = get_db()
+                text = format_stats(read_stats(db))
+                db.close()
+            except Exception as e:
+                text = f"DB stats unavailable: {e}"
+            self.root.after(0, self.stats_var.set, text)
+
+        threading.Thread(target=work, daemon=True).start()
 
     def _run_in_thread(self, label: str, func):
         if self._running:
             return
 
         self._running = True
+        self._cancel.clear()
         self._set_buttons_state("disabled")
         self.stats_var.set(f"Running: {label}...")
+        self.progress_var.set("")
+        self.progress_bar["value"] = 0
         self._append_log(f"\n{'='*60}\n{label}\n{'='*60}\n")
 
         # Apply GUI config before every run
@@ -339,16 +643,16 @@ class PipelineGUI:
             self._append_log(f"Config error: {e}\n")
 
         def target():
-            buf = StringIO()
+            # Stream output through the queue as it is produced
+            writer = QueueWriter(self.events)
             try:
-                with redirect_stdout(buf), redirect_stderr(buf):
+                with redirect_stdout(writer), redirect_stderr(writer):
                     func()
-                output = buf.getvalue()
-                self.root.after(0, self._append_log, output)
                 self.root.after(0, self.stats_var.set, f"{label} complete.")
+            except PipelineCancelled as exc:
+                self.root.after(0, self.stats_var.set, f"{label} cancelled ({exc}).")
             except Exception as exc:
-                output = buf.getvalue()
-                self.root.after(0, self._append_log, output + f"\nERROR: {exc}\n")
+                self.events.put_log(f"\nERROR: {exc}\n")
                 self.root.after(0, self.stats_var.set, f"{label} failed: {exc}")
             finally:
                 self.root.after(0, self._set_buttons_state, "normal")
@@ -359,7 +663,7 @@ class PipelineGUI:
 
     def _get_pipeline(self):
         from .pipeline import Pipeline
-        return Pipeline()
+        return Pipeline(progress=self.events.put_event, cancel=self._cancel)
 
     # ---------- commands ----------
 
@@ -380,6 +684,12 @@ class PipelineGUI:
             self._get_pipeline().run_evaluation(force=force)
         self._run_in_thread("Evaluate", work)
 
+    def _run_relabel(self):
+        # Applies the thresholds from the config panel to stored scores
+        def work():
+            self._get_pipeline().run_relabel()
+        self._run_in_thread("Relabel", work)
+
     def _run_all(self):
         force = self.force_var.get()
         fmt = self.format_var.get()
@@ -389,9 +699,13 @@ class PipelineGUI:
             p.run_discovery()
             print("\n--- Step 2: Fetch ---")
             p.run_fetch(force=force)
-            print("\n--- Step 3: Evaluate ---")
+            print("\n--- Step 3: Dedupe ---")
+            p.run_dedupe()
+            print("\n--- Step 4: Embed ---")
+            p.run_embedding()
+            print("\n--- Step 5: Evaluate ---")
             p.run_evaluation(force=force)
-            print("\n--- Step 4: Export ---")
+            print("\n--- Step 6: Export ---")
             p.export_results(format=fmt)
         self._run_in_thread("Run All", work)
 
@@ -0,0 +1,183 @@
+"""Hedged requests across LLM providers, with a circuit breaker per provider.
+
+A Provider is one (endpoint, model) the evaluation can be sent to: the
+primary OpenRouter model first, then the configured fallbacks. first_answer()
+sends a request to the first healthy provider. If that request fails, the
+next provider gets it. If it is still running past the provider's recent p95
+latency, a second (hedge) request goes out and whichever valid answer comes
+first wins. The loser is left to finish in the background, since the sync
+OpenAI client can't be cancelled; its outcome still feeds the health numbers.
+
+Each provider's breaker opens after `failures` consecutive errors and lets a
+single trial request through once `cooldown` seconds have passed. While a
+breaker is open, requests skip straight to the fallbacks instead of waiting
+on an endpoint that is down.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .metrics import metrics
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int, cooldown: float):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.consecutive = 0
+        self.opened_at: Optional[float] = None
+        self.trial = False  # a half-open probe is in flight
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.trial = True
+            return True
+
+    def record(self, ok: bool) -> bool:
+        """Returns True if this outcome just opened the breaker."""
+        with self.lock:
+            self.trial = False
+            if ok:
+                self.consecutive = 0
+                self.opened_at = None
+                return False
+            self.consecutive += 1
+            if self.consecutive < self.failures:
+                return False
+            was_closed = self.opened_at is None
+            self.opened_at = time.monotonic()
+            return was_closed
+
+
+class Provider:
+    """An endpoint + model, its breaker and its recent successful latencies."""
+
+    def __init__(
+        self,
+        name: str,
+        client: Any,
+        model: str,
+        breaker: CircuitBreaker,
+        window: int = 200,
+    ):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.breaker = breaker
+        # Whether the endpoint takes response_format: None = not tried yet
+        self.structured_ok: Optional[bool] = None
+        self.lock = threading.Lock()
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float, ok: bool) -> None:
+        if ok:
+            with self.lock:
+                self.latencies.append(seconds)
+        if self.breaker.record(ok):
+            metrics.inc("llm_breaker_opened_total", provider=self.name)
+            print(f"   [!] LLM provider {self.name} is failing; circuit opened")
+
+    def hedge_after(self, quantile: float, min_samples: int, initial: float) -> float:
+        """Seconds to wait before hedging: the `quantile` of recent latencies."""
+        with self.lock:
+            samples = sorted(self.latencies)
+        if len(samples) < min_samples:
+            return initial
+        return samples[min(int(quantile * len(samples)), len(samples) - 1)]
+
+
+def spawn(func: Callable[[], Any]) -> Future:
+    """Run `func` on its own daemon thread; a stuck call never queues others."""
+    future: Future = Future()
+
+    def run():
+        try:
+            future.set_result(func())
+        except BaseException as e:  # handed to whoever waits on the future
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def first_answer(
+    providers: List[Provider],
+    attempt: Callable[[Provider], Any],
+    hedge: bool = True,
+    quantile: float = 0.95,
+    min_samples: int = 20,
+    initial: float = 20.0,
+) -> Any:
+    """
+    attempt(provider) with failover and hedging; returns the first result.
+    Raises the last error once every provider has failed or is open.
+    """
+    queue = list(providers)
+    pending: Dict[Future, Provider] = {}
+
+    def launch(provider: Provider) -> None:
+        started = time.monotonic()
+        future = spawn(lambda: attempt(provider))
+        future.add_done_callback(
+            lambda f: provider.record(time.monotonic() - started, f.exception() is None)
+        )
+        pending[future] = provider
+
+    def launch_next() -> Optional[Provider]:
+        while queue:
+            provider = queue.pop(0)
+            if provider.breaker.allow():
+                launch(provider)
+                return provider
+            metrics.inc("llm_breaker_skips_total", provider=provider.name)
+        return None
+
+    current = launch_next()
+    if current is None:
+        raise RuntimeError("Every LLM provider's circuit is open")
+    hedge_at = time.monotonic() + current.hedge_after(quantile, min_samples, initial)
+    hedged = not hedge
+    error: Optional[BaseException] = None
+
+    while pending:
+        timeout = None if hedged else max(0.0, hedge_at - time.monotonic())
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            # Past the provider's p95: race it against the next provider, or
+            # against itself when there is no other (often a different upstream)
+            hedged = True
+            target = launch_next()
+            if target is None and current.breaker.allow():
+                launch(current)
+                target = current
+            if target is not None:
+                metrics.inc("llm_hedges_total", provider=target.name)
+            continue
+
+        for future in done:
+            provider = pending.pop(future)
+            if future.exception() is None:
+                for other in pending.values():
+                    metrics.inc("llm_hedge_losers_total", provider=other.name)
+                metrics.inc("llm_answers_total", provider=provider.name)
+                return future.result()
+            error = future.exception()
+        if not pending:
+            failed, current = current, launch_next()
+            if current is None:
+                break
+            metrics.inc("llm_failovers_total", provider=failed.name, to=current.name)
+            if not hedged:
+                hedge_at = time.monotonic() + current.hedge_after(
+                    quantile, min_samples, initial
+                )
+
+    raise error or RuntimeError("No LLM provider answered")
@@ -0,0 +1,172 @@
+"""Local handle <-> DID cache (the `identities` table).
+
+Candidates are keyed by DID, but handles change. Every (did, handle) pair an
+API response hands us is recorded with observe(); a new handle is appended
+to the DID's history and copied onto candidates.handle and profiles.handle,
+so exports link to the current handle without refetching profiles.
+
+A handle belongs to one DID at a time: when a DID takes a handle, it is
+cleared from whichever DID had it before, so resolve() can't answer with
+the stale one. Discovery calls preload() with each page of accounts, so
+observe() on an account already known, with the same handle, runs no query.
+
+Handles from settings (anchors) are mapped to DIDs with resolve(), which
+answers from the cache and looks up only missing or stale entries, in bulk.
+Lookups are passed in (BskyClient.get_profiles) so this module needs no
+network client of its own.
+"""
+
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import case, func, insert, literal_column
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import DbCandidate, DbIdentity, DbProfile, not_gone
+from .metrics import metrics
+
+# Bulk lookup: handles or DIDs in, [{did, handle}] out for those that exist
+Lookup = Callable[[List[str]], List[Dict]]
+
+
+def normalize_handle(handle: str) -> str:
+    """Handles are case-insensitive and often written as @name."""
+    return handle.strip().lstrip("@").lower()
+
+
+# DIDs per query when preloading a page
+PRELOAD_BATCH = 500
+
+
+def _with_history():
+    """previous_handles with the current handle appended (if there is one)."""
+    history = func.coalesce(DbIdentity.previous_handles, literal_column("'[]'"))
+    return case(
+        (DbIdentity.handle.is_(None), history),
+        else_=func.json_insert(history, "$[#]", DbIdentity.handle),
+    )
+
+
+class IdentityCache:
+    def __init__(self, db: Session):
+        self.db = db
+        # did -> identity row (None: not in the cache) of the preloaded page
+        self._page: Dict[str, Optional[DbIdentity]] = {}
+
+    def _fresh_after(self) -> datetime:
+        return datetime.utcnow() - settings.min_interval_identity_refresh
+
+    def preload(self, dids: Iterable[str]) -> None:
+        """Look up the identities of a page of accounts about to be observed."""
+        dids = list(dict.fromkeys(dids))
+        self._page = dict.fromkeys(dids)
+        for i in range(0, len(dids), PRELOAD_BATCH):
+            batch = dids[i : i + PRELOAD_BATCH]
+            for ident in self.db.query(DbIdentity).filter(DbIdentity.did.in_(batch)):
+                self._page[ident.did] = ident
+
+    def observe(self, did: str, handle: str) -> bool:
+        """Record that `did` currently has `handle`. True if the handle changed."""
+        if not handle:
+            return False
+        now = datetime.utcnow()
+        ident = self._page.get(did)
+        if did not in self._page or (ident is not None and ident not in self.db):
+            # Not preloaded, or the preloaded row was rolled back since
+            ident = self.db.get(DbIdentity, did)
+        if ident is not None and ident.handle == handle:
+            ident.resolved_at = now
+            return False
+
+        # Statements run right away, in this order, without flushing pending
+        # changes first: the old holder must let go of the handle before the
+        # unique index sees it on this DID
+        with self.db.no_autoflush:
+            self._update(
+                (DbIdentity.handle == handle) & (DbIdentity.did != did),
+                {DbIdentity.previous_handles: _with_history(), DbIdentity.handle: None},
+            )
+            if ident is None:
+                self.db.execute(
+                    insert(DbIdentity).values(
+                        did=did, handle=handle, previous_handles=[], resolved_at=now
+                    )
+                )
+                self._page.pop(did, None)
+                metrics.inc("rows_written_total", table="identities")
+            else:
+                self._update(
+                    DbIdentity.did == did,
+                    {
+                        DbIdentity.previous_handles: _with_history(),
+                        DbIdentity.handle: handle,
+                        DbIdentity.changed_at: now,
+                        DbIdentity.resolved_at: now,
+                    },
+                )
+                metrics.inc("handle_changes_total")
+            # Rows written before this cache existed, or before the change
+            for model in (DbCandidate, DbProfile):
+                self.db.query(model).filter(
+                    model.did == did, model.handle.is_(None) | (model.handle != handle)
+                ).update({model.handle: handle}, synchronize_session="evaluate")
+        return ident is not None
+
+    def _update(self, where, values: dict) -> None:
+        # "fetch" refreshes the changed columns of rows loaded in the session
+        self.db.query(DbIdentity).filter(where).update(
+            values, synchronize_session="fetch"
+        )
+
+    def resolve(self, handles: Iterable[str], lookup: Lookup) -> Dict[str, str]:
+        """
+        Map handles to DIDs, keyed by the handles as given. Fresh cache
+        entries cost nothing; the rest go to `lookup` in one bulk call.
+        Handles that don't resolve are left out.
+        """
+        wanted = {h: normalize_handle(h) for h in handles}
+        cutoff = self._fresh_after()
+        known: Dict[str, str] = {}
+        rows = self.db.query(DbIdentity.handle, DbIdentity.did, DbIdentity.resolved_at)
+        for handle, did, resolved_at in rows.filter(
+            DbIdentity.handle.in_(set(wanted.values()))
+        ):
+            if resolved_at and resolved_at >= cutoff:
+                known[handle] = did
+
+        missing = sorted({n for n in wanted.values() if n not in known})
+        hits = len(set(wanted.values())) - len(missing)
+        metrics.inc("cache_hits_total", hits, stage="identity")
+        if missing:
+            found_all = lookup(missing)
+            self.preload(found["did"] for found in found_all)
+            for found in found_all:
+                self.observe(found["did"], found["handle"])
+                known[normalize_handle(found["handle"])] = found["did"]
+            self.db.commit()
+
+        return {h: known[n] for h, n in wanted.items() if n in known}
+
+    def refresh(self, lookup: Lookup, force: bool = False) -> Dict[str, int]:
+        """
+        Re-check the handles of candidates never resolved or resolved longer
+        than the TTL ago, in bulk. Returns how many were checked and changed.
+        """
+        q = (
+            self.db.query(DbCandidate.did)
+            .outerjoin(DbIdentity, DbIdentity.did == DbCandidate.did)
+            .filter(not_gone(DbCandidate.did))
+        )
+        if not force:
+            q = q.filter(
+                DbIdentity.did.is_(None) | (DbIdentity.resolved_at < self._fresh_after())
+            )
+        dids = [did for (did,) in q]
+        self.preload(dids)
+        changed = 0
+        for found in lookup(dids):
+            if self.observe(found["did"], found["handle"]):
+                changed += 1
+        self.db.commit()
+        return {"checked": len(dids), "changed": changed}
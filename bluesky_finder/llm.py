@@ -1,31 +1,228 @@
 import json
-from typing import Any, Dict, List, Tuple
+import os
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
 
-from openai import OpenAI
-from .config import settings
+from .config import ScoringThresholds, TopicProfile, settings
+from .hedging import CircuitBreaker, Provider, first_answer
+from .metrics import metrics
 from .models import LlmEvaluationResult
 
-client = OpenAI(
-    api_key=settings.openrouter_api_key, base_url=settings.openrouter_base_url
-)
+if TYPE_CHECKING:
+    import httpx
+    from openai import OpenAI
+
+
+def _count_retries(request: "httpx.Request"):
+    # openai-python tags each attempt; > 0 means its built-in retry kicked in
+    if int(request.headers.get("x-stainless-retry-count", "0") or 0) > 0:
+        metrics.inc("llm_retries_total", host=request.url.host)
+
+
+def make_client(api_key: str, base_url: str, **kwargs) -> "OpenAI":
+    # openai is a heavy import; only pay for it when a client is needed
+    import httpx
+    from openai import OpenAI
+
+    from .cassette import transport
+
+    return OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=httpx.Client(
+            event_hooks={"request": [_count_retries]}, transport=transport()
+        ),
+        **kwargs,
+    )
+
+
+_client: Optional["OpenAI"] = None
+
+
+def get_client() -> "OpenAI":
+    """The shared LLM client, created (and the API key checked) on first use."""
+    global _client
+    if _client is None:
+        from .cassette import get_cassette
+
+        api_key = settings.openrouter_api_key
+        if not api_key:
+            cassette = get_cassette()
+            if cassette is None or not cassette.replaying:
+                raise ValueError("OPENROUTER_API_KEY required for LLM evaluation")
+            api_key = "replay"  # never sent anywhere
+        _client = make_client(api_key, settings.openrouter_base_url)
+    return _client
+
+
+def set_client(client: "OpenAI") -> None:
+    """Use a preconfigured client (e.g. one pointed at the bench fake server)."""
+    global _client, _providers
+    _client = client
+    _providers = None
+
+
+_providers: Optional[List[Provider]] = None
+
+
+def get_providers() -> List[Provider]:
+    """The primary model on the shared client, then the configured fallbacks."""
+    global _providers
+    if _providers is None:
+        cfg = settings.llm
+
+        def breaker() -> CircuitBreaker:
+            return CircuitBreaker(cfg.breaker_failures, cfg.breaker_cooldown_seconds)
+
+        primary = get_client()
+        model = settings.openrouter_model
+        providers = [Provider(model, primary, model, breaker())]
+        for endpoint in cfg.fallbacks:
+            key = os.environ.get(endpoint.api_key_env) if endpoint.api_key_env else None
+            client = primary
+            if endpoint.base_url or endpoint.api_key_env:
+                client = make_client(
+                    key or primary.api_key,
+                    endpoint.base_url or str(primary.base_url),
+                )
+            name = endpoint.name or endpoint.model
+            providers.append(Provider(name, client, endpoint.model, breaker()))
+        _providers = providers
+    return _providers
 
 SYSTEM_PROMPT = """
 You are an expert recruiter and location analyst. 
-Your Goal: Identify if a Bluesky user is a "DC-area Tech Professional".
+Your Goal: Identify if a Bluesky user is a "{title}".
 
 Definitions:
-1. Location: DC / Northern VA / Maryland suburbs (DMV).
-2. Profession: Software, Data, Security, Product, Design, DevRel, etc.
+1. Location: {location}
+2. {subject_label}: {subject}
 
 Input: JSON with "bio" and "posts".
 Output: Strict JSON matching the schema.
 Rules:
 - Be probabilistic but strict on location evidence.
-- "Match" = High confidence in BOTH location AND tech.
-- "Maybe" = Strong tech but unsure location, or vice versa.
+- "Match" = High confidence in BOTH location AND {subject_rule}.
+- "Maybe" = Strong {subject_rule} but unsure location, or vice versa.
 - "No" = Clearly irrelevant.
+- score_location scores 1., score_tech scores 2.
 """
 
+MULTI_SYSTEM_PROMPT = """
+You are an expert recruiter and location analyst. 
+Your Goal: Judge a Bluesky user against each of these topics.
+
+{topics}
+
+Input: JSON with "bio" and "posts".
+Output: Strict JSON matching the schema: {{"evaluations": {{...}}}} with one
+evaluation per topic key: {keys}
+Rules:
+- Judge every topic on its own; they share nothing but the input.
+- Be probabilistic but strict on location evidence.
+- "Match" = High confidence in BOTH the topic's location AND its 2.
+- "Maybe" = Strong on one, unsure about the other.
+- "No" = Clearly irrelevant.
+- score_location scores the topic's 1., score_tech its 2.
+"""
+
+MULTI_TOPIC = """Topic key {name}: "{title}"
+1. Location: {location}
+2. {subject_label}: {subject}"""
+
+EVALUATION_KEYS = """exactly these keys: score_location, score_tech,
+score_overall (numbers from 0 to 1), label ("match", "maybe" or "no"),
+rationale, evidence (list of strings), uncertainties (list of strings)"""
+
+REPAIR_PROMPT = """
+Your previous reply could not be parsed. Return only the corrected JSON
+object, with {keys}.
+Keep the judgement you already made and keep the rationale short.
+"""
+
+MULTI_REPAIR_PROMPT = """
+Your previous reply could not be parsed. Return only the corrected JSON
+object {{"evaluations": {{...}}}} with one evaluation per topic key: {names}.
+Each evaluation has {keys}.
+Keep the judgements you already made and keep the rationales short.
+"""
+
+
+def _subject_rule(topic: TopicProfile) -> str:
+    # The default topic's rules read "location AND tech", as they always have
+    return "tech" if topic.subject_label == "Profession" else topic.subject_label
+
+
+def system_prompt(topics: Sequence[TopicProfile]) -> str:
+    """The system prompt for one topic, or for several answered at once."""
+    if len(topics) == 1:
+        topic = topics[0]
+        return SYSTEM_PROMPT.format(
+            title=topic.title,
+            location=topic.location,
+            subject_label=topic.subject_label,
+            subject=topic.subject,
+            subject_rule=_subject_rule(topic),
+        )
+    return MULTI_SYSTEM_PROMPT.format(
+        topics="\n\n".join(MULTI_TOPIC.format(**t.model_dump()) for t in topics),
+        keys=", ".join(t.name for t in topics),
+    )
+
+
+@lru_cache(maxsize=None)
+def response_schema() -> dict:
+    """
+    LlmEvaluationResult as a strict JSON schema: $refs inlined, titles
+    dropped, every key required and no others allowed.
+    """
+    schema = LlmEvaluationResult.model_json_schema()
+    defs = schema.pop("$defs", {})
+
+    def inline(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return inline(defs[node["$ref"].rsplit("/", 1)[-1]])
+            return {k: inline(v) for k, v in node.items() if k != "title"}
+        if isinstance(node, list):
+            return [inline(v) for v in node]
+        return node
+
+    schema = inline(schema)
+    schema["required"] = list(schema["properties"])
+    schema["additionalProperties"] = False
+    return schema
+
+
+@lru_cache(maxsize=None)
+def multi_response_schema(names: Tuple[str, ...]) -> dict:
+    """{"evaluations": {name: <response_schema()>, ...}}, strict like it."""
+    evaluations = {
+        "type": "object",
+        "properties": {name: response_schema() for name in names},
+        "required": list(names),
+        "additionalProperties": False,
+    }
+    return {
+        "type": "object",
+        "properties": {"evaluations": evaluations},
+        "required": ["evaluations"],
+        "additionalProperties": False,
+    }
+
+
+def _response_format(names: Tuple[str, ...]) -> dict:
+    if len(names) == 1:
+        name, schema = "llm_evaluation", response_schema()
+    else:
+        name, schema = "llm_evaluations", multi_response_schema(names)
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "strict": True, "schema": schema},
+    }
+
 
 def preprocess_json(data: str) -> str:
     """
@@ -78,15 +275,20 @@ def _to_float01(x: Any) -> float:
     return v
 
 
-def _label_from_overall(overall: float) -> str:
-    if overall >= settings.scoring_thresholds.match_overall:
+def _label_from_overall(
+    overall: float, thresholds: Optional[ScoringThresholds] = None
+) -> str:
+    thresholds = thresholds or settings.scoring_thresholds
+    if overall >= thresholds.match_overall:
         return "match"
-    if overall >= settings.scoring_thresholds.maybe_overall:
+    if overall >= thresholds.maybe_overall:
         return "maybe"
     return "no"
 
 
-def _normalize_llm_json(data: Dict[str, Any]) -> Dict[str, Any]:
+def _normalize_llm_json(
+    data: Dict[str, Any], thresholds: Optional[ScoringThresholds] = None
+) -> Dict[str, Any]:
     """
     Coerce provider/model output into the exact LlmEvaluationResult shape.
     Accepts common variants like:
@@ -94,7 +296,9 @@ def _normalize_llm_json(data: Dict[str, Any]) -> Dict[str, Any]:
       - confidence / overall_confidence
       - location_score / tech_score
       - reasoning / conclusion
+    Labels derived from scores use `thresholds` (default: scoring_thresholds).
     """
+    thresholds = thresholds or settings.scoring_thresholds
     # pull likely fields from many possible keys
     loc = (
         data.get("score_location")
@@ -155,16 +359,14 @@ def _normalize_llm_json(data: Dict[str, Any]) -> Dict[str, Any]:
             v = str(verdict).strip().lower()
             if v in {"yes", "true", "match"}:
                 label = (
-                    "match"
-                    if score_overall >= settings.scoring_thresholds.match_overall
-                    else "maybe"
+                    "match" if score_overall >= thresholds.match_overall else "maybe"
                 )
             elif v in {"maybe"}:
                 label = "maybe"
             else:
                 label = "no"
         else:
-            label = _label_from_overall(score_overall)
+            label = _label_from_overall(score_overall, thresholds)
 
     # Rationale/evidence/uncertainties
     rationale = (
@@ -209,29 +411,283 @@ def _normalize_llm_json(data: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+@dataclass
+class LlmUsage:
+    """
+    Tokens and cost of one or more LLM calls, failed ones included. Calls are
+    also charged to `parent` (e.g. the run's total), so a hedge request that
+    finishes after its candidate was saved still counts against the run.
+    """
+
+    model: Optional[str] = None  # as reported by the provider
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    parent: Optional["LlmUsage"] = field(default=None, repr=False)
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+# Hedge requests charge their usage from their own threads
+_usage_lock = threading.Lock()
+
+
+def _charge(spent: Optional[LlmUsage], **amounts) -> None:
+    with _usage_lock:
+        while spent is not None:
+            for name, value in amounts.items():
+                if name == "model":
+                    spent.model = value
+                else:
+                    setattr(spent, name, getattr(spent, name) + value)
+            spent = spent.parent
+
+
+def _call_cost(usage, prompt_tokens: int, completion_tokens: int) -> float:
+    # OpenRouter reports what it billed; otherwise price the tokens
+    reported = getattr(usage, "cost", None)
+    if reported is not None:
+        return float(reported)
+    return (
+        prompt_tokens * settings.llm.prompt_usd_per_mtok
+        + completion_tokens * settings.llm.completion_usd_per_mtok
+    ) / 1e6
+
+
+def _record_usage(resp, spent: Optional[LlmUsage] = None) -> None:
+    model = getattr(resp, "model", None) or settings.openrouter_model
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return
+    prompt_tokens = usage.prompt_tokens or 0
+    completion_tokens = usage.completion_tokens or 0
+    cost = _call_cost(usage, prompt_tokens, completion_tokens)
+    metrics.inc("llm_prompt_tokens_total", prompt_tokens, model=model)
+    metrics.inc("llm_completion_tokens_total", completion_tokens, model=model)
+    metrics.inc("llm_cost_usd_total", cost, model=model)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details else None
+    if cached:
+        metrics.inc("llm_cached_prompt_tokens_total", cached, model=model)
+    _charge(
+        spent,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        cost_usd=cost,
+    )
+
+
+def _complete(
+    provider: Provider,
+    messages: List[Dict[str, str]],
+    structured: bool,
+    spent: Optional[LlmUsage],
+    names: Tuple[str, ...],
+):
+    model = provider.model
+    extra = {"response_format": _response_format(names)} if structured else {}
+    if "openrouter.ai" in str(provider.client.base_url):
+        # Ask OpenRouter to put the billed cost in `usage`
+        extra["extra_body"] = {"usage": {"include": True}}
+    metrics.inc("llm_calls_total", model=model)
+    _charge(spent, calls=1)
+    with metrics.timer("llm_request_seconds", model=model):
+        try:
+            resp = provider.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.0,
+                max_tokens=settings.llm.max_tokens * len(names),
+                timeout=settings.llm.request_timeout_seconds,
+                **extra,
+            )
+        except Exception:
+            metrics.inc("llm_errors_total", model=model)
+            metrics.inc("llm_wasted_calls_total", reason="error", model=model)
+            raise
+    _record_usage(resp, spent)
+    return resp
+
+
+def _attempt(
+    provider: Provider,
+    messages: List[Dict[str, str]],
+    spent: Optional[LlmUsage],
+    names: Tuple[str, ...],
+) -> Tuple[Any, bool]:
+    """
+    One completion from `provider` for the topics `names`, with structured
+    output unless it is turned off or the provider has rejected it. Returns
+    (response, structured).
+    """
+    structured = (
+        settings.llm.structured_output and provider.structured_ok is not False
+    )
+    try:
+        resp = _complete(provider, messages, structured, spent, names)
+    except Exception as e:
+        # A 400 once response_format has worked is about something else
+        if (
+            not structured
+            or provider.structured_ok
+            or getattr(e, "status_code", None) != 400
+        ):
+            raise
+        resp = _complete(provider, messages, False, spent, names)
+        provider.structured_ok = False
+        print(
+            f"   [!] {provider.name} rejected structured output; "
+            "asking for JSON in the prompt"
+        )
+        return resp, False
+    if structured:
+        provider.structured_ok = True
+    return resp, structured
+
+
+def _request(
+    messages: List[Dict[str, str]],
+    names: Tuple[str, ...],
+    spent: Optional[LlmUsage] = None,
+) -> Tuple[Any, bool]:
+    """The first answer from the providers, hedged and with failover."""
+    cfg = settings.llm
+    with metrics.timer("llm_answer_seconds"):
+        resp, structured = first_answer(
+            get_providers(),
+            lambda provider: _attempt(provider, messages, spent, names),
+            hedge=cfg.hedge,
+            quantile=cfg.hedge_quantile,
+            min_samples=cfg.hedge_min_samples,
+            initial=cfg.hedge_initial_seconds,
+        )
+    _charge(spent, model=getattr(resp, "model", None) or settings.openrouter_model)
+    return resp, structured
+
+
+def _parse_one(
+    data: Any, structured: bool, thresholds: ScoringThresholds
+) -> LlmEvaluationResult:
+    if not isinstance(data, dict):
+        raise ValueError("Evaluation is not a JSON object")
+    if structured:
+        # The schema was enforced, so take it as is rather than guessing keys
+        result = LlmEvaluationResult.model_validate(data)
+        result.evidence = result.evidence[:5]
+        result.uncertainties = result.uncertainties[:3]
+        return result
+    return LlmEvaluationResult(**_normalize_llm_json(data, thresholds))
+
+
+def _parse(
+    raw: str, structured: bool, topics: Sequence[TopicProfile]
+) -> Dict[str, LlmEvaluationResult]:
+    """
+    One result per topic, keyed by name. Raises ValueError (pydantic's
+    ValidationError included) if unusable or if any topic is missing.
+    """
+    data = json.loads(preprocess_json(raw))
+    if len(topics) == 1:
+        topic = topics[0]
+        thresholds = settings.thresholds_for(topic)
+        return {topic.name: _parse_one(data, structured, thresholds)}
+    evaluations = data.get("evaluations", data) if isinstance(data, dict) else None
+    if not isinstance(evaluations, dict):
+        raise ValueError("No evaluations object")
+    results = {}
+    for topic in topics:
+        if topic.name not in evaluations:
+            raise ValueError(f"No evaluation for topic {topic.name!r}")
+        results[topic.name] = _parse_one(
+            evaluations[topic.name], structured, settings.thresholds_for(topic)
+        )
+    return results
+
+
+def _repair_messages(
+    raw: str, error: Exception, names: Tuple[str, ...]
+) -> List[Dict[str, str]]:
+    if len(names) == 1:
+        prompt = REPAIR_PROMPT.format(keys=EVALUATION_KEYS)
+    else:
+        prompt = MULTI_REPAIR_PROMPT.format(
+            names=", ".join(names), keys=EVALUATION_KEYS
+        )
+    return [
+        {"role": "system", "content": prompt},
+        {
+            "role": "user",
+            "content": f"Reply:\n{raw[:4000]}\n\nProblem: {str(error)[:500]}",
+        },
+    ]
+
+
 def evaluate_candidate(
-    profile_data: dict, posts_data: list[dict]
+    profile_data: dict,
+    posts_data: list[dict],
+    spent: Optional[LlmUsage] = None,
+    topic: Optional[TopicProfile] = None,
 ) -> LlmEvaluationResult:
+    """Judge one candidate for one topic (default: the current one)."""
+    topic = topic or settings.current_topic
+    return evaluate_topics(profile_data, posts_data, [topic], spent)[topic.name]
+
+
+def evaluate_topics(
+    profile_data: dict,
+    posts_data: list[dict],
+    topics: Sequence[TopicProfile],
+    spent: Optional[LlmUsage] = None,
+) -> Dict[str, LlmEvaluationResult]:
+    """
+    Judge one candidate for every topic in `topics` with a single request
+    (and its repairs); results are keyed by topic name. Every call made for
+    it, including repairs and failures, is added to `spent` when given, even
+    if this raises.
+    """
     posts_text = [f"- {p['text']} ({p['created_at']})" for p in posts_data[:30]]
     user_payload = {
         "handle": profile_data.get("handle"),
         "bio": profile_data.get("description"),
         "recent_posts": posts_text,
     }
+    model = settings.openrouter_model
+    names = tuple(t.name for t in topics)
 
-    resp = client.chat.completions.create(
-        model=settings.openrouter_model,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
+    resp, structured = _request(
+        [
+            {"role": "system", "content": system_prompt(topics)},
             {"role": "user", "content": json.dumps(user_payload)},
         ],
-        temperature=0.0,
+        names,
+        spent,
     )
+    repairs = settings.llm.repair_attempts
+    for attempt in range(repairs + 1):
+        choice = resp.choices[0]
+        if getattr(choice.message, "refusal", None):
+            metrics.inc("llm_wasted_calls_total", reason="refused", model=model)
+            raise ValueError(f"LLM refused: {choice.message.refusal}")
+        raw = choice.message.content or ""
+        try:
+            results = _parse(raw, structured, topics)
+        except ValueError as e:
+            error = e
+            reason = "truncated" if choice.finish_reason == "length" else "unparseable"
+            metrics.inc("llm_wasted_calls_total", reason=reason, model=model)
+        else:
+            if attempt:
+                metrics.inc("llm_repairs_total", outcome="fixed", model=model)
+            return results
+        if attempt < repairs:
+            # Cheap: only the bad reply goes back, not the profile and posts
+            resp, structured = _request(
+                _repair_messages(raw, error, names), names, spent
+            )
 
-    raw = resp.choices[0].message.content or "{}"
-    raw = preprocess_json(raw)
-    print(raw)
-    data = json.loads(raw)
-
-    normalized = _normalize_llm_json(data)
-    return LlmEvaluationResult(**normalized)
+    if repairs:
+        metrics.inc("llm_repairs_total", outcome="failed", model=model)
+    raise ValueError(f"Unparseable LLM reply: {error}")
@@ -0,0 +1,218 @@
+"""In-process counters and latency histograms, plus run reports.
+
+A single module-level `metrics` registry (like `config.settings`) is fed by
+the AT client, the LLM client and the pipeline stages. At the end of a CLI
+command it is written out as a JSON run report and, optionally, as a
+Prometheus textfile for node_exporter's textfile collector.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+PREFIX = "bluesky_finder_"
+
+# Upper bounds in seconds; covers fast SQLite work up to slow LLM calls
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+    math.inf,
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th observation."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound if bound != math.inf else None
+        return None
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "p50_le": self.quantile(0.50),
+            "p99_le": self.quantile(0.99),
+            "buckets": {
+                ("+Inf" if b == math.inf else str(b)): n
+                for b, n in zip(self.buckets, self.counts)
+            },
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters: Dict[str, Dict[LabelKey, float]] = {}
+            self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+            self.started_at = datetime.utcnow()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram()
+            hist.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def value(self, name: str, **labels) -> float:
+        with self._lock:
+            return self.counters.get(name, {}).get(_label_key(labels), 0)
+
+    def total(self, name: str) -> float:
+        with self._lock:
+            return sum(self.counters.get(name, {}).values())
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": {
+                    name: [
+                        {"labels": dict(key), "value": value}
+                        for key, value in sorted(series.items())
+                    ]
+                    for name, series in sorted(self.counters.items())
+                },
+                "histograms": {
+                    name: [
+                        {"labels": dict(key), **hist.to_dict()}
+                        for key, hist in sorted(series.items())
+                    ]
+                    for name, series in sorted(self.histograms.items())
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+
+        def fmt(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+            pairs = list(key) + ([extra] if extra else [])
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                full = PREFIX + name
+                lines.append(f"# TYPE {full} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{full}{fmt(key)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                full = PREFIX + name
+                lines.append(f"# TYPE {full} histogram")
+                for key, hist in sorted(series.items()):
+                    cumulative = 0
+                    for bound, n in zip(hist.buckets, hist.counts):
+                        cumulative += n
+                        le = "+Inf" if bound == math.inf else str(bound)
+                        lines.append(f"{full}_bucket{fmt(key, ('le', le))} {cumulative}")
+                    lines.append(f"{full}_sum{fmt(key)} {hist.sum}")
+                    lines.append(f"{full}_count{fmt(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def timed_stage(stage: str):
+    """Decorator: record a pipeline stage's wall time under stage_seconds."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.timer("stage_seconds", stage=stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def write_run_report(
+    command: str,
+    status: str,
+    report_dir: Optional[Path],
+    textfile: Optional[Path] = None,
+) -> Optional[Path]:
+    """Dump the registry as JSON (and Prometheus text). Returns the JSON path."""
+    finished = datetime.utcnow()
+    path = None
+    if report_dir:
+        report_dir = Path(report_dir)
+        report_dir.mkdir(parents=True, exist_ok=True)
+        report = {
+            "command": command,
+            "status": status,
+            "started_at": metrics.started_at.isoformat() + "Z",
+            "finished_at": finished.isoformat() + "Z",
+            "seconds": round((finished - metrics.started_at).total_seconds(), 3),
+            **metrics.snapshot(),
+        }
+        path = report_dir / f"run_{finished.strftime('%Y%m%dT%H%M%S')}_{command}.json"
+        path.write_text(json.dumps(report, indent=2))
+
+    if textfile:
+        textfile = Path(textfile)
+        textfile.parent.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so the collector never reads a partial file
+        tmp = textfile.with_suffix(textfile.suffix + ".tmp")
+        tmp.write_text(metrics.to_prometheus())
+        os.replace(tmp, textfile)
+
+    return path
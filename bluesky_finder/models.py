@@ -11,6 +11,9 @@ Handle = str
 class DiscoverySource(str, Enum):
     HASHTAG = "hashtag"
     ANCHOR_FOLLOW = "anchor_follow"
+    LOCAL_SEARCH = "local_search"
+    LIST_MEMBER = "list_member"
+    ANCHOR_INTERACTION = "anchor_interaction"
 
 
 class LlmLabel(str, Enum):
@@ -1,215 +1,1020 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from itertools import groupby
 from pathlib import Path
-from typing import Literal
-from sqlalchemy.orm import Session
-from jinja2 import Environment, FileSystemLoader
-from .database import get_db, DbCandidate, DbProfile, DbPost, DbLlmEval
-from .at_client import BskyClient
-from .llm import evaluate_candidate
-from .config import settings
+from threading import Event
+from typing import TYPE_CHECKING, Literal, Optional
+from sqlalchemy.orm import Session, selectinload
+from .database import (
+    get_db,
+    DbCandidate,
+    DbDiscoveryRun,
+    DbEvaluationRun,
+    DbProfile,
+    DbPost,
+    DbLlmEval,
+    in_topic,
+    not_gone,
+)
+from .config import TopicProfile, settings
+from .failures import FetchFailed, blocked_dids, clear_failure, record_failure
 from .models import DiscoverySource
+from .budget import allocate, load_arms
+from .identity import IdentityCache
+from .queries import any_of, matching_dids
+from .sources import (
+    anchor_origin,
+    hashtag_origin,
+    interaction_origin,
+    list_origin,
+    pages_for,
+    parse_list_ref,
+    plan_interaction_requests,
+    record_yield,
+    saved_cursors,
+)
+from .metrics import metrics, timed_stage
+from .progress import PipelineCancelled, ProgressCallback, ProgressReporter
+
+# atproto, openai, numpy and jinja2 are imported where first used, so
+# commands like export/status/search start fast and need no credentials
+if TYPE_CHECKING:
+    from .at_client import BskyClient
+    from .llm import LlmUsage
+
+# Model name recorded on evaluations decided by the local similarity stage
+SIMILARITY_MODEL = "local-similarity"
 
 
 class Pipeline:
-    def __init__(self):
+    def __init__(
+        self,
+        progress: Optional[ProgressCallback] = None,
+        cancel: Optional[Event] = None,
+    ):
         self.db: Session = get_db()
-        self.bsky = BskyClient()
+        self._bsky: Optional["BskyClient"] = None
+        self.identities = IdentityCache(self.db)
+        self.progress = progress
+        self.cancel = cancel
+
+    @property
+    def bsky(self) -> "BskyClient":
+        """Logged-in AT client, created on first use (network stages only)."""
+        if self._bsky is None:
+            from .at_client import BskyClient
+
+            self._bsky = BskyClient()
+        return self._bsky
+
+    def _reporter(self, stage: str, total: Optional[int]) -> ProgressReporter:
+        return ProgressReporter(stage, total, self.progress)
 
+    def _checkpoint(self, stage: str):
+        """Commit and stop if a cancel was requested; work done so far is kept."""
+        if self.cancel is not None and self.cancel.is_set():
+            self.db.commit()
+            print(f"[!] {stage} cancelled.")
+            raise PipelineCancelled(stage)
+
+    @timed_stage("discover")
     def run_discovery(self):
         print("[*] Starting Discovery...")
         new_count = 0
+        progress = self._reporter(
+            "discover",
+            len(settings.seed_hashtags)
+            + len(settings.seed_lists)
+            + len(settings.anchor_handles),
+        )
+        limits = settings.discovery_limits
+        interactions = settings.interactions
+
+        # Lists and anchors are resolved to DIDs once (cached) up front;
+        # every graph call below goes by DID
+        lists = self._resolve_lists(settings.seed_lists)
+        anchors = self.identities.resolve(
+            settings.anchor_handles, self.bsky.get_profiles
+        )
+
+        # Requests per origin: what the static limits spend, re-split by
+        # past yield when the budget is adaptive (see budget.py)
+        tag_pages = pages_for(limits.max_candidates_per_hashtag)
+        list_pages = pages_for(limits.max_members_per_list)
+        anchor_pages = 2 * pages_for(limits.max_accounts_per_anchor // 2)
+        defaults = {hashtag_origin(tag): tag_pages for tag in settings.seed_hashtags}
+        defaults.update({list_origin(uri): list_pages for uri in lists.values() if uri})
+        for handle in anchors:
+            if interactions.enabled:
+                defaults[interaction_origin(handle)] = interactions.requests_per_anchor
+            defaults[anchor_origin(handle)] = anchor_pages
+        budgets = self._discovery_budgets(defaults)
+
+        def scaled(limit: int, origin: str) -> int:
+            return max(1, limit * budgets[origin] // defaults[origin])
+
+        run = DbDiscoveryRun(
+            adaptive=settings.discovery_budget.adaptive, budgets=budgets
+        )
+        self.db.add(run)
+        requests_before = self.bsky.request_count
 
         # Hashtags
         print("\n[Hashtag Discovery]")
         for tag in settings.seed_hashtags:
-            results = self.bsky.search_candidates(
-                tag, limit=settings.discovery_limits.max_candidates_per_hashtag
+            self._checkpoint("discover")
+            origin = hashtag_origin(tag)
+            new_count += self._discover_from(
+                DiscoverySource.HASHTAG,
+                origin,
+                lambda cursors: self._head_then_resume(
+                    cursors,
+                    "search",
+                    lambda cursor, limit: self.bsky.search_candidates(
+                        tag, limit=limit, cursor=cursor
+                    ),
+                    limit=scaled(limits.max_candidates_per_hashtag, origin),
+                    head=limits.max_candidates_per_hashtag,
+                ),
             )
-            for res in results:
-                if self._add_candidate(
-                        res["did"], res["handle"], DiscoverySource.HASHTAG
-                ):
-                    new_count += 1
+            progress.advance(message=tag)
+
+        # Curated lists and starter packs: densest source per request, so
+        # they get first claim on the candidates they share with anchors
+        print("\n[List Discovery]")
+        for ref, uri in lists.items():
+            self._checkpoint("discover")
+            if uri is None:
+                print(f"\nSkipping list {ref}")
+                progress.advance(message=ref)
+                continue
+            print(f"\nProcessing list: {uri}")
+            origin = list_origin(uri)
+            new_count += self._discover_from(
+                DiscoverySource.LIST_MEMBER,
+                origin,
+                lambda cursors: self._list_members(
+                    uri, scaled(limits.max_members_per_list, origin), cursors
+                ),
+            )
+            progress.advance(message=ref)
 
         # Anchor Accounts
         print("\n[Anchor Account Discovery]")
         for anchor_handle in settings.anchor_handles:
-            print(f"\nProcessing anchor: {anchor_handle}")
-
-            # Get followers
-            followers = self.bsky.get_followers(
-                anchor_handle,
-                limit=settings.discovery_limits.max_accounts_per_anchor // 2
+            self._checkpoint("discover")
+            anchor_did = anchors.get(anchor_handle)
+            if anchor_did is None:
+                print(f"\nSkipping anchor {anchor_handle}: handle does not resolve")
+                progress.advance(message=anchor_handle)
+                continue
+            print(f"\nProcessing anchor: {anchor_handle} ({anchor_did})")
+            # Interactions first: a tighter signal than the follower lists,
+            # so they get the credit for accounts found both ways
+            if interactions.enabled:
+                origin = interaction_origin(anchor_handle)
+                new_count += self._discover_from(
+                    DiscoverySource.ANCHOR_INTERACTION,
+                    origin,
+                    lambda _: self._anchor_interactors(anchor_did, budgets[origin]),
+                )
+            origin = anchor_origin(anchor_handle)
+            new_count += self._discover_from(
+                DiscoverySource.ANCHOR_FOLLOW,
+                origin,
+                lambda cursors: self._anchor_neighbours(
+                    anchor_did,
+                    scaled(limits.max_accounts_per_anchor // 2, origin),
+                    limits.max_accounts_per_anchor // 2,
+                    cursors,
+                    # A one-request budget only pages followers
+                    follows=budgets[origin] > 1,
+                ),
             )
-            print(f"  Found {len(followers)} followers")
-            for follower in followers:
-                if self._add_candidate(
-                        follower["did"],
-                        follower["handle"],
-                        DiscoverySource.ANCHOR_FOLLOW
-                ):
-                    new_count += 1
+            progress.advance(message=anchor_handle)
 
-            # Get following
-            following = self.bsky.get_following(
-                anchor_handle,
-                limit=settings.discovery_limits.max_accounts_per_anchor // 2
-            )
-            print(f"  Found {len(following)} following")
-            for follow in following:
-                if self._add_candidate(
-                        follow["did"],
-                        follow["handle"],
-                        DiscoverySource.ANCHOR_FOLLOW
-                ):
-                    new_count += 1
+        run.finished_at = datetime.utcnow()
+        run.requests = self.bsky.request_count - requests_before
+        run.new_candidates = new_count
+        self.db.commit()
+        progress.finish()
+        print(
+            f"\n[*] Discovery complete. Added {new_count} new candidates "
+            f"with {run.requests} requests."
+        )
+
+    def _discovery_budgets(self, defaults: dict) -> dict:
+        from .cassette import rng
+
+        budgets = allocate(
+            load_arms(self.db, defaults), settings.discovery_budget, rng=rng()
+        )
+        if budgets != defaults:
+            print("[*] Adaptive request budget (origin: static -> this run):")
+            for origin in sorted(budgets, key=budgets.get, reverse=True):
+                print(f"    {origin}: {defaults[origin]} -> {budgets[origin]}")
+        return budgets
+
+    def _discover_from(self, source: DiscoverySource, origin: str, fetch) -> int:
+        """
+        Add the accounts `fetch(cursors)` returns and record the origin's
+        yield. `cursors` holds where its paging stopped last run; fetch
+        updates it in place.
+        """
+        requests_before = self.bsky.request_count
+        cursors = saved_cursors(self.db, origin)
+        accounts = fetch(cursors)
+        self.identities.preload(account["did"] for account in accounts)
+        new = 0
+        for account in accounts:
+            if self._add_candidate(account["did"], account["handle"], source, origin):
+                new += 1
+            if "score" in account:
+                cand = self.db.get(DbCandidate, account["did"])
+                cand.interaction_score = max(
+                    cand.interaction_score or 0.0, account["score"]
+                )
+        record_yield(
+            self.db,
+            source.value,
+            origin,
+            requests=self.bsky.request_count - requests_before,
+            seen=len(accounts),
+            new=new,
+            cursors=cursors,
+        )
+        print(f"  {len(accounts)} accounts, {new} new")
+        return new
+
+    @staticmethod
+    def _resume(cursors: dict, key: str, fetch) -> list:
+        """
+        Page on from the saved cursor for `key`; save where this call stopped.
+        For curated lists, which change rarely: a run picks up where the last
+        one stopped until the end, then starts over.
+        """
+        accounts = fetch(cursors.get(key))
+        cursors[key] = accounts.cursor
+        return accounts
 
+    @staticmethod
+    def _head_then_resume(
+        cursors: dict, key: str, fetch, limit: int, head: int
+    ) -> list:
+        """
+        For newest-first feeds (search results, followers, follows): read the
+        first `head` accounts (what the static budget reads) every run, so
+        new arrivals are seen first. Only budget beyond that pages on from
+        where the last deeper read stopped (saved under `key`; None once the
+        whole feed was read, which budget.py counts as exhausted).
+        """
+        accounts = fetch(None, min(limit, head))
+        if accounts.cursor is None:
+            # All of it fits in the head (an empty answer may be a failure)
+            if accounts:
+                cursors[key] = None
+        elif limit > head:
+            deep = fetch(cursors.get(key) or accounts.cursor, limit - head)
+            cursors[key] = deep.cursor
+            seen = {a["did"] for a in accounts}
+            accounts.extend(a for a in deep if a["did"] not in seen)
+        return accounts
+
+    def _anchor_neighbours(
+        self,
+        anchor_did: str,
+        limit: int,
+        head: int,
+        cursors: dict,
+        follows: bool = True,
+    ) -> list:
+        followers = self._head_then_resume(
+            cursors,
+            "followers",
+            lambda cursor, n: self.bsky.get_followers(
+                anchor_did, limit=n, cursor=cursor
+            ),
+            limit=limit,
+            head=head,
+        )
+        print(f"  Found {len(followers)} followers")
+        if not follows:
+            return followers
+        following = self._head_then_resume(
+            cursors,
+            "follows",
+            lambda cursor, n: self.bsky.get_following(
+                anchor_did, limit=n, cursor=cursor
+            ),
+            limit=limit,
+            head=head,
+        )
+        print(f"  Found {len(following)} following")
+        return followers + following
+
+    def _anchor_interactors(self, anchor_did: str, requests: int) -> list:
+        """
+        Accounts that liked, reposted or replied to the anchor's recent
+        posts, with their weighted interaction count as "score", best first.
+        Fetches run concurrently within the anchor's request budget.
+        """
+        cfg = settings.interactions
+        posts = self.bsky.fetch_engaged_posts(anchor_did, limit=cfg.posts_per_anchor)
+        plan = plan_interaction_requests(posts, requests - 1)
+        fetchers = {
+            "like": lambda post, pages: self.bsky.get_likers(
+                post["uri"], post["cid"], max_pages=pages
+            ),
+            "repost": lambda post, pages: self.bsky.get_reposters(
+                post["uri"], post["cid"], max_pages=pages
+            ),
+            "reply": lambda post, pages: self.bsky.get_repliers(post["uri"]),
+        }
+        weights = {
+            "like": cfg.like_weight,
+            "repost": cfg.repost_weight,
+            "reply": cfg.reply_weight,
+        }
+
+        scores: Counter = Counter()
+        handles = {}
+        with ThreadPoolExecutor(max_workers=cfg.workers) as pool:
+            futures = {
+                pool.submit(fetchers[kind], post, pages): kind
+                for kind, post, pages in plan
+            }
+            for future in as_completed(futures):
+                for actor in future.result():
+                    if actor["did"] == anchor_did:
+                        continue
+                    scores[actor["did"]] += weights[futures[future]]
+                    handles[actor["did"]] = actor["handle"]
+
+        ranked = [
+            {"did": did, "handle": handles[did], "score": score}
+            for did, score in scores.most_common()
+            if score >= cfg.min_score
+        ][: cfg.max_candidates_per_anchor]
+        print(
+            f"  {len(posts)} posts, {len(plan)} interaction fetches, "
+            f"{len(scores)} interacting accounts, {len(ranked)} kept"
+        )
+        return ranked
+
+    def _list_members(self, uri: str, limit: int, cursors: dict) -> list:
+        ref = parse_list_ref(uri)
+        list_uri = uri
+        if ref.is_starter_pack:
+            list_uri = self.bsky.get_starter_pack_list(uri)
+            if list_uri is None:
+                return []
+        return self._resume(
+            cursors,
+            "list",
+            lambda cursor: self.bsky.get_list_members(
+                list_uri, limit=limit, cursor=cursor
+            ),
+        )
+
+    def _resolve_lists(self, refs) -> dict:
+        """Configured list refs -> at:// URI with the owner's DID (None if unusable)."""
+        parsed = {}
+        for ref in refs:
+            try:
+                parsed[ref] = parse_list_ref(ref)
+            except ValueError as e:
+                print(f"  {e}")
+                parsed[ref] = None
+        owners = {
+            r.actor for r in parsed.values() if r and not r.actor.startswith("did:")
+        }
+        dids = self.identities.resolve(owners, self.bsky.get_profiles) if owners else {}
+        resolved = {}
+        for ref, r in parsed.items():
+            did = r and (r.actor if r.actor.startswith("did:") else dids.get(r.actor))
+            resolved[ref] = r.uri(did) if did else None
+        return resolved
+
+    @timed_stage("local_discover")
+    def run_local_discovery(self, query: str) -> int:
+        """
+        Tag already-collected candidates whose bio or posts match an FTS5
+        query with the local_search source. No network calls.
+        """
+        print(f"[*] Local discovery: {query}")
+        dids = matching_dids(self.db, query)
+        tagged = 0
+        for cand in self.db.query(DbCandidate).filter(DbCandidate.did.in_(dids)):
+            if DiscoverySource.LOCAL_SEARCH.value not in (cand.discovery_sources or []):
+                cand.discovery_sources = (cand.discovery_sources or []) + [
+                    DiscoverySource.LOCAL_SEARCH.value
+                ]
+                tagged += 1
         self.db.commit()
-        print(f"\n[*] Discovery complete. Added {new_count} new candidates.")
+        print(f"[*] {len(dids)} candidates match, {tagged} newly tagged.")
+        return tagged
 
-    def _add_candidate(self, did: str, handle: str, source: DiscoverySource) -> bool:
+    def _keyword_gate(self) -> Optional[set]:
+        """Dids passing the configured keyword gate, or None if it is off."""
+        query = any_of(settings.keyword_gate.terms)
+        if not query:
+            return None
+        return matching_dids(self.db, query)
+
+    def _add_candidate(
+        self,
+        did: str,
+        handle: str,
+        source: DiscoverySource,
+        origin: Optional[str] = None,
+    ) -> bool:
         exists = self.db.query(DbCandidate).filter_by(did=did).first()
         if not exists:
-            cand = DbCandidate(did=did, handle=handle, discovery_sources=[source.value])
+            cand = DbCandidate(
+                did=did,
+                handle=handle,
+                discovery_sources=[source.value],
+                discovered_via=origin,
+            )
             self.db.add(cand)
+            self.identities.observe(did, handle)
+            metrics.inc("rows_written_total", table="candidates")
             return True
         else:
+            # Search and graph results carry the current handle
+            self.identities.observe(did, handle)
             # Update discovery sources if this is a new source
             if source.value not in exists.discovery_sources:
                 exists.discovery_sources = exists.discovery_sources + [source.value]
                 self.db.add(exists)
         return False
 
-    def run_fetch(self, force: bool = False):
-        """Fetch profiles and posts for candidates who need it."""
+    @timed_stage("fetch")
+    def run_fetch(self, force: bool = False, retry_failed: bool = False):
+        """
+        Fetch profiles and posts for candidates who need it. Accounts that
+        are gone or still backing off after a failure are skipped, unless
+        `retry_failed` (see failures.py).
+        """
         print("[*] Starting Fetch...")
         candidates = self.db.query(DbCandidate).all()
+        blocked = {} if retry_failed else blocked_dids(self.db)
+        if blocked:
+            print(f"   Skipping {len(blocked)} accounts that failed before")
+        progress = self._reporter("fetch", len(candidates))
 
+        failed = Counter()
         for cand in candidates:
-            # 1. Profile Fetch
-            # Simple TTL check: if no profile OR profile is old
-            need_profile = False
-            if not cand.profile:
-                need_profile = True
-            elif (
-                    force
-                    or (datetime.utcnow() - cand.profile.fetched_at)
-                    > settings.min_interval_profile_refresh
-            ):
-                need_profile = True
-
-            if need_profile:
-                p_data = self.bsky.fetch_profile(cand.did)
-                if p_data:
-                    if not cand.profile:
-                        cand.profile = DbProfile(did=cand.did)
-                    cand.profile.handle = p_data["handle"]
-                    cand.profile.display_name = p_data["display_name"]
-                    cand.profile.description = p_data["description"]
-                    cand.profile.avatar_url = p_data["avatar_url"]
-                    cand.profile.fetched_at = datetime.utcnow()
-                    self.db.add(cand.profile)
-                    print(f"   Fetched profile: {cand.handle}")
-
-            # 2. Posts Fetch
-            # Similar TTL logic could apply, for MVP we fetch if empty
-            if not cand.posts or force:
-                posts_data = self.bsky.fetch_recent_posts(
-                    cand.did, limit=settings.fetch_posts_limit
-                )
-                # Clear old posts for simplicity in MVP (or use upsert logic for robustness)
-                self.db.query(DbPost).filter_by(author_did=cand.did).delete()
-
-                for p in posts_data:
-                    db_post = DbPost(
-                        uri=p["uri"],
-                        cid=p["cid"],
-                        author_did=cand.did,
-                        created_at=p["created_at"],
-                        text=p["text"],
-                        is_repost=p["is_repost"],
-                    )
-                    self.db.add(db_post)
-                print(f"   Fetched {len(posts_data)} posts: {cand.handle}")
+            self._checkpoint("fetch")
+            kind = blocked.get(cand.did)
+            if kind is not None:
+                metrics.inc("fetch_skipped_total", kind=kind)
+                progress.advance(message=cand.handle)
+                continue
+            try:
+                fetched = self._fetch_candidate(cand, force)
+            except FetchFailed as e:
+                record_failure(self.db, e)
+                failed[e.kind] += 1
+                print(f"   Fetch failed ({e.kind}) for {cand.handle}: {e.reason}")
+            else:
+                if fetched:
+                    clear_failure(self.db, cand.did)
 
             self.db.commit()
+            progress.advance(message=cand.handle)
+
+        progress.finish()
+        if failed:
+            print(
+                f"[*] {failed['permanent']} accounts gone, "
+                f"{failed['transient']} to retry later"
+            )
+
+    def _fetch_candidate(self, cand: DbCandidate, force: bool) -> bool:
+        """Fetch what one candidate needs. True if anything was requested."""
+        # 1. Profile Fetch
+        # Simple TTL check: if no profile OR profile is old
+        need_profile = False
+        if not cand.profile:
+            need_profile = True
+        elif (
+                force
+                or (datetime.utcnow() - cand.profile.fetched_at)
+                > settings.min_interval_profile_refresh
+        ):
+            need_profile = True
+
+        if need_profile:
+            p_data = self.bsky.fetch_profile(cand.did)
+            if p_data:
+                if not cand.profile:
+                    cand.profile = DbProfile(did=cand.did)
+                cand.profile.handle = p_data["handle"]
+                cand.profile.display_name = p_data["display_name"]
+                cand.profile.description = p_data["description"]
+                cand.profile.avatar_url = p_data["avatar_url"]
+                cand.profile.fetched_at = datetime.utcnow()
+                self.db.add(cand.profile)
+                self.identities.observe(cand.did, p_data["handle"])
+                metrics.inc("rows_written_total", table="profiles")
+                print(f"   Fetched profile: {cand.handle}")
+        else:
+            metrics.inc("cache_hits_total", stage="fetch_profile")
+
+        # 2. Posts Fetch
+        # Fetched once (or on --force). `compact` may drop a candidate's
+        # posts later, which must not trigger a refetch
+        need_posts = force or (cand.posts_fetched_at is None and not cand.posts)
+        if need_posts:
+            posts_data = self.bsky.fetch_recent_posts(
+                cand.did, limit=settings.fetch_posts_limit
+            )
+            # Clear old posts for simplicity in MVP (or use upsert logic for robustness)
+            self.db.query(DbPost).filter_by(author_did=cand.did).delete()
+
+            for p in posts_data:
+                db_post = DbPost(
+                    uri=p["uri"],
+                    cid=p["cid"],
+                    author_did=cand.did,
+                    created_at=p["created_at"],
+                    text=p["text"],
+                    is_repost=p["is_repost"],
+                )
+                self.db.add(db_post)
+            if posts_data:
+                cand.posts_fetched_at = datetime.utcnow()
+            metrics.inc("rows_written_total", len(posts_data), table="posts")
+            print(f"   Fetched {len(posts_data)} posts: {cand.handle}")
+        else:
+            metrics.inc("cache_hits_total", stage="fetch_posts")
+        return need_profile or need_posts
+
+    @timed_stage("resolve")
+    def run_resolve(self, force: bool = False):
+        """Re-check candidate handles older than the identity TTL, 25 per request."""
+        print("[*] Refreshing handles...")
+        result = self.identities.refresh(self.bsky.get_profiles, force=force)
+        print(
+            f"[*] Checked {result['checked']} candidates, "
+            f"{result['changed']} changed handle."
+        )
+
+    @timed_stage("publish")
+    def run_publish(self, dry_run: bool = False, reconcile: bool = False):
+        """Sync the published list with the matches via batched applyWrites."""
+        from .publish import ListPublisher
+
+        print("[*] Publishing matches to a Bluesky list...")
+        result = ListPublisher(self.db, self.bsky, self.identities).publish(
+            dry_run=dry_run, reconcile=reconcile
+        )
+        if result.reconciled:
+            print("   Rebuilt list membership from the repo")
+        print(
+            f"   {result.list_uri}: {result.to_add} to add, "
+            f"{result.to_remove} to remove"
+        )
+        if dry_run:
+            return
+        print(
+            f"[*] Added {result.added}, removed {result.removed} in "
+            f"{result.batches} applyWrites batches ({result.points} write points)"
+        )
+        left = result.to_add + result.to_remove - result.added - result.removed
+        if result.stopped == "budget":
+            print(f"   Write budget used up; {left} writes left for the next run")
+        elif result.stopped == "rate_limited":
+            print(f"   Rate limited by the PDS; {left} writes left for the next run")
+
+    @timed_stage("relabel")
+    def run_relabel(self, dry_run: bool = False):
+        """Re-derive the current topic's labels from the scores (no LLM calls)."""
+        from .thresholds import relabel
+
+        topic = settings.current_topic
+        t = settings.thresholds_for(topic)
+        print(
+            f"[*] Relabeling {topic.name} evaluations "
+            f"(match >= {t.match_overall:.2f}, maybe >= {t.maybe_overall:.2f})..."
+        )
+        moves = relabel(self.db, t, dry_run=dry_run)
+        for (old, new), n in sorted(moves.items(), key=lambda m: -m[1]):
+            print(f"   {old or '(none)'} -> {new}: {n}")
+            if not dry_run:
+                metrics.inc("relabeled_total", n, old=old or "", new=new)
+        total = sum(moves.values())
+        if dry_run:
+            print(f"[*] Would relabel {total} evaluations")
+        else:
+            print(f"[*] Relabeled {total} evaluations")
+
+    @timed_stage("dedupe")
+    def run_dedupe(self, rebuild: bool = False):
+        """Update MinHash signatures and flag spam/bot accounts."""
+        from .dedupe import DuplicateDetector
+
+        print("[*] Starting Near-Duplicate Detection...")
+        detector = DuplicateDetector(self.db, settings.dedupe)
+        if rebuild:
+            detector.rebuild()
+        progress = self._reporter("dedupe", None)
+        stats = detector.update()
+        progress.advance(stats["signed"])
+        progress.finish()
+        metrics.inc("rows_written_total", stats["signed"], table="post_signatures")
+        metrics.inc("spam_accounts_flagged_total", stats["accounts_flagged"])
+        print(
+            f"[*] Dedupe complete. Signed {stats['signed']} posts, "
+            f"re-checked {stats['accounts_checked']} accounts "
+            f"({stats['stale']} with deleted posts), "
+            f"{stats['accounts_flagged']} flagged."
+        )
+
+    @timed_stage("compact")
+    def run_compact(self, vacuum: bool = True):
+        """Apply post retention, compress old rows and VACUUM, reporting the effect."""
+        from .storage import (
+            apply_retention,
+            describe_change,
+            measure,
+            recompress_posts,
+            vacuum as vacuum_db,
+        )
+
+        print("[*] Starting Compaction...")
+        before = measure(self.db)
+        print(f"   Before: {before.describe()}")
+
+        dropped = apply_retention(
+            self.db, settings.storage, [t.name for t in settings.topics]
+        )
+        for rule, n in dropped.items():
+            print(f"   Dropped {n} posts ({rule})")
+            metrics.inc("rows_deleted_total", n, table="posts", reason=rule)
+        # Their signatures and LSH buckets went with them (a delete trigger)
+
+        if settings.storage.compress_posts:
+            n = recompress_posts(self.db)
+            print(f"   Compressed {n} posts stored as plain text")
+            metrics.inc("rows_written_total", n, table="posts")
+
+        if vacuum:
+            print(f"   Vacuum: {vacuum_db(self.db)}")
+
+        after = measure(self.db)
+        print(f"   After:  {after.describe()}")
+        change = describe_change(before, after)
+        if change:
+            print(f"[*] Compaction complete: {change}")
+
+    @timed_stage("embed")
+    def run_embedding(self):
+        """Hash bio + posts of every fetched candidate into the local vector store."""
+        from .similarity import VectorStore
+
+        print("[*] Starting Embedding...")
+        count = self.db.query(DbProfile).filter(not_gone(DbProfile.did)).count()
+
+        profiles = (
+            self.db.query(DbProfile.did, DbProfile.description)
+            .filter(not_gone(DbProfile.did))
+            .order_by(DbProfile.did)
+            .yield_per(1000)
+        )
+        posts = (
+            self.db.query(DbPost.author_did, DbPost.text)
+            .order_by(DbPost.author_did)
+            .yield_per(1000)
+        )
+        post_groups = groupby(posts, key=lambda row: row[0])
+
+        progress = self._reporter("embed", count)
+
+        def docs():
+            # Merge-join the two did-ordered streams
+            pending = next(post_groups, None)
+            for did, description in profiles:
+                self._checkpoint("embed")
+                progress.advance()
+                while pending is not None and pending[0] < did:
+                    pending = next(post_groups, None)
+                texts = [description or ""]
+                if pending is not None and pending[0] == did:
+                    texts.extend(text or "" for _, text in pending[1])
+                    pending = next(post_groups, None)
+                yield did, "\n".join(texts)
+
+        store = VectorStore(settings.vectors_path)
+        n = store.build(docs(), count, settings.similarity.dimensions)
+        metrics.inc("rows_written_total", n, table="vectors")
+        progress.finish()
+        print(f"[*] Embedding complete. Wrote {n} vectors to {settings.vectors_path}")
+
+    def _similarity_ranking(self, topic: TopicProfile):
+        """{did: similarity to `topic`'s matches}, or None if not usable yet."""
+        if not settings.similarity.enabled:
+            return None
+        from .similarity import VectorStore, rank_candidates
+
+        match_dids = [
+            did
+            for (did,) in self.db.query(DbLlmEval.did).filter(
+                in_topic(topic.name), DbLlmEval.label == "match"
+            )
+        ]
+        return rank_candidates(
+            VectorStore(settings.vectors_path),
+            match_dids,
+            min_matches=settings.similarity.min_matches,
+            k_neighbors=settings.similarity.k_neighbors,
+        )
+
+    @staticmethod
+    def _eval_record(cand: DbCandidate, topic: TopicProfile) -> DbLlmEval:
+        if topic.name not in cand.llm_evals:
+            cand.llm_evals[topic.name] = DbLlmEval(did=cand.did, topic=topic.name)
+        return cand.llm_evals[topic.name]
+
+    def _auto_reject(self, cand: DbCandidate, topic: TopicProfile, similarity: float):
+        eval_rec = self._eval_record(cand, topic)
+        eval_rec.model = SIMILARITY_MODEL
+        eval_rec.run_at = datetime.utcnow()
+        eval_rec.score_location = 0.0
+        eval_rec.score_tech = 0.0
+        eval_rec.score_overall = 0.0
+        eval_rec.label = "no"
+        eval_rec.rationale = (
+            f"Auto-rejected: similarity to confirmed matches {similarity:.3f} "
+            f"< {settings.similarity.reject_below:.3f}"
+        )
+        eval_rec.evidence = []
+        eval_rec.uncertainties = []
+        self.db.add(eval_rec)
+        metrics.inc("rows_written_total", table="llm_evals")
+        metrics.inc("similarity_auto_rejects_total")
 
-    def run_evaluation(self, force: bool = False):
-        print("[*] Starting LLM Evaluation...")
+    @staticmethod
+    def _over_budget(
+        spent: "LlmUsage",
+        attempts: int,
+        max_tokens: Optional[int],
+        max_cost: Optional[float],
+    ) -> Optional[str]:
+        """
+        "tokens"/"cost" if the next evaluation, at this run's average so far,
+        would cross that budget.
+        """
+        if not attempts:
+            return None
+        ahead = (attempts + 1) / attempts
+        if max_tokens is not None and spent.tokens * ahead > max_tokens:
+            return "tokens"
+        if max_cost is not None and spent.cost_usd * ahead > max_cost:
+            return "cost"
+        return None
+
+    @timed_stage("evaluate")
+    def run_evaluation(
+        self,
+        force: bool = False,
+        max_tokens: Optional[int] = None,
+        max_cost: Optional[float] = None,
+    ):
+        from .dedupe import flagged_dids
+        from .llm import LlmUsage, evaluate_topics, get_client
+
+        topics = settings.evaluate_topics
+        names = ", ".join(t.name for t in topics)
+        print(f"[*] Starting LLM Evaluation ({names})...")
+        get_client()  # fail once, up front, if no API key is configured
+        if max_tokens is None:
+            max_tokens = settings.llm.max_run_tokens
+        if max_cost is None:
+            max_cost = settings.llm.max_run_cost
+        run = DbEvaluationRun(max_tokens=max_tokens, max_cost=max_cost, evaluated=0)
+        self.db.add(run)
+        self.db.commit()
+        spent = LlmUsage()
+        attempts = 0
         # Get candidates with profile + posts but no (or stale) eval
-        candidates = self.db.query(DbCandidate).join(DbProfile).all()
+        candidates = (
+            self.db.query(DbCandidate)
+            .join(DbProfile)
+            .filter(not_gone(DbCandidate.did))
+            .options(selectinload(DbCandidate.llm_evals))
+            .all()
+        )
 
-        for cand in candidates:
-            if not cand.profile or not cand.posts:
-                continue
+        # Matches of one topic say nothing about another, so ranking and
+        # auto-rejection only apply when a single topic is evaluated
+        ranking = self._similarity_ranking(topics[0]) if len(topics) == 1 else None
+        if ranking is not None:
+            # Most promising first; candidates without a vector go last
+            candidates.sort(key=lambda c: -ranking.get(c.did, -1.0))
+            print(f"   Ranked {len(ranking)} candidates by similarity to matches")
 
-            if cand.llm_eval and not force:
-                continue
+        spam = flagged_dids(self.db) if settings.dedupe.enabled else set()
+        gate = self._keyword_gate()
+        if gate is not None:
+            print(f"   Keyword gate: {len(gate)} candidates mention a gate term")
+        progress = self._reporter("evaluate", len(candidates))
 
-            print(f"   Evaluating: {cand.handle}")
+        rejected = 0
+        try:
+            for position, cand in enumerate(candidates):
+                self._checkpoint("evaluate")
+                progress.advance(message=cand.handle)
+                if not cand.profile or not cand.posts:
+                    continue
 
-            # Serialize for LLM
-            p_data = {"handle": cand.handle, "description": cand.profile.description}
-            posts_data = [
-                {"text": p.text, "created_at": str(p.created_at)} for p in cand.posts
-            ]
+                skip = None
+                if cand.did in spam:
+                    skip = "spam"
+                elif gate is not None and cand.did not in gate:
+                    skip = "keyword_gate"
+                # Skipped candidates get no first evaluation, but may be re-scored
+                evaluated = cand.llm_evals
+                due = [
+                    t
+                    for t in topics
+                    if (force if t.name in evaluated else skip is None)
+                ]
+                if not due:
+                    if skip and any(t.name not in evaluated for t in topics):
+                        metrics.inc("evaluations_skipped_total", reason=skip)
+                    else:
+                        metrics.inc("cache_hits_total", stage="evaluate")
+                    continue
 
-            try:
-                result = evaluate_candidate(p_data, posts_data)
-
-                # Upsert Eval
-                if not cand.llm_eval:
-                    cand.llm_eval = DbLlmEval(did=cand.did)
-
-                eval_rec = cand.llm_eval
-                eval_rec.model = settings.openai_model
-                eval_rec.run_at = datetime.utcnow()
-                eval_rec.score_location = result.score_location
-                eval_rec.score_tech = result.score_tech
-                eval_rec.score_overall = result.score_overall
-                eval_rec.label = result.label.value
-                eval_rec.rationale = result.rationale
-                eval_rec.evidence = result.evidence
-                eval_rec.uncertainties = result.uncertainties
-
-                self.db.add(eval_rec)
-                self.db.commit()
-            except Exception as e:
-                print(f"   [!] Eval failed for {cand.handle}: {e}")
+                similarity = ranking.get(cand.did) if ranking is not None else None
+                if (
+                    similarity is not None
+                    and due[0].name not in evaluated
+                    and similarity < settings.similarity.reject_below
+                ):
+                    self._auto_reject(cand, due[0], similarity)
+                    rejected += 1
+                    continue
+
+                run.stop_reason = self._over_budget(
+                    spent, attempts, max_tokens, max_cost
+                )
+                if run.stop_reason:
+                    # Everything not evaluated stays queued for the next run
+                    print(
+                        f"   [!] {run.stop_reason.capitalize()} budget reached; "
+                        f"{len(candidates) - position} candidates left for the next run"
+                    )
+                    break
+
+                print(f"   Evaluating: {cand.handle}")
+
+                # Serialize for LLM
+                p_data = {
+                    "handle": cand.handle,
+                    "description": cand.profile.description,
+                }
+                posts_data = [
+                    {"text": p.text, "created_at": str(p.created_at)}
+                    for p in cand.posts
+                ]
+
+                attempts += 1
+                # All due topics in one request, or one request per topic
+                batches = [due] if settings.llm.multi_topic else [[t] for t in due]
+                for batch in batches:
+                    usage = LlmUsage(parent=spent)
+                    try:
+                        results = evaluate_topics(p_data, posts_data, batch, usage)
+                    except Exception as e:
+                        metrics.inc("evaluations_failed_total")
+                        print(f"   [!] Eval failed for {cand.handle}: {e}")
+                        continue
 
+                    for topic in batch:
+                        result = results[topic.name]
+                        # Upsert Eval; a shared request is charged evenly to its topics
+                        eval_rec = self._eval_record(cand, topic)
+                        eval_rec.model = usage.model or settings.openrouter_model
+                        eval_rec.run_at = datetime.utcnow()
+                        eval_rec.score_location = result.score_location
+                        eval_rec.score_tech = result.score_tech
+                        eval_rec.score_overall = result.score_overall
+                        eval_rec.label = result.label.value
+                        eval_rec.rationale = result.rationale
+                        eval_rec.evidence = result.evidence
+                        eval_rec.uncertainties = result.uncertainties
+                        eval_rec.prompt_tokens = usage.prompt_tokens // len(batch)
+                        eval_rec.completion_tokens = (
+                            usage.completion_tokens // len(batch)
+                        )
+                        eval_rec.cost_usd = usage.cost_usd / len(batch)
+                        run.evaluated += 1
+                        self.db.add(eval_rec)
+                        metrics.inc("rows_written_total", table="llm_evals")
+                        metrics.inc("evaluations_total", label=eval_rec.label)
+                    self.db.commit()
+
+        except BaseException as e:
+            # Keep the bill of a cancelled or crashed run: drop the half-done
+            # candidate, then record what was spent below
+            self.db.rollback()
+            cancelled = isinstance(e, (PipelineCancelled, KeyboardInterrupt))
+            run.stop_reason = "cancelled" if cancelled else "error"
+            raise
+        finally:
+            run.finished_at = datetime.utcnow()
+            run.model = spent.model
+            run.calls = spent.calls
+            run.prompt_tokens = spent.prompt_tokens
+            run.completion_tokens = spent.completion_tokens
+            run.cost_usd = spent.cost_usd
+            self.db.commit()
+        progress.finish()
+        if spent.calls:
+            print(
+                f"   LLM spend: {spent.calls} calls, {spent.tokens:,} tokens, "
+                f"${spent.cost_usd:.4f}"
+            )
+        if spam:
+            print(f"   Skipped up to {len(spam)} accounts flagged as spam/bots")
+        if rejected:
+            print(f"   Auto-rejected {rejected} candidates by local similarity")
+        wasted = metrics.total("llm_wasted_calls_total")
+        if wasted:
+            evaluated = metrics.total("evaluations_total")
+            print(
+                f"   Wasted LLM calls: {wasted:.0f} "
+                f"({1000 * wasted / max(evaluated, 1):.1f} per 1,000 evaluations)"
+            )
+
+    @timed_stage("export")
+    def export_incremental(self, compact: bool = False):
+        """Write a delta of what changed since the last export (JSONL + manifest)."""
+        from .exports import write_delta, write_snapshot
+
+        topic = settings.current_topic
+        directory = settings.export_dir / topic.name
+        threshold = settings.thresholds_for(topic).maybe_overall
+        if compact:
+            result = write_snapshot(self.db, directory, threshold)
+        else:
+            result = write_delta(self.db, directory, threshold)
+
+        if result.kind == "snapshot":
+            metrics.inc("rows_exported_total", result.rows, format="snapshot")
+            print(
+                f"Exported a snapshot of {result.rows} candidates to "
+                f"{directory / result.file}"
+            )
+            return
+        changed = result.upserts + result.removes
+        metrics.inc("rows_exported_total", changed, format="delta")
+        if result.file is None:
+            print(f"No changes since the last export ({result.examined} checked)")
+        else:
+            print(
+                f"Exported {result.upserts} changed and {result.removes} removed "
+                f"candidates to {directory / result.file} "
+                f"({result.examined} checked)"
+            )
+        print(
+            f"   {result.deltas} deltas on top of the snapshot "
+            "(`export --incremental --compact` rolls them up)"
+        )
+
+    @timed_stage("export")
     def export_results(self, format: str = "jsonl"):
         import json
 
+        from .exports import export_row
+
+        topic = settings.current_topic
+        thresholds = settings.thresholds_for(topic)
         results = (
             self.db.query(DbCandidate)
             .join(DbLlmEval)
             .filter(
-                DbLlmEval.score_overall >= settings.scoring_thresholds.maybe_overall
+                in_topic(topic.name),
+                DbLlmEval.score_overall >= thresholds.maybe_overall,
+                not_gone(DbCandidate.did),
             )
+            .options(selectinload(DbCandidate.llm_evals))
             .order_by(DbLlmEval.score_overall.desc())
             .all()
         )
 
         timestamp = datetime.utcnow().strftime("%Y%m%d")
+        # The first topic keeps the file names it always had
+        if topic.name != settings.topics[0].name:
+            timestamp = f"{topic.name}_{timestamp}"
 
         # Prepare data for both formats
-        candidates_data = []
-        for c in results:
-            row = {
-                "handle": c.handle,
-                "did": c.did,
-                "score": c.llm_eval.score_overall,
-                "label": c.llm_eval.label,
-                "location_score": c.llm_eval.score_location,
-                "tech_score": c.llm_eval.score_tech,
-                "bio": c.profile.description if c.profile else "",
-                "rationale": c.llm_eval.rationale,
-                "profile_url": f"https://bsky.app/profile/{c.handle}",
-                "avatar_url": c.profile.avatar_url if c.profile else None,
-                "display_name": c.profile.display_name if c.profile else c.handle,
-                "discovery_sources": c.discovery_sources,
-            }
-            candidates_data.append(row)
+        candidates_data = [export_row(c) for c in results]
+        metrics.inc("rows_exported_total", len(candidates_data), format=format)
 
         if format == "jsonl":
             filename = f"export_{timestamp}.jsonl"
@@ -223,6 +1028,8 @@ class Pipeline:
             templates_dir = Path(__file__).parent / "templates"
             templates_dir.mkdir(exist_ok=True)
 
+            from jinja2 import Environment, FileSystemLoader
+
             env = Environment(loader=FileSystemLoader(str(templates_dir)))
 
             template = env.get_template("export.html")
@@ -231,7 +1038,7 @@ class Pipeline:
                 candidates=candidates_data,
                 total_count=len(candidates_data),
                 export_date=datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
-                thresholds=settings.scoring_thresholds,
+                thresholds=thresholds,
             )
 
             filename = f"export_{timestamp}.html"
@@ -0,0 +1,135 @@
+"""Structured progress events from Pipeline stages, and a coalescing queue
+that lets the Tk GUI consume them (and stdout/log text) on a timer."""
+
+import io
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+
+@dataclass
+class ProgressEvent:
+    stage: str
+    done: int
+    total: Optional[int]
+    rate: float  # items per second since the stage started
+    eta_seconds: Optional[float]
+    message: str = ""
+    finished: bool = False
+
+    def describe(self) -> str:
+        total = f"/{self.total}" if self.total is not None else ""
+        eta = f", ETA {_fmt_seconds(self.eta_seconds)}" if self.eta_seconds else ""
+        state = " (done)" if self.finished else ""
+        return f"{self.stage}: {self.done}{total} @ {self.rate:.1f}/s{eta}{state}"
+
+
+ProgressCallback = Callable[[ProgressEvent], None]
+
+
+class PipelineCancelled(Exception):
+    """Raised inside a stage when the caller asked it to stop."""
+
+
+def _fmt_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+
+class ProgressReporter:
+    """Counts work for one stage and emits throttled ProgressEvents."""
+
+    def __init__(
+        self,
+        stage: str,
+        total: Optional[int],
+        emit: Optional[ProgressCallback],
+        min_interval: float = 0.25,
+    ):
+        self.stage = stage
+        self.total = total
+        self.emit = emit
+        self.min_interval = min_interval
+        self.done = 0
+        self.started = time.monotonic()
+        self._last_emit = 0.0
+
+    def _event(self, message: str, finished: bool) -> ProgressEvent:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        rate = self.done / elapsed
+        eta = None
+        if self.total is not None and rate > 0 and self.done < self.total:
+            eta = (self.total - self.done) / rate
+        return ProgressEvent(
+            self.stage, self.done, self.total, rate, eta, message, finished
+        )
+
+    def advance(self, n: int = 1, message: str = ""):
+        self.done += n
+        if self.emit is None:
+            return
+        now = time.monotonic()
+        if now - self._last_emit >= self.min_interval:
+            self._last_emit = now
+            self.emit(self._event(message, False))
+
+    def finish(self, message: str = ""):
+        if self.emit is not None:
+            self.emit(self._event(message, True))
+
+
+class ProgressQueue:
+    """
+    Thread-safe hand-off from a worker thread to the GUI thread.
+    Progress events coalesce to the latest one per stage; log text is kept
+    in a bounded deque, so a consumer that falls behind loses old lines
+    rather than growing memory.
+    """
+
+    def __init__(self, max_log_chunks: int = 5000):
+        self._lock = threading.Lock()
+        self._events: Dict[str, ProgressEvent] = {}
+        self._log: Deque[str] = deque(maxlen=max_log_chunks)
+        self._dropped = 0
+
+    def put_event(self, event: ProgressEvent):
+        with self._lock:
+            self._events[event.stage] = event
+
+    def put_log(self, text: str):
+        if not text:
+            return
+        with self._lock:
+            if len(self._log) == self._log.maxlen:
+                self._dropped += 1
+            self._log.append(text)
+
+    def drain(self) -> Tuple[List[ProgressEvent], str]:
+        with self._lock:
+            events = list(self._events.values())
+            self._events.clear()
+            chunks = list(self._log)
+            self._log.clear()
+            dropped, self._dropped = self._dropped, 0
+        text = "".join(chunks)
+        if dropped:
+            text = f"[... {dropped} older output chunks dropped ...]\n" + text
+        return events, text
+
+
+class QueueWriter(io.TextIOBase):
+    """File-like stdout/stderr replacement that feeds a ProgressQueue."""
+
+    def __init__(self, queue: ProgressQueue):
+        self.queue = queue
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        self.queue.put_log(s)
+        return len(s)
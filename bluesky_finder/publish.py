@@ -0,0 +1,264 @@
+"""Keep a Bluesky list in sync with the matches (`publish-list`).
+
+The list_members table is our view of the list. Each run diffs it against
+the current matches and writes only the difference: listitem creates and
+deletes, up to APPLY_WRITES_BATCH per applyWrites commit. The writes stay
+within what is left of the PDS write budget; list_write_batches logs the
+points spent. Anything left over waits for the next run.
+
+Rows are marked adding/removing before their commit and settled after it.
+A commit the PDS rejected outright (e.g. 429) is rolled back locally, since
+applyWrites is atomic. A run that dies without an answer leaves the marks
+behind, and the next run first rebuilds the table from the repo's own
+listitem records (listRecords). Running it again with nothing changed
+writes nothing.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import (
+    DbListMember,
+    DbListWriteBatch,
+    DbLlmEval,
+    in_topic,
+    not_gone,
+)
+from .identity import IdentityCache
+from .metrics import metrics
+from .sources import LIST_COLLECTION, parse_list_ref
+
+if TYPE_CHECKING:
+    from .at_client import BskyClient
+
+CREATE_POINTS = 3
+DELETE_POINTS = 1
+
+# (did, rkey) of a listitem to delete; did is None for duplicates found in
+# the repo that have no row of their own
+Removal = Tuple[Optional[str], str]
+
+
+@dataclass
+class PublishResult:
+    list_uri: str
+    to_add: int = 0
+    to_remove: int = 0
+    added: int = 0
+    removed: int = 0
+    batches: int = 0
+    points: int = 0
+    reconciled: bool = False
+    # "budget" or "rate_limited" if writes were left for the next run
+    stopped: Optional[str] = None
+
+
+def wanted_dids(db: Session, labels: List[str]) -> Set[str]:
+    """
+    DIDs whose current-topic evaluation carries one of `labels`. Gone
+    accounts (see failures.py) are left out, so publishing drops them.
+    """
+    return {
+        did
+        for (did,) in db.query(DbLlmEval.did).filter(
+            in_topic(), DbLlmEval.label.in_(labels), not_gone(DbLlmEval.did)
+        )
+    }
+
+
+def points_left(db: Session, now: Optional[datetime] = None) -> int:
+    """Write points still free this hour and this day."""
+    now = now or datetime.utcnow()
+
+    def spent_since(since: datetime) -> int:
+        return (
+            db.query(func.coalesce(func.sum(DbListWriteBatch.points), 0))
+            .filter(DbListWriteBatch.at >= since)
+            .scalar()
+        )
+
+    cfg = settings.publish
+    hour = cfg.points_per_hour - spent_since(now - timedelta(hours=1))
+    day = cfg.points_per_day - spent_since(now - timedelta(days=1))
+    return max(0, min(hour, day))
+
+
+def list_name() -> str:
+    """Name of the current topic's list (publish.list_name for the first)."""
+    topic = settings.current_topic
+    if topic.list_name:
+        return topic.list_name
+    if topic.name == settings.topics[0].name:
+        return settings.publish.list_name
+    return topic.title
+
+
+class ListPublisher:
+    def __init__(self, db: Session, bsky: "BskyClient", identities: IdentityCache):
+        self.db = db
+        self.bsky = bsky
+        self.identities = identities
+
+    def resolve_list(self, create: bool = True) -> Optional[str]:
+        """URI of the list to publish to; the named list is made if missing."""
+        cfg = settings.publish
+        name = list_name()
+        own = self.bsky.own_did()
+        if cfg.list_uri:
+            ref = parse_list_ref(cfg.list_uri)
+            if ref.collection != LIST_COLLECTION:
+                raise ValueError("publish.list_uri must be a list, not a starter pack")
+            owner = ref.actor
+            if not owner.startswith("did:"):
+                # A bsky.app link names the owner by handle
+                found = self.identities.resolve([owner], self.bsky.get_profiles)
+                owner = found.get(owner)
+            if owner != own:
+                raise ValueError("publish.list_uri must be one of your own lists")
+            return ref.uri(own)
+        for lst in self.bsky.get_own_lists():
+            if lst["name"] == name:
+                return lst["uri"]
+        if not create:
+            return None
+        uri = self.bsky.create_list(name, cfg.list_description)
+        print(f"   Created list {name!r}: {uri}")
+        return uri
+
+    def _rows(self, list_uri: str):
+        return self.db.query(DbListMember).filter(DbListMember.list_uri == list_uri)
+
+    def reconcile(self, list_uri: str) -> List[Removal]:
+        """
+        Rebuild the table from the listitems actually in the repo. Returns
+        duplicate listitems (same account twice) to delete.
+        """
+        self._rows(list_uri).delete(synchronize_session=False)
+        duplicates: List[Removal] = []
+        seen = set()
+        for item in self.bsky.get_list_items(list_uri):
+            if item["did"] in seen:
+                duplicates.append((None, item["rkey"]))
+                continue
+            seen.add(item["did"])
+            self.db.add(
+                DbListMember(list_uri=list_uri, did=item["did"], rkey=item["rkey"])
+            )
+        self.db.commit()
+        return duplicates
+
+    def plan(self, list_uri: str, wanted: Set[str]) -> Tuple[List[str], List[Removal]]:
+        present = {row.did: row.rkey for row in self._rows(list_uri)}
+        add = sorted(wanted - present.keys())
+        remove = [(did, present[did]) for did in sorted(present.keys() - wanted)]
+        return add, remove
+
+    def publish(self, dry_run: bool = False, reconcile: bool = False) -> PublishResult:
+        from .at_client import APPLY_WRITES_BATCH
+
+        wanted = wanted_dids(self.db, settings.publish.labels)
+        list_uri = self.resolve_list(create=not dry_run)
+        if list_uri is None:
+            new_list = f"(new list {list_name()!r})"
+            return PublishResult(new_list, to_add=len(wanted))
+        result = PublishResult(list_uri)
+        rows = self._rows(list_uri)
+        duplicates: List[Removal] = []
+        if (
+            reconcile
+            or rows.first() is None
+            or rows.filter(DbListMember.state != "present").first() is not None
+        ):
+            duplicates = self.reconcile(list_uri)
+            result.reconciled = True
+
+        add, remove = self.plan(list_uri, wanted)
+        remove += duplicates
+        result.to_add, result.to_remove = len(add), len(remove)
+        if dry_run:
+            return result
+
+        budget = points_left(self.db)
+        while add or remove:
+            # Fill a commit with creates first, then deletes, within budget
+            batch_add = add[: min(APPLY_WRITES_BATCH, budget // CREATE_POINTS)]
+            room = APPLY_WRITES_BATCH - len(batch_add)
+            spare = budget - len(batch_add) * CREATE_POINTS
+            batch_remove = remove[: min(room, spare // DELETE_POINTS)]
+            if not batch_add and not batch_remove:
+                result.stopped = "budget"
+                break
+            if not self._commit(list_uri, batch_add, batch_remove, result):
+                result.stopped = "rate_limited"
+                break
+            add = add[len(batch_add):]
+            remove = remove[len(batch_remove):]
+            budget -= len(batch_add) * CREATE_POINTS + len(batch_remove) * DELETE_POINTS
+        return result
+
+    def _commit(
+        self,
+        list_uri: str,
+        add: List[str],
+        remove: List[Removal],
+        result: PublishResult,
+    ) -> bool:
+        """One applyWrites commit. False if the PDS rate-limited it."""
+        removing = {did for did, _ in remove if did}
+        for did in add:
+            self.db.add(DbListMember(list_uri=list_uri, did=did, state="adding"))
+        if removing:
+            self._rows(list_uri).filter(DbListMember.did.in_(removing)).update(
+                {"state": "removing"}, synchronize_session=False
+            )
+        self.db.commit()
+
+        try:
+            rkeys = self.bsky.apply_list_writes(
+                list_uri, add, [rkey for _, rkey in remove]
+            )
+        except Exception as e:
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            if status is None or status >= 500:
+                # It may or may not have been applied; the marks stay and
+                # the next run reconciles against the repo
+                raise
+            # Rejected, so nothing was written (the commit is atomic)
+            self._rows(list_uri).filter(DbListMember.state == "adding").delete(
+                synchronize_session=False
+            )
+            self._rows(list_uri).filter(DbListMember.state == "removing").update(
+                {"state": "present"}, synchronize_session=False
+            )
+            self.db.commit()
+            if status == 429:
+                return False
+            raise
+
+        for did, rkey in zip(add, rkeys):
+            row = self.db.get(DbListMember, (list_uri, did))
+            row.rkey, row.state = rkey, "present"
+        if removing:
+            self._rows(list_uri).filter(DbListMember.did.in_(removing)).delete(
+                synchronize_session=False
+            )
+        points = len(add) * CREATE_POINTS + len(remove) * DELETE_POINTS
+        self.db.add(
+            DbListWriteBatch(
+                list_uri=list_uri, creates=len(add), deletes=len(remove), points=points
+            )
+        )
+        self.db.commit()
+
+        metrics.inc("list_writes_total", len(add), op="create")
+        metrics.inc("list_writes_total", len(remove), op="delete")
+        result.added += len(add)
+        result.removed += len(remove)
+        result.batches += 1
+        result.points += points
+        return True
@@ -0,0 +1,349 @@
+"""Read-only queries: paged candidate and evaluation listings for the results
+browser and the HTTP API, and full-text search over bios and posts.
+
+Pages use keyset pagination on (score, did), or (run_at, did) for
+evaluations: each page starts strictly after (or before) the boundary row of
+the previous one, so fetching page 500 costs the same index range scan as
+page 1 and nothing ever loads the whole table.
+
+Search goes through the FTS5 indexes `profiles_fts` / `posts_fts` (see
+database._FTS_TABLES) and takes FTS5 query syntax: `wmata OR arlington`,
+`"capital bikeshare"`, `bike*`, `description:dc`. Post searches first index
+compressed posts still queued by the triggers (the one write they do), and
+build their snippets from the decoded post, since the post index may keep no
+text of its own.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text, tuple_
+from sqlalchemy.orm import Session
+
+from .codec import decompress_text
+from .database import (
+    DbCandidate,
+    DbLlmEval,
+    DbPost,
+    DbProfile,
+    DbSpamFlag,
+    in_topic,
+    index_pending_fts,
+    not_gone,
+)
+
+PAGE_SIZE = 200
+
+SORT_COLUMNS = {
+    "overall": DbLlmEval.score_overall,
+    "tech": DbLlmEval.score_tech,
+    "location": DbLlmEval.score_location,
+}
+
+# (score of the sort column, did) of a boundary row
+Cursor = Tuple[float, str]
+
+
+@dataclass
+class CandidateRow:
+    did: str
+    handle: Optional[str]
+    display_name: Optional[str]
+    label: Optional[str]
+    score_overall: float
+    score_tech: float
+    score_location: float
+
+    def cursor(self, sort: str) -> Cursor:
+        return (getattr(self, f"score_{sort}"), self.did)
+
+
+def page_candidates(
+    db: Session,
+    sort: str = "overall",
+    descending: bool = True,
+    label: Optional[str] = None,
+    after: Optional[Cursor] = None,
+    before: Optional[Cursor] = None,
+    limit: int = PAGE_SIZE,
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+) -> List[CandidateRow]:
+    """
+    One page of the current topic's evaluated candidates in (score, did) order.
+    Pass the last row's cursor as `after` for the next page, or the first
+    row's cursor as `before` for the previous one. min_score/max_score bound
+    the sort column, so they narrow the same index range. Gone accounts (see
+    failures.py) are left out.
+    """
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Unknown sort column: {sort}")
+    column = SORT_COLUMNS[sort]
+    key = tuple_(column, DbLlmEval.did)
+
+    q = (
+        db.query(
+            DbLlmEval.did,
+            DbCandidate.handle,
+            DbProfile.display_name,
+            DbLlmEval.label,
+            DbLlmEval.score_overall,
+            DbLlmEval.score_tech,
+            DbLlmEval.score_location,
+        )
+        .join(DbCandidate, DbCandidate.did == DbLlmEval.did)
+        .outerjoin(DbProfile, DbProfile.did == DbLlmEval.did)
+        .filter(in_topic(), not_gone(DbLlmEval.did))
+    )
+    if label:
+        q = q.filter(DbLlmEval.label == label)
+    if min_score is not None:
+        q = q.filter(column >= min_score)
+    if max_score is not None:
+        q = q.filter(column <= max_score)
+
+    # Walking backwards means scanning the index the other way round and
+    # flipping the rows afterwards
+    backwards = before is not None and after is None
+    ascending = descending == backwards
+    if after is not None:
+        q = q.filter(key < tuple_(*after) if descending else key > tuple_(*after))
+    elif before is not None:
+        q = q.filter(key > tuple_(*before) if descending else key < tuple_(*before))
+
+    if ascending:
+        q = q.order_by(column.asc(), DbLlmEval.did.asc())
+    else:
+        q = q.order_by(column.desc(), DbLlmEval.did.desc())
+
+    rows = [CandidateRow(*row) for row in q.limit(limit)]
+    if backwards:
+        rows.reverse()
+    return rows
+
+
+# (run_at, did) of the last evaluation on a page
+EvalCursor = Tuple[datetime, str]
+
+
+def page_evals(
+    db: Session,
+    label: Optional[str] = None,
+    since: Optional[datetime] = None,
+    after: Optional[EvalCursor] = None,
+    limit: int = PAGE_SIZE,
+) -> List[dict]:
+    """
+    One page of the current topic's evaluations, oldest first in (run_at, did)
+    order. Re-scored candidates move to the end, so polling with the last
+    cursor (or `since`) returns just what was evaluated in the meantime.
+    Gone accounts are left out.
+    """
+    key = tuple_(DbLlmEval.run_at, DbLlmEval.did)
+    q = (
+        db.query(
+            DbLlmEval.did,
+            DbCandidate.handle,
+            DbLlmEval.model,
+            DbLlmEval.run_at,
+            DbLlmEval.label,
+            DbLlmEval.score_overall,
+            DbLlmEval.score_tech,
+            DbLlmEval.score_location,
+            DbLlmEval.rationale,
+            DbLlmEval.evidence,
+            DbLlmEval.uncertainties,
+        )
+        .join(DbCandidate, DbCandidate.did == DbLlmEval.did)
+        .filter(in_topic(), not_gone(DbLlmEval.did))
+    )
+    if label:
+        q = q.filter(DbLlmEval.label == label)
+    if since is not None:
+        q = q.filter(DbLlmEval.run_at >= since)
+    if after is not None:
+        q = q.filter(key > tuple_(*after))
+    q = q.order_by(DbLlmEval.run_at.asc(), DbLlmEval.did.asc()).limit(limit)
+    return [row._asdict() for row in q]
+
+
+def candidate_detail(db: Session, did: str, posts_limit: int = 20) -> Optional[dict]:
+    """Everything the detail pane shows for one candidate (bounded post count)."""
+    cand = db.get(DbCandidate, did)
+    if cand is None:
+        return None
+
+    profile = cand.profile
+    ev = cand.llm_eval
+    flag = db.get(DbSpamFlag, did)
+    posts = (
+        db.query(DbPost.created_at, DbPost.text, DbPost.is_repost)
+        .filter(DbPost.author_did == did)
+        .order_by(DbPost.created_at.desc())
+        .limit(posts_limit)
+        .all()
+    )
+
+    return {
+        "did": cand.did,
+        "handle": cand.handle,
+        "display_name": profile.display_name if profile else None,
+        "description": profile.description if profile else None,
+        "sources": cand.discovery_sources or [],
+        "label": ev.label if ev else None,
+        "model": ev.model if ev else None,
+        "score_overall": ev.score_overall if ev else None,
+        "score_tech": ev.score_tech if ev else None,
+        "score_location": ev.score_location if ev else None,
+        "rationale": ev.rationale if ev else None,
+        "evidence": (ev.evidence or []) if ev else [],
+        "uncertainties": (ev.uncertainties or []) if ev else [],
+        "spam_flagged": bool(flag and flag.flagged),
+        "posts": [
+            {"created_at": p.created_at, "text": p.text, "is_repost": p.is_repost}
+            for p in posts
+        ],
+    }
+
+
+@dataclass
+class SearchHit:
+    did: str
+    handle: Optional[str]
+    where: str  # "bio" or "post"
+    snippet: str
+    uri: Optional[str] = None
+    created_at: Optional[str] = None
+
+
+def any_of(terms: Iterable[str]) -> str:
+    """
+    FTS5 query matching any of the given words/phrases, quoted so user
+    input can't inject query syntax. A trailing `*` keeps prefix matching.
+    """
+    parts = []
+    for term in terms:
+        term = term.strip()
+        prefix = term.endswith("*")
+        term = term.rstrip("*").strip()
+        if not term:
+            continue
+        parts.append('"' + term.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " OR ".join(parts)
+
+
+_BIO_SEARCH = text(
+    "SELECT p.did, c.handle, "
+    "snippet(profiles_fts, -1, '[', ']', '...', 12) "
+    "FROM profiles_fts "
+    "JOIN profiles p ON p.rowid = profiles_fts.rowid "
+    "JOIN candidates c ON c.did = p.did "
+    "WHERE profiles_fts MATCH :q ORDER BY rank LIMIT :limit"
+)
+
+_POST_SEARCH = text(
+    "SELECT p.author_did, c.handle, p.text, p.uri, p.created_at "
+    "FROM posts_fts "
+    "JOIN posts p ON p.rowid = posts_fts.rowid "
+    "JOIN candidates c ON c.did = p.author_did "
+    "WHERE posts_fts MATCH :q ORDER BY rank LIMIT :limit"
+)
+
+
+def search_bios(db: Session, query: str, limit: int = 50) -> List[SearchHit]:
+    """Best-ranked (bm25) profiles whose display name or bio match."""
+    rows = db.execute(_BIO_SEARCH, {"q": query, "limit": limit})
+    return [SearchHit(did, handle, "bio", snip) for did, handle, snip in rows]
+
+
+_WORD_RE = re.compile(r"\w+")
+_QUERY_TERM_RE = re.compile(r"(\w+)(\*?)")
+_QUERY_OPERATORS = {"AND", "OR", "NOT", "NEAR"}
+
+
+def _fold(word: str) -> str:
+    # Like the index's unicode61 tokenizer with remove_diacritics
+    decomposed = unicodedata.normalize("NFKD", word.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def _post_snippet(post_text: str, query: str, words: int = 12) -> str:
+    """
+    `words` words of a post around its first match of `query`, matches in
+    [brackets] and cut ends marked "...", like FTS5's snippet().
+    """
+    terms = [
+        (_fold(term), bool(star))
+        for term, star in _QUERY_TERM_RE.findall(query)
+        if term not in _QUERY_OPERATORS
+    ]
+
+    def matches(word: str) -> bool:
+        word = _fold(word)
+        return any(
+            word.startswith(term) if prefix else word == term
+            for term, prefix in terms
+        )
+
+    tokens = list(_WORD_RE.finditer(post_text))
+    if not tokens:
+        return post_text
+    first = next((i for i, t in enumerate(tokens) if matches(t.group())), 0)
+    start = max(0, min(first - words // 4, len(tokens) - words))
+    window = tokens[start : start + words]
+    parts = []
+    pos = window[0].start()
+    for token in window:
+        parts.append(post_text[pos : token.start()])
+        word = token.group()
+        parts.append(f"[{word}]" if matches(word) else word)
+        pos = token.end()
+    snippet = "".join(parts)
+    if start > 0:
+        snippet = "..." + snippet
+    if start + words < len(tokens):
+        snippet += "..."
+    return snippet
+
+
+def _index_pending(db: Session) -> None:
+    if index_pending_fts(db.connection()):
+        db.commit()
+
+
+def search_posts(db: Session, query: str, limit: int = 50) -> List[SearchHit]:
+    """Best-ranked (bm25) posts that match."""
+    _index_pending(db)
+    rows = db.execute(_POST_SEARCH, {"q": query, "limit": limit})
+    return [
+        SearchHit(
+            did,
+            handle,
+            "post",
+            _post_snippet(decompress_text(stored) or "", query),
+            uri,
+            created_at,
+        )
+        for did, handle, stored, uri, created_at in rows
+    ]
+
+
+def matching_dids(db: Session, query: str) -> Set[str]:
+    """Every candidate whose bio or any post matches (no ranking, no limit)."""
+    _index_pending(db)
+    rows = db.execute(
+        text(
+            "SELECT p.did FROM profiles_fts "
+            "JOIN profiles p ON p.rowid = profiles_fts.rowid "
+            "WHERE profiles_fts MATCH :q "
+            "UNION "
+            "SELECT p.author_did FROM posts_fts "
+            "JOIN posts p ON p.rowid = posts_fts.rowid "
+            "WHERE posts_fts MATCH :q"
+        ),
+        {"q": query},
+    )
+    return {did for (did,) in rows}
@@ -0,0 +1,151 @@
+"""Local, network-free similarity ranking of candidates.
+
+Bio + posts are hashed into a fixed-width TF-IDF space and stored as a
+memory-mapped float32 matrix next to the database. New candidates are then
+scored by cosine similarity against the accounts the LLM already labelled
+"match", so obvious non-matches can skip the LLM entirely.
+"""
+
+import json
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[#@]?\w+")
+
+# Rows processed per block when normalizing / scoring the matrix
+CHUNK_ROWS = 8192
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def hash_tokens(tokens: Iterable[str], dimensions: int) -> np.ndarray:
+    """Term counts bucketed by a stable hash (Python's hash() is salted)."""
+    idx = np.fromiter(
+        (zlib.crc32(t.encode("utf-8")) % dimensions for t in tokens), dtype=np.int64
+    )
+    return np.bincount(idx, minlength=dimensions).astype(np.float32)
+
+
+class VectorStore:
+    """A row-per-candidate matrix on disk plus the DID list that indexes it."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.index_path = self.path.with_suffix(".dids.json")
+
+    def exists(self) -> bool:
+        return self.path.exists() and self.index_path.exists()
+
+    def build(
+        self, docs: Iterable[Tuple[str, str]], count: int, dimensions: int
+    ) -> int:
+        """
+        Write TF-IDF vectors for `count` (did, text) pairs.
+        Rows are L2-normalized so cosine similarity is a plain dot product.
+        """
+        tmp_path = self.path.with_suffix(".tmp.npy")
+        try:
+            matrix = np.lib.format.open_memmap(
+                tmp_path, mode="w+", dtype=np.float32, shape=(count, dimensions)
+            )
+            doc_freq = np.zeros(dimensions, dtype=np.float64)
+            dids: List[str] = []
+
+            # Pass 1: sublinear term frequencies + document frequencies
+            for row, (did, text) in enumerate(docs):
+                if row >= count:
+                    break
+                tf = hash_tokens(tokenize(text), dimensions)
+                nonzero = tf > 0
+                doc_freq += nonzero
+                matrix[row] = np.log1p(tf)
+                dids.append(did)
+
+            n = len(dids)
+            idf = (np.log((1.0 + n) / (1.0 + doc_freq)) + 1.0).astype(np.float32)
+
+            # Pass 2: apply IDF and normalize, a block at a time
+            for start in range(0, n, CHUNK_ROWS):
+                block = matrix[start : start + CHUNK_ROWS] * idf
+                norms = np.linalg.norm(block, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                matrix[start : start + CHUNK_ROWS] = block / norms
+
+            matrix.flush()
+            del matrix
+
+            if n < count:
+                # Fewer docs than expected (rows deleted mid-run); trim the file
+                trimmed = np.load(tmp_path, mmap_mode="r")[:n]
+                np.save(self.path, trimmed)
+            else:
+                tmp_path.replace(self.path)
+        finally:
+            # Gone after a successful build; a cancelled or failed one must
+            # not leave a matrix-sized file behind
+            tmp_path.unlink(missing_ok=True)
+
+        self.index_path.write_text(json.dumps(dids))
+        return n
+
+    def load(self) -> Tuple[List[str], np.ndarray]:
+        dids = json.loads(self.index_path.read_text())
+        matrix = np.load(self.path, mmap_mode="r")
+        return dids, matrix
+
+
+def similarity_scores(
+    matrix: np.ndarray, match_rows: Sequence[int], k_neighbors: int = 0
+) -> np.ndarray:
+    """
+    Score every row against the confirmed-match rows.
+    k_neighbors == 0 uses the match centroid, otherwise the mean of each
+    row's k most similar matches.
+    """
+    matches = np.asarray(matrix[np.asarray(match_rows)], dtype=np.float32)
+    scores = np.empty(matrix.shape[0], dtype=np.float32)
+
+    if k_neighbors <= 0:
+        centroid = matches.mean(axis=0)
+        norm = np.linalg.norm(centroid)
+        if norm > 0:
+            centroid /= norm
+        for start in range(0, matrix.shape[0], CHUNK_ROWS):
+            scores[start : start + CHUNK_ROWS] = (
+                matrix[start : start + CHUNK_ROWS] @ centroid
+            )
+        return scores
+
+    k = min(k_neighbors, matches.shape[0])
+    for start in range(0, matrix.shape[0], CHUNK_ROWS):
+        sims = matrix[start : start + CHUNK_ROWS] @ matches.T
+        top = np.partition(sims, sims.shape[1] - k, axis=1)[:, -k:]
+        scores[start : start + CHUNK_ROWS] = top.mean(axis=1)
+    return scores
+
+
+def rank_candidates(
+    store: VectorStore,
+    match_dids: Iterable[str],
+    min_matches: int,
+    k_neighbors: int = 0,
+) -> Optional[Dict[str, float]]:
+    """Returns {did: similarity} for every embedded candidate, or None if
+    there are too few confirmed matches (or no vectors) to trust the signal."""
+    if not store.exists():
+        return None
+
+    dids, matrix = store.load()
+    row_of = {did: i for i, did in enumerate(dids)}
+    match_rows = [row_of[d] for d in match_dids if d in row_of]
+    if len(match_rows) < max(min_matches, 1):
+        return None
+
+    scores = similarity_scores(matrix, match_rows, k_neighbors)
+    return dict(zip(dids, scores.tolist()))
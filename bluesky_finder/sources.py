@@ -0,0 +1,299 @@
+"""Discovery origins and their yield.
+
+An origin is one concrete thing discovery pulls candidates from: a hashtag
+search, an anchor's followers/follows or the people interacting with its
+posts, or a curated list / starter pack.
+Each run of an origin adds its API requests, accounts seen and new
+candidates to `source_yields`; new candidates remember the origin that
+found them (candidates.discovered_via), so the report can also credit each
+origin with the matches (for the current topic) its candidates turned into.
+"""
+
+import math
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+
+from .database import (
+    DbCandidate,
+    DbDiscoveryRun,
+    DbLlmEval,
+    DbSourceYield,
+    in_topic,
+)
+
+LIST_COLLECTION = "app.bsky.graph.list"
+STARTER_PACK_COLLECTION = "app.bsky.graph.starterpack"
+
+
+def hashtag_origin(tag: str) -> str:
+    return f"hashtag:{tag}"
+
+
+def anchor_origin(handle: str) -> str:
+    return f"anchor:{handle}"
+
+
+def list_origin(ref: str) -> str:
+    return f"list:{ref}"
+
+
+def interaction_origin(handle: str) -> str:
+    return f"interactions:{handle}"
+
+
+# Accounts per request of the paged discovery endpoints (searchPosts,
+# getFollowers/getFollows, getList, getLikes, getRepostedBy)
+PAGE_SIZE = 100
+
+
+def pages_for(accounts: int) -> int:
+    """Requests needed to page through `accounts` accounts."""
+    return max(1, math.ceil(accounts / PAGE_SIZE))
+
+
+def plan_interaction_requests(
+    posts: List[dict], budget: int
+) -> List[Tuple[str, dict, int]]:
+    """
+    Split a request budget over (kind, post) fetches: most engaged posts
+    first, one page each while the budget lasts, then extra pages for long
+    like/repost lists. Returns [(kind, post, pages)]; kind is like, repost
+    or reply (a thread is always one request).
+    """
+    tasks = []
+    for post in sorted(
+        posts, key=lambda p: p["likes"] + p["reposts"] + p["replies"], reverse=True
+    ):
+        for kind, count in (
+            ("like", post["likes"]),
+            ("repost", post["reposts"]),
+            ("reply", post["replies"]),
+        ):
+            if count:
+                need = 1 if kind == "reply" else pages_for(count)
+                tasks.append([kind, post, 1, need])
+    tasks = tasks[: max(budget, 0)]
+    budget -= len(tasks)
+    for task in tasks:
+        extra = min(task[3] - task[2], budget)
+        task[2] += extra
+        budget -= extra
+    return [(kind, post, pages) for kind, post, pages, _ in tasks]
+
+
+@dataclass(frozen=True)
+class ListRef:
+    actor: str  # DID or handle of the owner
+    collection: str  # LIST_COLLECTION or STARTER_PACK_COLLECTION
+    rkey: str
+
+    @property
+    def is_starter_pack(self) -> bool:
+        return self.collection == STARTER_PACK_COLLECTION
+
+    def uri(self, did: Optional[str] = None) -> str:
+        return f"at://{did or self.actor}/{self.collection}/{self.rkey}"
+
+
+def parse_list_ref(ref: str) -> ListRef:
+    """
+    Parse a list or starter-pack reference:
+      at://<actor>/app.bsky.graph.list/<rkey>
+      at://<actor>/app.bsky.graph.starterpack/<rkey>
+      https://bsky.app/profile/<actor>/lists/<rkey>
+      https://bsky.app/starter-pack/<actor>/<rkey>
+    """
+    ref = ref.strip()
+    if ref.startswith("at://"):
+        parts = ref[len("at://"):].split("/")
+        if len(parts) == 3 and parts[1] in (LIST_COLLECTION, STARTER_PACK_COLLECTION):
+            return ListRef(parts[0], parts[1], parts[2])
+    else:
+        parts = [p for p in urlparse(ref).path.split("/") if p]
+        if len(parts) == 4 and parts[0] == "profile" and parts[2] == "lists":
+            return ListRef(parts[1], LIST_COLLECTION, parts[3])
+        if len(parts) == 3 and parts[0] == "starter-pack":
+            return ListRef(parts[1], STARTER_PACK_COLLECTION, parts[2])
+    raise ValueError(f"Not a list or starter pack reference: {ref}")
+
+
+def saved_cursors(db: Session, origin: str) -> dict:
+    """Where the origin's paged endpoints stopped last run."""
+    row = db.get(DbSourceYield, origin)
+    return dict(row.cursors or {}) if row is not None else {}
+
+
+def record_yield(
+    db: Session,
+    source: str,
+    origin: str,
+    requests: int,
+    seen: int,
+    new: int,
+    cursors: Optional[dict] = None,
+) -> None:
+    row = db.get(DbSourceYield, origin)
+    if row is None:
+        row = DbSourceYield(
+            origin=origin, source=source, runs=0, requests=0, seen=0, new_candidates=0
+        )
+        db.add(row)
+    row.runs += 1
+    row.requests += requests
+    row.seen += seen
+    row.new_candidates += new
+    row.last_run_at = datetime.utcnow()
+    row.cursors = cursors or {}
+
+
+@dataclass
+class SourceYield:
+    source: str
+    origin: str
+    runs: int
+    requests: int
+    seen: int
+    new_candidates: int
+    evaluated: int
+    matches: int
+    cursors: Optional[dict] = None
+
+    @property
+    def new_per_request(self) -> float:
+        return self.new_candidates / self.requests if self.requests else 0.0
+
+    @property
+    def matches_per_request(self) -> float:
+        return self.matches / self.requests if self.requests else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            **{k: v for k, v in self.__dict__.items() if k != "cursors"},
+            "new_per_request": round(self.new_per_request, 3),
+            "matches_per_request": round(self.matches_per_request, 3),
+        }
+
+
+def yield_report(db: Session) -> List[SourceYield]:
+    """Every origin's cumulative yield, best matches-per-request first."""
+    outcomes = {
+        origin: (evaluated, matches or 0)
+        for origin, evaluated, matches in db.query(
+            DbCandidate.discovered_via,
+            func.count(DbLlmEval.did),
+            func.sum(case((DbLlmEval.label == "match", 1), else_=0)),
+        )
+        .join(DbLlmEval, DbLlmEval.did == DbCandidate.did)
+        .filter(DbCandidate.discovered_via.isnot(None), in_topic())
+        .group_by(DbCandidate.discovered_via)
+    }
+    rows = [
+        SourceYield(
+            y.source, y.origin, y.runs, y.requests, y.seen, y.new_candidates,
+            *outcomes.get(y.origin, (0, 0)),
+            y.cursors,
+        )
+        for y in db.query(DbSourceYield)
+    ]
+    rows.sort(key=lambda r: (r.matches_per_request, r.new_per_request), reverse=True)
+    return rows
+
+
+def summarize_by_source(rows: List[SourceYield]) -> List[SourceYield]:
+    """Origins of the same kind (all hashtags, all anchors, all lists) added up."""
+    totals = {}
+    for r in rows:
+        t = totals.setdefault(r.source, SourceYield(r.source, "*", 0, 0, 0, 0, 0, 0))
+        t.runs += r.runs
+        t.requests += r.requests
+        t.seen += r.seen
+        t.new_candidates += r.new_candidates
+        t.evaluated += r.evaluated
+        t.matches += r.matches
+    out = list(totals.values())
+    out.sort(key=lambda r: (r.matches_per_request, r.new_per_request), reverse=True)
+    return out
+
+
+def format_yields(rows: List[SourceYield]) -> str:
+    lines = [
+        f"{'origin':<48} {'req':>6} {'new':>6} {'match':>6} "
+        f"{'new/req':>8} {'match/req':>9}"
+    ]
+    for r in rows:
+        name = r.origin if r.origin != "*" else f"[{r.source}]"
+        if len(name) > 48:
+            name = "..." + name[-45:]
+        lines.append(
+            f"{name:<48} {r.requests:>6} {r.new_candidates:>6} {r.matches:>6} "
+            f"{r.new_per_request:>8.2f} {r.matches_per_request:>9.3f}"
+        )
+    return "\n".join(lines)
+
+
+@dataclass
+class RunYield:
+    run_id: int
+    started_at: datetime
+    adaptive: bool
+    requests: int
+    new_candidates: int
+    evaluated: int
+    matches: int
+
+    @property
+    def matches_per_request(self) -> float:
+        return self.matches / self.requests if self.requests else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            **self.__dict__,
+            "matches_per_request": round(self.matches_per_request, 3),
+        }
+
+
+def run_report(db: Session) -> List[RunYield]:
+    """Each discovery run's spend and the matches among the candidates it found."""
+    matched = case((DbLlmEval.label == "match", 1), else_=0)
+    rows = (
+        db.query(
+            DbDiscoveryRun.id,
+            DbDiscoveryRun.started_at,
+            DbDiscoveryRun.adaptive,
+            DbDiscoveryRun.requests,
+            DbDiscoveryRun.new_candidates,
+            func.count(DbLlmEval.did),
+            func.coalesce(func.sum(matched), 0),
+        )
+        .outerjoin(
+            DbCandidate,
+            and_(
+                DbCandidate.discovered_at >= DbDiscoveryRun.started_at,
+                DbCandidate.discovered_at <= DbDiscoveryRun.finished_at,
+            ),
+        )
+        .outerjoin(DbLlmEval, and_(DbLlmEval.did == DbCandidate.did, in_topic()))
+        .filter(DbDiscoveryRun.finished_at.isnot(None))
+        .group_by(DbDiscoveryRun.id)
+        .order_by(DbDiscoveryRun.id)
+    )
+    return [RunYield(*row) for row in rows]
+
+
+def format_runs(rows: List[RunYield]) -> str:
+    lines = [
+        f"{'run':>4} {'started':<17} {'mode':<8} {'req':>6} {'new':>6} "
+        f"{'match':>6} {'match/req':>9}"
+    ]
+    for r in rows:
+        lines.append(
+            f"{r.run_id:>4} {r.started_at:%Y-%m-%d %H:%M} "
+            f"{'adaptive' if r.adaptive else 'static':<8} {r.requests:>6} "
+            f"{r.new_candidates:>6} {r.matches:>6} {r.matches_per_request:>9.3f}"
+        )
+    return "\n".join(lines)
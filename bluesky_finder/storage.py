@@ -0,0 +1,202 @@
+"""Post storage maintenance for `compact`: retention rules, re-compression of
+rows stored before compression was enabled, and (incremental) VACUUM.
+
+Every step is set-based SQL or batched by rowid, so compacting a large
+database never loads the posts table into memory.
+"""
+
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Sequence
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.orm import Session
+
+from .codec import compress_text
+from .config import StorageSettings
+from .database import (
+    DbLshBucket,
+    DbPost,
+    DbPostSignature,
+    index_pending_fts,
+    rebuild_fts,
+)
+
+BATCH_SIZE = 2000
+
+
+@dataclass
+class StorageSnapshot:
+    file_bytes: int
+    free_bytes: int
+    posts: int
+    text_bytes: int  # stored size of posts.text, compressed or not
+    scan_seconds: float  # full read of every post's (decoded) text
+
+    def describe(self) -> str:
+        rate = self.posts / self.scan_seconds if self.scan_seconds else 0.0
+        return (
+            f"{self.file_bytes / 1e6:.1f} MB file ({self.free_bytes / 1e6:.1f} MB free), "
+            f"{self.posts} posts, {self.text_bytes / 1e6:.1f} MB text, "
+            f"scan {self.scan_seconds:.2f}s ({rate:,.0f} posts/s)"
+        )
+
+
+def measure(db: Session) -> StorageSnapshot:
+    def pragma(name: str) -> int:
+        return db.execute(text(f"PRAGMA {name}")).scalar() or 0
+
+    page_size = pragma("page_size")
+    posts, text_bytes = db.execute(
+        text("SELECT COUNT(*), SUM(LENGTH(CAST(text AS BLOB))) FROM posts")
+    ).one()
+
+    started = time.perf_counter()
+    for _ in db.query(DbPost.author_did, DbPost.text).yield_per(BATCH_SIZE):
+        pass
+    scan_seconds = time.perf_counter() - started
+
+    return StorageSnapshot(
+        file_bytes=pragma("page_count") * page_size,
+        free_bytes=pragma("freelist_count") * page_size,
+        posts=posts,
+        text_bytes=text_bytes or 0,
+        scan_seconds=scan_seconds,
+    )
+
+
+def apply_retention(
+    db: Session, config: StorageSettings, topics: Sequence[str]
+) -> Dict[str, int]:
+    """
+    Delete posts the retention rules don't keep. Returns rows dropped per rule.
+    Posts count as rejected once every one of `topics` has labelled the
+    author "no"; until then another topic may still need them.
+    """
+    # Older databases have no fetch timestamp: record one for every author
+    # with posts now, so emptied candidates aren't treated as never fetched
+    db.execute(
+        text(
+            "UPDATE candidates SET posts_fetched_at = :now "
+            "WHERE posts_fetched_at IS NULL "
+            "AND did IN (SELECT DISTINCT author_did FROM posts)"
+        ).bindparams(bindparam("now", type_=DateTime())),
+        {"now": datetime.utcnow()},
+    )
+
+    dropped: Dict[str, int] = {}
+    if config.drop_rejected_posts:
+        dropped["rejected"] = db.execute(
+            text(
+                "DELETE FROM posts WHERE author_did IN "
+                "(SELECT did FROM llm_evals WHERE topic IN :topics "
+                "GROUP BY did HAVING COUNT(*) = :n AND SUM(label = 'no') = :n)"
+            ).bindparams(bindparam("topics", expanding=True)),
+            {"topics": list(topics), "n": len(topics)},
+        ).rowcount
+    if config.drop_gone_posts:
+        dropped["gone"] = db.execute(
+            text(
+                "DELETE FROM posts WHERE author_did IN "
+                "(SELECT did FROM fetch_failures WHERE kind = 'permanent')"
+            )
+        ).rowcount
+    if config.max_post_age_days is not None:
+        cutoff = datetime.utcnow() - timedelta(days=config.max_post_age_days)
+        dropped["too_old"] = db.execute(
+            text("DELETE FROM posts WHERE created_at < :cutoff").bindparams(
+                bindparam("cutoff", type_=DateTime())
+            ),
+            {"cutoff": cutoff},
+        ).rowcount
+    if config.keep_posts_per_author is not None:
+        dropped["over_per_author_limit"] = db.execute(
+            text(
+                "DELETE FROM posts WHERE rowid IN ("
+                "SELECT rowid FROM ("
+                "SELECT rowid, ROW_NUMBER() OVER ("
+                "PARTITION BY author_did ORDER BY created_at DESC) AS rn "
+                "FROM posts) WHERE rn > :keep)"
+            ),
+            {"keep": config.keep_posts_per_author},
+        ).rowcount
+    db.commit()
+    return dropped
+
+
+def recompress_posts(db: Session) -> int:
+    """Compress post text still stored as plain TEXT. Returns rows rewritten."""
+    rewritten = 0
+    last_rowid = 0
+    while True:
+        batch = db.execute(
+            text(
+                "SELECT rowid, text FROM posts "
+                "WHERE rowid > :last AND typeof(text) = 'text' "
+                "ORDER BY rowid LIMIT :n"
+            ),
+            {"last": last_rowid, "n": BATCH_SIZE},
+        ).fetchall()
+        if not batch:
+            break
+        last_rowid = batch[-1][0]
+        updates = []
+        for rowid, value in batch:
+            blob = compress_text(value)
+            if isinstance(blob, bytes):
+                updates.append({"rowid": rowid, "blob": blob})
+        if updates:
+            db.execute(
+                text("UPDATE posts SET text = :blob WHERE rowid = :rowid"), updates
+            )
+            # The triggers queue the now compressed rows for re-indexing
+            index_pending_fts(db.connection())
+            rewritten += len(updates)
+        db.commit()
+    return rewritten
+
+
+def _incremental_vacuum(conn) -> None:
+    # Each step of this pragma frees one page and a plain execute() only
+    # steps once; executescript() runs it to completion
+    conn.connection.dbapi_connection.executescript("PRAGMA incremental_vacuum;")
+
+
+def vacuum(db: Session) -> str:
+    """
+    Return free pages to the OS. The first run on a database created without
+    incremental auto-vacuum converts it with one full VACUUM; after that only
+    the cheap incremental kind is needed.
+    """
+    db.commit()
+    engine = db.get_bind()
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+        if mode == 2:
+            _incremental_vacuum(conn)
+            return "incremental"
+        conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+
+    # A full VACUUM may renumber rowids, which the FTS indexes and the dedupe
+    # tables are keyed on: re-index now, and let the next `dedupe` re-sign
+    rebuild_fts(db.connection())
+    db.query(DbLshBucket).delete()
+    db.query(DbPostSignature).delete()
+    db.commit()
+    with engine.connect() as conn:
+        _incremental_vacuum(conn.execution_options(isolation_level="AUTOCOMMIT"))
+    return "full"
+
+
+def describe_change(before: StorageSnapshot, after: StorageSnapshot) -> Optional[str]:
+    if not before.file_bytes:
+        return None
+    saved = before.file_bytes - after.file_bytes
+    speedup = before.scan_seconds / after.scan_seconds if after.scan_seconds else 0.0
+    return (
+        f"saved {saved / 1e6:.1f} MB ({saved / before.file_bytes:.0%}), "
+        f"scan {speedup:.1f}x"
+    )
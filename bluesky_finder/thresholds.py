@@ -0,0 +1,194 @@
+"""Labels from scores: relabeling after a threshold change, and sweeping
+thresholds against a hand-labelled sample.
+
+An evaluation's label is fixed when it is written, so changing
+scoring_thresholds leaves every stored label as it was. relabel() derives
+them again from score_overall in a single UPDATE, touching only the rows
+whose label actually changes (which keeps the stats triggers cheap). The
+LLM's own label choice is replaced by the threshold rule, like for every
+evaluation whose reply had none.
+
+sweep() shows what a grid of thresholds would do without writing anything:
+for each threshold, how many evaluations score at or above it, and the
+precision/recall of "score >= threshold" on a sample of accounts whose true
+label was checked by hand. Scores are loaded once into a NumPy array and the
+whole grid is computed in a few vector operations, so tuning costs no LLM
+calls and no repeated queries.
+
+Both work on the current topic's evaluations (config.current_topic), with
+that topic's thresholds.
+
+The truth file is CSV (header with `did` or `handle`, and `label`) or JSONL
+with the same keys. Labels match/yes/true/1 count as positive; anything else
+(maybe, no, ...) as negative.
+"""
+
+import csv
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from .config import ScoringThresholds
+from .database import DbCandidate, DbLlmEval, in_topic
+
+POSITIVE_LABELS = {"match", "yes", "true", "1", "y"}
+
+
+def label_expression(thresholds: ScoringThresholds):
+    """SQL for the label a score_overall gets under `thresholds`."""
+    return case(
+        (DbLlmEval.score_overall >= thresholds.match_overall, "match"),
+        (DbLlmEval.score_overall >= thresholds.maybe_overall, "maybe"),
+        else_="no",
+    )
+
+
+def relabel(
+    db: Session, thresholds: ScoringThresholds, dry_run: bool = False
+) -> Dict[Tuple[Optional[str], str], int]:
+    """
+    Re-derive the label of every scored evaluation of the current topic.
+    Returns how many moved from each old label to each new one; with dry_run
+    nothing is written.
+    """
+    if thresholds.maybe_overall > thresholds.match_overall:
+        raise ValueError("maybe_overall must not be above match_overall")
+    new = label_expression(thresholds)
+    stale = (
+        in_topic(),
+        DbLlmEval.score_overall.isnot(None),
+        DbLlmEval.label.is_distinct_from(new),
+    )
+    moves = {
+        (old, label): n
+        for old, label, n in db.query(DbLlmEval.label, new, func.count())
+        .filter(*stale)
+        .group_by(DbLlmEval.label, new)
+    }
+    if moves and not dry_run:
+        db.query(DbLlmEval).filter(*stale).update(
+            {DbLlmEval.label: new}, synchronize_session=False
+        )
+        db.commit()
+    return moves
+
+
+def load_truth(db: Session, path: Path) -> Dict[str, bool]:
+    """did -> is a true match, from a CSV/JSONL sample (handles resolved)."""
+    with open(path, encoding="utf-8") as f:
+        if path.suffix.lower() in (".jsonl", ".json"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    truth: Dict[str, bool] = {}
+    handles: Dict[str, bool] = {}
+    for row in rows:
+        positive = str(row.get("label", "")).strip().lower() in POSITIVE_LABELS
+        if row.get("did"):
+            truth[row["did"].strip()] = positive
+        elif row.get("handle"):
+            handles[row["handle"].strip().lstrip("@").lower()] = positive
+    if handles:
+        for did, handle in db.query(DbCandidate.did, DbCandidate.handle).filter(
+            func.lower(DbCandidate.handle).in_(handles)
+        ):
+            truth.setdefault(did, handles[handle.lower()])
+    return truth
+
+
+@dataclass
+class SweepRow:
+    threshold: float
+    at_or_above: int  # evaluations scoring >= threshold
+    flagged: int  # sample accounts scoring >= threshold
+    true_positives: int
+    precision: Optional[float]
+    recall: Optional[float]
+
+
+@dataclass
+class Sweep:
+    evaluations: int
+    sample: int  # sample accounts that have an evaluation
+    positives: int
+    missing: int  # sample accounts without one
+    rows: List[SweepRow]
+
+
+def threshold_grid(step: float = 0.05) -> np.ndarray:
+    # Rounded so 0.75 on the grid compares equal to a stored 0.75
+    return np.round(np.arange(step, 1.0 + step / 2, step), 6)
+
+
+def sweep(db: Session, truth: Dict[str, bool], grid: np.ndarray) -> Sweep:
+    """Counts and sample precision/recall of `score >= t` for every t in grid."""
+    rows = db.query(DbLlmEval.did, DbLlmEval.score_overall).filter(
+        in_topic(), DbLlmEval.score_overall.isnot(None)
+    )
+    dids, scores = [], []
+    for did, score in rows:
+        dids.append(did)
+        scores.append(score)
+    scores = np.asarray(scores, dtype=np.float64)
+    sample_index = [i for i, did in enumerate(dids) if did in truth]
+    sample_scores = scores[sample_index]
+    sample_truth = np.fromiter(
+        (truth[dids[i]] for i in sample_index), dtype=bool, count=len(sample_index)
+    )
+
+    ordered = np.sort(scores)
+    at_or_above = len(ordered) - np.searchsorted(ordered, grid, side="left")
+    # thresholds x sample accounts
+    flagged = sample_scores[None, :] >= grid[:, None]
+    n_flagged = flagged.sum(axis=1)
+    tp = (flagged & sample_truth[None, :]).sum(axis=1)
+    positives = int(sample_truth.sum())
+
+    out = []
+    for i, t in enumerate(grid):
+        out.append(
+            SweepRow(
+                threshold=float(t),
+                at_or_above=int(at_or_above[i]),
+                flagged=int(n_flagged[i]),
+                true_positives=int(tp[i]),
+                precision=float(tp[i] / n_flagged[i]) if n_flagged[i] else None,
+                recall=float(tp[i] / positives) if positives else None,
+            )
+        )
+    return Sweep(
+        evaluations=len(scores),
+        sample=len(sample_index),
+        positives=positives,
+        missing=len(truth) - len(sample_index),
+        rows=out,
+    )
+
+
+def format_sweep(result: Sweep, thresholds: ScoringThresholds) -> str:
+    def pct(v: Optional[float]) -> str:
+        return f"{v:.1%}" if v is not None else "-"
+
+    lines = [
+        f"{result.evaluations} evaluations; sample: {result.sample} evaluated "
+        f"({result.positives} true matches), {result.missing} not evaluated",
+        f"{'score >=':>8} {'evals':>7} {'sample':>7} {'TP':>5} "
+        f"{'precision':>9} {'recall':>7}",
+    ]
+    for r in result.rows:
+        mark = ""
+        if np.isclose(r.threshold, thresholds.match_overall):
+            mark = "  <- match"
+        elif np.isclose(r.threshold, thresholds.maybe_overall):
+            mark = "  <- maybe"
+        lines.append(
+            f"{r.threshold:>8.2f} {r.at_or_above:>7} {r.flagged:>7} "
+            f"{r.true_positives:>5} {pct(r.precision):>9} {pct(r.recall):>7}{mark}"
+        )
+    return "\n".join(lines)